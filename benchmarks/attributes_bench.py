@@ -0,0 +1,45 @@
+"""Time the attachment of node and edge attributes to the graph built from the edge list.
+
+Usage: python benchmarks/attributes_bench.py [nb_edges]
+"""
+
+import sys
+import time
+import numpy as np
+import pandas as pd
+from spikexplore.graph import graph_from_edgeslist, add_edges_attributes, add_node_attributes, convert_to_json
+
+
+def main(nb_edges=1000000):
+    rng = np.random.default_rng(0)
+    nb_nodes = nb_edges // 10
+    edges_df = pd.DataFrame(
+        {
+            "source": rng.integers(0, nb_nodes, nb_edges),
+            "target": rng.integers(0, nb_nodes, nb_edges),
+            "weight": rng.integers(1, 10, nb_edges).astype(float),
+            "cid": [["cid-{}".format(i)] for i in range(nb_edges)],
+        }
+    ).drop_duplicates(["source", "target"])
+    nodes_df = pd.DataFrame(
+        {
+            "name": ["node {}".format(i) for i in range(nb_nodes)],
+            "hashtags": [["tag{}".format(i % 100)] for i in range(nb_nodes)],
+            "spikyball_hop": rng.integers(0, 3, nb_nodes),
+        }
+    )
+    g = graph_from_edgeslist(edges_df)
+
+    start = time.perf_counter()
+    add_edges_attributes(g, edges_df, drop_cols=["cid"])
+    print("add_edges_attributes on {} edges: {:.3f}s".format(len(edges_df), time.perf_counter() - start))
+    start = time.perf_counter()
+    add_node_attributes(g, nodes_df)
+    print("add_node_attributes on {} nodes: {:.3f}s".format(nb_nodes, time.perf_counter() - start))
+    start = time.perf_counter()
+    convert_to_json(edges_df)
+    print("convert_to_json on {} edges: {:.3f}s".format(len(edges_df), time.perf_counter() - start))
+
+
+if __name__ == "__main__":
+    main(*[int(x) for x in sys.argv[1:]])
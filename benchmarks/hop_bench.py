@@ -0,0 +1,25 @@
+"""Time process_hop for growing hop sizes on a large synthetic graph.
+
+Usage: python benchmarks/hop_bench.py [nb_nodes]
+"""
+
+import sys
+import time
+import networkx as nx
+from spikexplore.backends.synthetic import SyntheticNetwork
+from spikexplore.config import SyntheticConfig
+from spikexplore.graph import process_hop
+
+
+def main(nb_nodes=100000):
+    g = nx.barabasi_albert_graph(nb_nodes, 5, seed=0)
+    backend = SyntheticNetwork(g, SyntheticConfig())
+    for hop_size in [1000, 2000, 4000, 8000, 16000]:
+        start = time.perf_counter()
+        _, edges_df, _, _ = process_hop(backend, list(range(hop_size)), backend.create_node_info())
+        elapsed = time.perf_counter() - start
+        print("hop of {:6d} nodes: {:8.3f}s ({:.1f} us/node, {} edges)".format(hop_size, elapsed, 1e6 * elapsed / hop_size, len(edges_df)))
+
+
+if __name__ == "__main__":
+    main(*[int(x) for x in sys.argv[1:]])
@@ -0,0 +1,24 @@
+"""Time the edge probability computation used by the random subset selection.
+
+Usage: python benchmarks/probability_bench.py [nb_edges]
+"""
+
+import sys
+import time
+import numpy as np
+from spikexplore.collect_edges import probability_function
+
+
+def main(nb_edges=1000000):
+    rng = np.random.default_rng(0)
+    source = rng.integers(0, nb_edges // 100, nb_edges).astype(np.int32)
+    target = rng.integers(0, nb_edges // 2, nb_edges).astype(np.int32)
+    weight = rng.integers(1, 10, nb_edges).astype(float)
+    for balltype in ["spikyball", "hubball", "coreball", "fireball", "firecoreball"]:
+        start = time.perf_counter()
+        probability_function(source, target, weight, balltype, 2)
+        print("{:>12s} on {} edges: {:.3f}s".format(balltype, nb_edges, time.perf_counter() - start))
+
+
+if __name__ == "__main__":
+    main(*[int(x) for x in sys.argv[1:]])
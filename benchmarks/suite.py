@@ -0,0 +1,150 @@
+"""Benchmark suite of the exploration and graph construction on synthetic Barabási-Albert graphs.
+Records the time and the peak memory (traced by tracemalloc, in a second run) of:
+    spiky_ball: all the expansion types and random subset modes, for each graph size
+    graph: create_graph, detect_communities and save_graph on a coreball sample, for each graph size
+    latency: spiky_ball on a backend with a simulated latency, for each concurrency mode
+Graphs and explorations are seeded, so that runs on different versions of the code can be compared.
+The edges are generated as numpy arrays, the explorations use the networkx backend (SyntheticNetwork) built from them
+or the CSR one (CSRNetwork), which returns the same samples without ever building a networkx graph.
+
+Usage: python benchmarks/suite.py [--sizes 10000 100000 1000000] [--cases spiky_ball graph latency] [--backend networkx|csr]
+                                  [--no-memory] [--json results.json]
+"""
+
+import argparse
+import json
+import os
+import tempfile
+import time
+import tracemalloc
+import networkx as nx
+import numpy as np
+from spikexplore.backends.synthetic import SyntheticNetwork, CSRNetwork
+from spikexplore.collect_edges import spiky_ball
+from spikexplore.config import DataCollectionConfig, GraphConfig, SyntheticConfig
+from spikexplore.graph import detect_communities, save_graph
+from spikexplore.graph_explore import create_graph
+
+EXPANSION_TYPES = ["spikyball", "hubball", "coreball", "fireball", "firecoreball"]
+SUBSET_MODES = {"percent": 20, "constant": 1000}
+INITIAL_NODES = list(range(10))
+LATENCY = 0.002  # seconds per neighbors request
+
+
+def barabasi_albert_edges(nb_nodes, m, seed=0):
+    # Batagelj-Brandes: the target of each edge is the node at a uniformly drawn earlier edge endpoint, which draws
+    # the nodes proportionally to their degree. Node m starts as a star linked to nodes 0..m-1.
+    rng = np.random.default_rng(seed)
+    source = np.concatenate([np.full(m, m), np.repeat(np.arange(m + 1, nb_nodes), m)])
+    slots = np.zeros(len(source), dtype=np.int64)
+    slots[:m] = 2 * np.arange(m) + 1
+    first_edge = np.arange(m, len(source)) // m * m  # the endpoints before the edges of the node can be drawn
+    slots[m:] = (rng.random(len(source) - m) * 2 * first_edge).astype(np.int64)
+    # endpoint 2e is the source of edge e and 2e+1 its target, itself drawn: follow the draws until a known node
+    pending = np.flatnonzero((slots % 2 == 1) & (slots // 2 >= m))
+    while len(pending):
+        slots[pending] = slots[slots[pending] // 2]
+        pending = pending[(slots[pending] % 2 == 1) & (slots[pending] // 2 >= m)]
+    target = np.where(slots % 2 == 1, slots // 2, source[slots // 2])  # the targets of the star are 0..m-1
+    # a node may draw the same target twice, the graph is simple
+    edges = np.unique(source * nb_nodes + target)
+    return edges // nb_nodes, edges % nb_nodes
+
+
+def make_backend(edges, nb_nodes, config, backend):
+    source, target = edges
+    if backend == "csr":
+        return CSRNetwork.from_edges(source, target, config, nb_nodes=nb_nodes, directed=False)
+    g = nx.Graph()
+    g.add_nodes_from(range(nb_nodes))
+    g.add_edges_from(zip(source.tolist(), target.tolist()))
+    return SyntheticNetwork(g, config)
+
+
+def measure(fn, memory=True):
+    start = time.perf_counter()
+    result = fn()
+    seconds = time.perf_counter() - start
+    peak = None
+    if memory:
+        tracemalloc.start()
+        fn()
+        peak = tracemalloc.get_traced_memory()[1] / 2**20
+        tracemalloc.stop()
+    return result, seconds, peak
+
+
+def collection_config(expansion_type="coreball", mode="percent", **kwargs):
+    return DataCollectionConfig(
+        exploration_depth=3, random_subset_mode=mode, random_subset_size=SUBSET_MODES[mode], expansion_type=expansion_type, seed=0, **kwargs
+    )
+
+
+def run_spiky_ball(backend, cfg):
+    return spiky_ball(INITIAL_NODES, backend, cfg, node_acc=backend.create_node_info())
+
+
+def bench_spiky_ball(edges, nb_nodes, memory, backend):
+    backend = make_backend(edges, nb_nodes, SyntheticConfig(), backend)
+    for expansion_type in EXPANSION_TYPES:
+        for mode in SUBSET_MODES:
+            cfg = collection_config(expansion_type, mode)
+            (nodes, _, edges_df, _), seconds, peak = measure(lambda: run_spiky_ball(backend, cfg), memory)
+            yield {"expansion_type": expansion_type, "mode": mode, "sampled_nodes": len(nodes), "sampled_edges": len(edges_df)}, seconds, peak
+
+
+def bench_graph(edges, nb_nodes, memory, backend):
+    backend = make_backend(edges, nb_nodes, SyntheticConfig(), backend)
+    _, nodes_df, edges_df, nodes_info = run_spiky_ball(backend, collection_config())
+    graph_config = GraphConfig()
+    sample, seconds, peak = measure(lambda: create_graph(backend, nodes_df.copy(), edges_df, nodes_info, graph_config), memory)
+    params = {"sampled_nodes": sample.number_of_nodes(), "sampled_edges": sample.number_of_edges()}
+    yield {"step": "create_graph", **params}, seconds, peak
+    _, seconds, peak = measure(lambda: detect_communities(sample, seed=0), memory)
+    yield {"step": "detect_communities", **params}, seconds, peak
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        filename = os.path.join(tmp_dir, "graph.gexf")
+        _, seconds, peak = measure(lambda: save_graph(sample, filename), memory)
+    yield {"step": "save_graph", **params}, seconds, peak
+
+
+def bench_latency(edges, nb_nodes, memory, backend):
+    backend = make_backend(edges, nb_nodes, SyntheticConfig(delay=LATENCY), backend)
+    for concurrency in ["sequential", "thread", "asyncio"]:
+        cfg = collection_config(concurrency=concurrency, max_in_flight=16)
+        (nodes, _, _, _), seconds, peak = measure(lambda: run_spiky_ball(backend, cfg), memory)
+        yield {"concurrency": concurrency, "latency": LATENCY, "sampled_nodes": len(nodes)}, seconds, peak
+
+
+CASES = {"spiky_ball": bench_spiky_ball, "graph": bench_graph, "latency": bench_latency}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="spikexplore benchmark suite")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000], help="nb of nodes of the synthetic graphs")
+    parser.add_argument("--cases", nargs="+", choices=list(CASES), default=list(CASES))
+    parser.add_argument("--backend", choices=["networkx", "csr"], default="networkx")
+    parser.add_argument("--no-memory", action="store_true", help="do not measure the peak memory (halves the run time)")
+    parser.add_argument("--json", help="file where the results are saved")
+    args = parser.parse_args()
+
+    results = []
+    for nb_nodes in args.sizes:
+        start = time.perf_counter()
+        edges = barabasi_albert_edges(nb_nodes, 5, seed=0)
+        print("graph of {} nodes and {} edges generated in {:.1f}s".format(nb_nodes, len(edges[0]), time.perf_counter() - start))
+        for case in args.cases:
+            if case == "latency" and nb_nodes != min(args.sizes):
+                continue  # the latency dominates, whatever the graph size
+            for params, seconds, peak in CASES[case](edges, nb_nodes, not args.no_memory, args.backend):
+                results.append({"case": case, "backend": args.backend, "nodes": nb_nodes, **params, "seconds": seconds, "peak_mb": peak})
+                description = " ".join("{}={}".format(k, v) for k, v in params.items())
+                memory = " peak {:8.1f}MB".format(peak) if peak is not None else ""
+                print("{:>10s} {:8d} nodes {:8.3f}s{}  {}".format(case, nb_nodes, seconds, memory, description))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
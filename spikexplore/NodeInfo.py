@@ -1,6 +1,46 @@
+import numpy as np
+import pandas as pd
+
+
 class NodeInfo:  # abstract interface
     def update(self, new_info):
         raise NotImplementedError
 
     def get_nodes(self):
         raise NotImplementedError
+
+
+class FrameAccumulator:
+    """Append-only accumulation of DataFrames, keeping the first row of each index value.
+    Chunks are only concatenated, and their duplicated rows dropped, when the frame is read,
+    so that accumulating n rows costs O(n)"""
+
+    def __init__(self, df=None):
+        self.chunks = []
+        self.kept = []  # one mask per chunk, False for the rows already seen
+        self.seen = set()
+        if df is not None:
+            self.append(df)
+
+    def append(self, df):
+        if df.empty:
+            return
+        seen = self.seen
+        kept = np.ones(len(df), dtype=bool)
+        for i, key in enumerate(df.index):
+            if key in seen:
+                kept[i] = False
+            else:
+                seen.add(key)
+        self.chunks.append(df)
+        self.kept.append(kept)
+
+    def frame(self):
+        if not self.chunks:
+            return pd.DataFrame()
+        if len(self.chunks) > 1 or not self.kept[0].all():
+            df = pd.concat(self.chunks) if len(self.chunks) > 1 else self.chunks[0]
+            kept = np.concatenate(self.kept)
+            self.chunks = [df[kept] if not kept.all() else df]
+            self.kept = [np.ones(len(self.chunks[0]), dtype=bool)]
+        return self.chunks[0]
@@ -3,16 +3,91 @@ from atproto import Client, client_utils
 import networkx as nx
 import time
 import logging
+import threading
+from collections import namedtuple
+import numpy as np
 import pandas as pd
 from datetime import datetime, timedelta, timezone
 
-from atproto_client.exceptions import BadRequestError
+from atproto_client.exceptions import BadRequestError, NetworkError, RequestException
 
-from spikexplore.NodeInfo import NodeInfo
+from spikexplore.NodeInfo import NodeInfo, FrameAccumulator
+from spikexplore.cache import make_cache
+from spikexplore.scheduler import RequestScheduler
 from spikexplore.graph import add_node_attributes, add_edges_attributes
 
 logger = logging.getLogger(__name__)
 
+PROFILES_BATCH_SIZE = 25  # max nb of actors per app.bsky.actor.getProfiles request
+
+# Compact records of the fields used by the exploration, extracted once from the API models.
+# The raw post is kept only if config.keep_raw_skeets, None otherwise
+Skeet = namedtuple(
+    "Skeet",
+    [
+        "cid",
+        "author_did",
+        "author_handle",
+        "author_name",
+        "author_created_at",
+        "author_verified",
+        "created_at",
+        "mentions",
+        "hashtags",
+        "links",
+        "reply_to",
+        "repost_count",
+        "like_count",
+        "post",
+    ],
+)
+Profile = namedtuple("Profile", ["did", "handle", "followers_count", "follows_count", "posts_count", "description"])
+# skeets metadata columns taken from the profile of the author -> Profile field
+PROFILE_COLUMNS = {
+    "account_followers": "followers_count",
+    "account_following": "follows_count",
+    "account_statuses": "posts_count",
+    "account_description": "description",
+}
+
+
+def is_retryable(error):
+    # rate limits, server errors and network failures are transient
+    if isinstance(error, NetworkError):
+        return True
+    if not isinstance(error, RequestException):
+        return False
+    return error.response is None or error.response.status_code == 429 or error.response.status_code >= 500
+
+
+def retry_after(error):
+    # delay before retrying, following the rate limit headers when the server sends them
+    response = getattr(error, "response", None)
+    headers = response.headers if response is not None and response.headers else {}
+    if "retry-after" in headers:
+        try:
+            return max(float(headers["retry-after"]), 0.0)
+        except ValueError:
+            pass
+    if "ratelimit-reset" in headers:
+        try:
+            return max(float(headers["ratelimit-reset"]) - time.time(), 0.0)
+        except ValueError:
+            pass
+    return None
+
+
+def join_profiles(meta_df, profiles):
+    # add the profile columns of the authors of the skeets, after the account creation date
+    if meta_df.empty or not profiles:
+        return meta_df
+    profiles_df = pd.DataFrame(
+        [[getattr(p, f) for f in PROFILE_COLUMNS.values()] for p in profiles.values()], index=list(profiles), columns=list(PROFILE_COLUMNS)
+    )
+    columns = meta_df.columns.tolist()
+    position = columns.index("account_creation") + 1 if "account_creation" in columns else len(columns)
+    return meta_df.join(profiles_df, on="user_did")[columns[:position] + list(PROFILE_COLUMNS) + columns[position:]]
+
 
 class BlueskyCredentials:
     def __init__(self, handle, password):
@@ -21,14 +96,40 @@ class BlueskyCredentials:
 
 
 class SkeetsGetter:
-    def __init__(self, credentials, config):
+    def __init__(self, credentials, config, client=None):
         # Instantiate an object
         self.config = config
-        self.bsky_client = Client()
-        self.bsky_client.login(credentials.handle, credentials.password)
-        self.profiles_cache = {}
-        self.skeets_cache = {}
+        self.credentials = credentials
+        self._init_caches()
+        self._init_scheduler()
         self.features_attrs = {"mention": "did", "tag": "tag", "link": "uri"}
+        self.pending_profiles = {}  # did -> event (future in the async getter) completed once the request fetching it is done
+        self.pending_lock = threading.Lock()
+        self._connect(client)
+
+    def _connect(self, client):
+        self.bsky_client = client if client is not None else Client()
+        self.bsky_client.login(self.credentials.handle, self.credentials.password)
+
+    def _init_scheduler(self):
+        # endpoints are named after the client methods
+        config = self.config
+        self.scheduler = RequestScheduler(
+            config.max_in_flight, config.rate_limits, config.max_retries, config.retry_backoff, is_retryable, retry_after
+        )
+
+    def _init_caches(self):
+        ttl = self.config.cache_ttl
+        if ttl is None and self.config.max_day_old:
+            ttl = timedelta(days=self.config.max_day_old).total_seconds()  # older responses cannot contain any valid skeet
+        self.profiles_cache = make_cache(self.config.cache_path, "profiles", self.config.cache_max_entries, ttl)
+        self.skeets_cache = make_cache(self.config.cache_path, "skeets", self.config.cache_max_entries, ttl)
+
+    def cache_stats(self):
+        return {"profiles": self.profiles_cache.stats(), "skeets": self.skeets_cache.stats()}
+
+    def request_stats(self):
+        return self.scheduler.stats()
 
     def _filter_old_skeets(self, skeets):
         max_day_old = self.config.max_day_old
@@ -41,43 +142,122 @@ class SkeetsGetter:
         )
         return list(skeets_filt)
 
-    def get_profile(self, did):
-        profile = self.profiles_cache.get(did)
-        if profile is not None:
-            return profile
+    def _cache_profiles(self, dids, profiles):
+        # Profile records of the dids from the fetched profiles, None for the missing ones which are cached as well to avoid retrying them
+        records = {}
+        for did in dids:
+            profile = profiles.get(did)
+            records[did] = (
+                Profile(profile.did, profile.handle, profile.followers_count, profile.follows_count, profile.posts_count, profile.description)
+                if profile is not None
+                else None
+            )
+            self.profiles_cache[did] = records[did]
+        return records
+
+    def _fetch_profiles_batch(self, dids):
+        # A bad request (e.g. an invalid did) is split in two, so that only the dids failing alone are cached as missing.
+        # Nothing is returned for the dids failing otherwise, they will be retried
         try:
-            p = self.bsky_client.get_profile(did)
-            if p is not None:
-                self.profiles_cache[did] = p
-                return p
+            profiles = {p.did: p for p in self.scheduler.call("get_profiles", self.bsky_client.get_profiles, actors=dids).profiles}
         except BadRequestError as e:
-            logger.error(f"Error in getting profile: code {e.response.status_code} - {e.response.content.message}")
-            self.profiles_cache[did] = None  # fill the cache to avoid retrying
+            if len(dids) > 1:
+                half = len(dids) // 2
+                return {**self._fetch_profiles_batch(dids[:half]), **self._fetch_profiles_batch(dids[half:])}
+            logger.error(f"Error in getting profiles: code {e.response.status_code} - {e.response.content.message}")
+            profiles = {}
         except Exception as e:
-            logger.error("Error in getting profile: ", e)
+            logger.error(f"Error in getting profiles: {e}")
+            return {}
+        return self._cache_profiles(dids, profiles)
+
+    def _fetch_profiles(self, dids):
+        profiles = {}
+        for i in range(0, len(dids), PROFILES_BATCH_SIZE):
+            profiles.update(self._fetch_profiles_batch(dids[i : i + PROFILES_BATCH_SIZE]))
+        return profiles
+
+    def get_profiles(self, dids):
+        # Resolve profiles from their dids using bulk requests. Only the dids which are neither cached
+        # nor being fetched by another thread are requested, the ones evicted from the cache meanwhile are fetched again
+        profiles = {}
+        to_fetch = []
+        to_wait = []
+        with self.pending_lock:
+            for did in dict.fromkeys(dids):
+                entry = self.profiles_cache.get_entry(did)
+                if entry is not None:
+                    profiles[did] = entry[1]  # may be None if the profile could not be retrieved
+                elif did in self.pending_profiles:
+                    to_wait.append(did)
+                else:
+                    self.pending_profiles[did] = threading.Event()
+                    to_fetch.append(did)
+        try:
+            profiles.update(self._fetch_profiles(to_fetch))
+        finally:
+            with self.pending_lock:
+                for did in to_fetch:
+                    self.pending_profiles.pop(did).set()
+        to_refetch = []
+        for did in to_wait:
+            event = self.pending_profiles.get(did)
+            if event is not None:
+                event.wait()
+            entry = self.profiles_cache.get_entry(did)
+            if entry is not None:
+                profiles[did] = entry[1]
+            else:
+                to_refetch.append(did)
+        profiles.update(self._fetch_profiles(to_refetch))
+        return {did: profiles.get(did) for did in dict.fromkeys(dids)}
 
-        return None
+    def get_profile(self, did):
+        return self.get_profiles([did])[did]
+
+    def _feed_to_skeets(self, feed):
+        # remove old skeets
+        return {x.post.cid: self.to_skeet(x.post) for x in self._filter_old_skeets(feed)}
+
+    def to_skeet(self, post):
+        author = post.author
+        return Skeet(
+            cid=post.cid,
+            author_did=author.did,
+            author_handle=author.handle,
+            author_name=author.display_name,
+            author_created_at=author.created_at,
+            author_verified=author.verification is not None and author.verification.verified_status == "valid",
+            created_at=post.record.created_at,
+            mentions=self.facet_data(post, "mention"),
+            hashtags=self.facet_data(post, "tag"),
+            links=self.facet_data(post, "link"),
+            reply_to=post.reply.parent.author.handle if hasattr(post, "reply") else [],
+            repost_count=post.repost_count,
+            like_count=post.like_count,
+            post=post if self.config.keep_raw_skeets else None,
+        )
+
+    def _profiles_to_resolve(self, skeets):
+        # authors and mentioned users
+        dids = [x.author_did for x in skeets.values()]
+        dids += [did for x in skeets.values() for did in x.mentions]
+        return dids
 
     def get_skeets(self, username):
         skeets = self.skeets_cache.get(username)
         if skeets is not None:
             return skeets
-        user_skeets_raw = self.bsky_client.get_author_feed(actor=username, limit=self.config.max_skeets_per_user).feed
-        # remove old tweets
-        user_skeets_filt = self._filter_old_skeets(user_skeets_raw)
+        user_skeets_raw = self.scheduler.call(
+            "get_author_feed", self.bsky_client.get_author_feed, actor=username, limit=self.config.max_skeets_per_user
+        ).feed
+        skeets = self._feed_to_skeets(user_skeets_raw)
+        self.skeets_cache[username] = skeets
 
-        self.skeets_cache[username] = {x.post.cid: x.post for x in user_skeets_filt}
+        # update profile cache for the authors and mentioned users, in bulk
+        self.get_profiles(self._profiles_to_resolve(skeets))
 
-        # update profile cache
-        for v in self.skeets_cache[username].items():
-            if v[1].author.did not in self.profiles_cache:
-                try:
-                    self.profiles_cache[v[1].author.did] = self.bsky_client.get_profile(v[1].author.handle)
-                except BadRequestError as e:
-                    logger.error(f"Error in getting profile: code {e.response.status_code} - {e.response.content.message}")
-                    self.profiles_cache[v[1].author.did] = None  # fill the cache to avoid retrying
-
-        return self.skeets_cache[username]
+        return skeets
 
     def facet_data(self, skeet, data):
         if not hasattr(skeet, "record"):
@@ -90,49 +270,51 @@ class SkeetsGetter:
             if f.features[0].py_type == f"app.bsky.richtext.facet#{data}"
         ]
 
+    def skeets_metadata(self, user_skeets, profiles):
+        # the profile fields of the authors are not copied in each skeet, they are joined from the node info profiles
+        missing = [x.author_did for x in user_skeets.values() if profiles.get(x.author_did) is None]
+        if missing:
+            raise ValueError(f"missing profile of {missing[0]}")
+        return {
+            cid: {
+                "user_did": x.author_did,
+                "user": x.author_handle,
+                "name": x.author_name,
+                "mentions": x.mentions,
+                "hashtags": x.hashtags,
+                "links": x.links,
+                "repost_count": x.repost_count,
+                "favorite_count": x.like_count,
+                "reply_to": x.reply_to,
+                "created_at": x.created_at,
+                "account_creation": x.author_created_at,
+                "account_verified": x.author_verified,
+            }
+            for cid, x in user_skeets.items()
+        }
+
     def get_user_skeets(self, username):
         # Collect skeets from a username/did
-
-        count = self.config.max_skeets_per_user
-
-        # Test if ok
         try:
-
             user_skeets = self.get_skeets(username)
+            profiles = self.get_profiles(self._profiles_to_resolve(user_skeets))
+            return user_skeets, self.skeets_metadata(user_skeets, profiles), profiles
+        except BadRequestError as e:
+            logger.error(f"Error in getting user skeets: code {e.response.status_code} - {e.response.content.message}")
+            return {}, {}, {}
+        except Exception as e:
+            logger.error(f"Error in getting user skeets: {e}")
+            return {}, {}, {}
 
-            skeets_metadata = dict(
-                map(
-                    lambda x: (
-                        x[0],
-                        {
-                            "user_did": x[1].author.did,
-                            "user": x[1].author.handle,
-                            "name": x[1].author.display_name,
-                            "mentions": self.facet_data(x[1], "mention"),
-                            "hashtags": self.facet_data(x[1], "tag"),
-                            "links": self.facet_data(x[1], "link"),
-                            "repost_count": x[1].repost_count,
-                            "favorite_count": x[1].like_count,
-                            "reply_to": x[1].reply.parent.author.handle if hasattr(x[1], "reply") else [],
-                            "created_at": x[1].record.created_at,
-                            "account_creation": x[1].author.created_at,
-                            "account_followers": self.profiles_cache[x[1].author.did].followers_count,
-                            "account_following": self.profiles_cache[x[1].author.did].follows_count,
-                            "account_statuses": self.profiles_cache[x[1].author.did].posts_count,
-                            "account_description": self.profiles_cache[x[1].author.did].description,
-                            "account_verified": x[1].author.verification is not None and x[1].author.verification.verified_status == "valid",
-                        },
-                    ),
-                    user_skeets.items(),
-                )
-            )
-            return user_skeets, skeets_metadata
+    def get_skeets_or_none(self, username):
+        # skeets of a user, None if they could not be retrieved
+        try:
+            return self.get_skeets(username)
         except BadRequestError as e:
             logger.error(f"Error in getting user skeets: code {e.response.status_code} - {e.response.content.message}")
-            return {}, {}
         except Exception as e:
             logger.error(f"Error in getting user skeets: {e}")
-            return {}, {}
+        return None
 
     def reshape_node_data(self, node_df):
         node_df = node_df[
@@ -156,40 +338,85 @@ class SkeetsGetter:
 
 class BlueskyNetwork:
     class BlueskyNodeInfo(NodeInfo):
-        def __init__(self, user_hashtags=None, user_skeets=None, user_links=None, skeets_meta=pd.DataFrame()):
+        def __init__(self, user_hashtags=None, user_skeets=None, user_links=None, skeets_meta=pd.DataFrame(), user_profiles=None):
             self.user_hashtags = user_hashtags if user_hashtags else {}
             self.user_links = user_links if user_links else {}
             self.user_skeets = user_skeets if user_skeets else {}
+            self.user_profiles = user_profiles if user_profiles else {}  # did -> Profile of the authors of the skeets
             self.skeets_meta = skeets_meta
 
+        @property
+        def skeets_meta(self):
+            # metadata of the skeets, the first one being kept when a skeet is collected several times
+            return join_profiles(self.skeets_meta_acc.frame(), self.user_profiles)
+
+        @skeets_meta.setter
+        def skeets_meta(self, skeets_meta):
+            self.skeets_meta_acc = FrameAccumulator(skeets_meta)
+
         def update(self, new_info):
             self.user_hashtags.update(new_info.user_hashtags)
             self.user_skeets.update(new_info.user_skeets)
-            self.user_links.update(new_info.user_skeets)
-            self.skeets_meta = pandas.concat([self.skeets_meta, new_info.skeets_meta])
-            self.skeets_meta = self.skeets_meta[~self.skeets_meta.index.duplicated(keep="first")]
+            self.user_links.update(new_info.user_links)
+            self.user_profiles.update(new_info.user_profiles)
+            self.skeets_meta_acc.append(new_info.skeets_meta_acc.frame())
 
         def get_nodes(self):
             return self.skeets_meta
 
-    def __init__(self, credentials, config):
-        self.skeets_getter = SkeetsGetter(credentials, config)
+    def __init__(self, credentials, config, client=None):
+        self.skeets_getter = SkeetsGetter(credentials, config, client)
         self.config = config
 
+    def cache_stats(self):
+        return self.skeets_getter.cache_stats()
+
+    def request_stats(self):
+        return self.skeets_getter.request_stats()
+
     def create_node_info(self):
         return self.BlueskyNodeInfo()
 
     def get_neighbors(self, user):
         if not isinstance(user, str):
             return self.BlueskyNodeInfo(), pd.DataFrame()
-        skeets_dic, skeets_meta = self.skeets_getter.get_user_skeets(user)
-        edges_df, node_info = self.edges_nodes_from_user(user, skeets_meta, skeets_dic)
-
-        # replace user and mentions by source and target
-        if not edges_df.empty:
-            edges_df.index.names = ["source", "target"]
-            edges_df.reset_index(level=["source", "target"], inplace=True)
-
+        skeets_dic, skeets_meta, profiles = self.skeets_getter.get_user_skeets(user)
+        return self.neighbors_from_skeets(user, skeets_dic, skeets_meta, profiles)
+
+    def get_neighbors_batch(self, users, executor):
+        # The skeets of the users are fetched through the executor, the profiles of their authors and mentioned users being
+        # mostly resolved in bulk along with them, then the node info and edges of all the users are extracted at once
+        users = [user for user in dict.fromkeys(users) if isinstance(user, str)]
+        users_skeets = executor.map(self.skeets_getter.get_skeets_or_none, users)
+        dids = [did for skeets in users_skeets if skeets for did in self.skeets_getter._profiles_to_resolve(skeets)]
+        profiles = executor.map(self.skeets_getter.get_profiles, [dids])[0]
+        feeds = []
+        for user, skeets_dic in zip(users, users_skeets):
+            if skeets_dic is None:
+                continue
+            try:
+                feeds.append((user, skeets_dic, self.skeets_getter.skeets_metadata(skeets_dic, profiles)))
+            except Exception as e:
+                logger.error(f"Error in getting user skeets: {e}")  # e.g. missing profile
+        return self.neighbors_from_feeds(feeds, profiles)
+
+    def neighbors_from_skeets(self, user, skeets_dic, skeets_meta, profiles):
+        return self.neighbors_from_feeds([(user, skeets_dic, skeets_meta)], profiles)
+
+    def neighbors_from_feeds(self, feeds, profiles):
+        # node info and edges of several users, from the (user, skeets_dic, skeets_meta) of their feeds and the profiles of the authors
+        # and mentioned users
+        feeds = [feed for feed in feeds if feed[2]]
+        if not feeds:
+            return self.BlueskyNodeInfo(), pd.DataFrame()
+        # one table of the skeets of all the feeds, the feed column being the position of the feed owner
+        meta_df = pd.DataFrame(
+            [m for _, _, skeets_meta in feeds for m in skeets_meta.values()], index=[cid for _, _, skeets_meta in feeds for cid in skeets_meta]
+        )
+        feed = np.repeat(np.arange(len(feeds)), [len(skeets_meta) for _, _, skeets_meta in feeds])
+        owners = [user for user, _, _ in feeds]
+        edges_df = self.get_edges(meta_df, feed, owners, profiles)
+        node_info = self.get_nodes_properties(meta_df, feed, [skeets_dic for _, skeets_dic, _ in feeds], profiles)
         return node_info, edges_df
 
     def filter(self, node_info, edges_df):
@@ -198,6 +425,9 @@ class BlueskyNetwork:
         edges_df = self.filter_edges(edges_df)
         return node_info, edges_df
 
+    def filter_batch(self, node_info, edges_df):
+        return self.filter(node_info, edges_df)  # the edges are filtered on their own properties only
+
     def filter_edges(self, edges_df):
         # filter edges according to their properties
         if edges_df.empty:
@@ -209,92 +439,72 @@ class BlueskyNetwork:
         return users_connected
 
     def neighbors_with_weights(self, edges_df):
+        # nb of users linked to each user
         if edges_df.empty:
             return {}
-        user_list = self.neighbors_list(edges_df)
-        return dict.fromkeys(user_list, 1)
+        return edges_df["target"].value_counts(sort=False).to_dict()
 
     ###############################################################
     # Functions for extracting skeet info from the bluesky API
     ###############################################################
 
-    def edges_nodes_from_user(self, user, skeets_meta, skeets_dic):
-        # Make an edge and node property dataframes
-        edges_df = self.get_edges(user, skeets_meta)
-        user_info = self.get_nodes_properties(skeets_meta, skeets_dic)
-        return edges_df, user_info
-
-    def did_to_handle(self, did):
-        profile = self.skeets_getter.get_profile(did)
-        if profile is not None:
-            return profile.handle
-        return None
-
-    def match_usernames(self, meta_df):
+    def match_usernames(self, meta_df, profiles):
+        # the mentioned dids are replaced by the handles of their resolved profiles, mentions without profile are dropped
         mask = meta_df["mentions"].str.startswith("did:")
-        meta_df.loc[mask, "mentions"] = meta_df.loc[mask, "mentions"].apply(self.did_to_handle)
+        handles = {did: p.handle for did, p in profiles.items() if p is not None}
+        meta_df.loc[mask, "mentions"] = meta_df.loc[mask, "mentions"].map(handles)
 
         return meta_df.dropna(subset=["mentions"])
 
-    def get_edges(self, user, skeets_meta):
-        if not skeets_meta:
-            return pd.DataFrame()
-        # Create the user -> mention table with their properties fom the list of tweets of a user
-        mentions_df = pd.DataFrame.from_dict(skeets_meta, orient="index")
-        mentions_df["full_mentions"] = mentions_df["mentions"] + mentions_df["reply_to"]  # a reply is a kind of mention
-        mentions_df = (
-            mentions_df.drop(columns=["reply_to", "mentions"]).explode("full_mentions").dropna().rename(columns={"full_mentions": "mentions"})
-        )
-        # Some bots to be removed from the collection
-        users_to_remove = self.config.users_to_remove
-
+    def get_edges(self, meta_df, feed, owners, profiles):
+        # Edges of the feeds: author -> mentioned user (a reply being a kind of mention) and feed owner -> author of a repost.
+        # Edges are computed per feed as the min_mentions filter applies to the weights within a feed
+        full_mentions = [m + (r if isinstance(r, list) else [r]) for m, r in zip(meta_df["mentions"], meta_df["reply_to"])]
+        mentions_df = pd.DataFrame({"feed": feed, "user": meta_df["user"].to_numpy(), "mentions": full_mentions, "cid": meta_df.index})
+        mentions_df = mentions_df.explode("mentions").dropna(subset=["mentions"])
         # mentions can be dids so need to translate that first into user handles
-        mentions_df = self.match_usernames(mentions_df)
-        filtered_mentions_df = mentions_df[~mentions_df["mentions"].isin(users_to_remove) & ~mentions_df["mentions"].isin(mentions_df["user"])]
-
-        # group by mentions and keep list of tweets for each mention
-        tmp = filtered_mentions_df.groupby(["user", "mentions"]).apply(lambda x: (x.index.tolist(), len(x.index)), include_groups=False)
-        if tmp.empty:
-            edge_mentions_df = pd.DataFrame([], columns=["source", "target", "cid", "weight"])
-        else:
-            edge_mentions_df = pd.DataFrame(tmp.tolist(), index=tmp.index).rename(columns={0: "cid", 1: "weight"})
-            edge_mentions_df.index.names = ["source", "target"]
-        # Now get reposts
-        repost_df = pd.DataFrame.from_dict(skeets_meta, orient="index")
-        repost_df["source_user"] = user
-        # remove self edges
-        repost_df = repost_df[repost_df["user"] != repost_df["source_user"]]
-        tmp = repost_df.groupby(["source_user", "user"]).apply(lambda x: (x.index.tolist(), len(x.index)), include_groups=False)
-        if tmp.empty:
-            edge_repost_df = pd.DataFrame([], columns=["source", "target", "cid", "weight"])
-        else:
-            edge_repost_df = pd.DataFrame(tmp.tolist(), index=tmp.index).rename(columns={0: "cid", 1: "weight"})
-            edge_repost_df.index.names = ["source", "target"]
-        edges_df = pd.concat([edge_mentions_df, edge_repost_df]).groupby(["source", "target"]).sum()
-        return edges_df
-
-    def get_nodes_properties(self, skeets_meta, skeets_dic):
-        if not skeets_meta:
-            return self.BlueskyNodeInfo({}, {}, {}, pd.DataFrame())
+        mentions_df = self.match_usernames(mentions_df, profiles)
+        # Some bots to be removed from the collection, as well as the mentions of authors of the same feed
+        feed_authors = pd.MultiIndex.from_arrays([mentions_df["feed"], mentions_df["user"]])
+        feed_mentions = pd.MultiIndex.from_arrays([mentions_df["feed"], mentions_df["mentions"]])
+        mentions_df = mentions_df[~mentions_df["mentions"].isin(self.config.users_to_remove) & ~feed_mentions.isin(feed_authors)]
+        # Now get reposts, without self edges
+        repost_df = pd.DataFrame(
+            {"feed": feed, "user": np.array(owners, dtype=object)[feed], "mentions": meta_df["user"].to_numpy(), "cid": meta_df.index}
+        )
+        repost_df = repost_df[repost_df["user"] != repost_df["mentions"]]
+        # group by feed, user and mention and keep the list of skeets of each edge, mentions first
+        edges = pd.concat([mentions_df, repost_df]).rename(columns={"user": "source", "mentions": "target"})
+        grouped = edges.groupby(["feed", "source", "target"])["cid"]
+        edges_df = pd.DataFrame({"cid": grouped.agg(list), "weight": grouped.size()})
+        return edges_df.reset_index(level=["source", "target"]).reset_index(drop=True)
+
+    def count_by_feed(self, meta_df, column, user_names):
+        # counts of the values of a list column in each feed, by decreasing count, keyed by user name
+        values = meta_df[["feed", column]].explode(column).dropna(subset=[column])
+        counts = values.groupby(["feed", column]).size().sort_values(ascending=False, kind="stable")
+        feed_counts = {feed: {} for feed in user_names.index}
+        for (feed, value), count in counts.items():
+            feed_counts[feed][value] = int(count)
+        return {user_names[feed]: feed_counts[feed] for feed in user_names.index}
+
+    def get_nodes_properties(self, meta_df, feed, skeets_dics, profiles):
         nb_popular_skeets = self.config.nb_popular_skeets
-        # global properties
-        meta_df = pd.DataFrame.from_dict(skeets_meta, orient="index").sort_values("repost_count", ascending=False)
-        # hashtags statistics
-        ht_df = meta_df.explode("hashtags").dropna()
-        htgb = ht_df.groupby(["hashtags"]).size()
-        user_hashtags = pd.DataFrame(htgb).rename(columns={0: "count"}).sort_values("count", ascending=False).to_dict()
-        links_df = meta_df.explode("links").dropna()
-        links = links_df.groupby(["links"]).size()
-        user_links = pd.DataFrame(links).rename(columns={0: "count"}).sort_values("count", ascending=False).to_dict()
-        user_name = meta_df["user"].iloc[0]
-        skeets_meta_kept = meta_df.head(nb_popular_skeets)
-        skeets_kept = {k: skeets_dic[k] for k in skeets_meta_kept.index.to_list()}
-        # Get most popular tweets of user
+        # global properties, skeets of each feed being sorted by popularity
+        meta_df = meta_df.assign(feed=feed).sort_values(["feed", "repost_count"], ascending=[True, False], kind="stable")
+        user_names = meta_df.groupby("feed")["user"].first()
+        # hashtags and links statistics
+        user_hashtags = self.count_by_feed(meta_df, "hashtags", user_names)
+        user_links = self.count_by_feed(meta_df, "links", user_names)
+        # Get most popular skeets of users
+        skeets_meta_kept = meta_df.groupby("feed").head(nb_popular_skeets)
+        skeets_kept = {cid: skeets_dics[f][cid] for f, cid in zip(skeets_meta_kept["feed"], skeets_meta_kept.index)}
         return self.BlueskyNodeInfo(
-            user_hashtags={user_name: user_hashtags["count"]},
+            user_hashtags=user_hashtags,
             user_skeets=skeets_kept,
-            user_links={user_name: user_links["count"]},
-            skeets_meta=skeets_meta_kept,
+            user_links=user_links,
+            skeets_meta=skeets_meta_kept.drop(columns="feed"),
+            user_profiles={did: profiles[did] for did in skeets_meta_kept["user_did"].unique()},
         )
 
     #####################################################
@@ -305,3 +515,9 @@ class BlueskyNetwork:
         g = add_edges_attributes(g, edges_df, drop_cols=["cid"])
         g = add_node_attributes(g, self.skeets_getter.reshape_node_data(nodes_df), attr_dic=nodes_info.user_hashtags, attr_name="all_hashtags")
         return g
+
+    def graph_tables(self, nodes_df, edges_df, nodes_info):
+        # node and edge attribute tables of the graph (see SparseGraph)
+        nodes_table = self.skeets_getter.reshape_node_data(nodes_df)
+        nodes_table["all_hashtags"] = [nodes_info.user_hashtags.get(user) for user in nodes_table.index]
+        return nodes_table, edges_df.drop(columns=["cid"], errors="ignore")
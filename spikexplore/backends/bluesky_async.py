@@ -0,0 +1,157 @@
+import asyncio
+import logging
+import pandas as pd
+from atproto import AsyncClient
+from atproto_client.exceptions import BadRequestError
+
+from spikexplore.backends.bluesky import BlueskyNetwork, SkeetsGetter, PROFILES_BATCH_SIZE
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncSkeetsGetter(SkeetsGetter):
+    """SkeetsGetter using the atproto AsyncClient, its requests being run on the event loop by the scheduler"""
+
+    def _connect(self, client):
+        # the client logs in from the event loop running the requests
+        self.client = client
+        self.bsky_client = None
+        self.session_string = None
+        self.loop = None
+        self.ready = None
+
+    async def _close(self, client):
+        try:
+            await client.request.close()
+        except Exception as e:
+            logger.debug(f"Error in closing the client: {e}")  # e.g. its event loop is already closed
+
+    async def _login(self, previous):
+        if previous is not None:
+            await self._close(previous)
+        self.bsky_client = self.client if self.client is not None else AsyncClient()
+        if self.session_string is not None:
+            await self.bsky_client.login(session_string=self.session_string)
+        else:
+            await self.bsky_client.login(self.credentials.handle, self.credentials.password)
+            self.session_string = self.bsky_client.export_session_string()
+
+    async def _ensure_client(self):
+        # The http session of the client is bound to the event loop it was created in, the client created
+        # for the previous loop is closed and a new one logs in (reusing the session) when called from a new loop
+        loop = asyncio.get_running_loop()
+        if self.loop is not loop:
+            self.loop = loop
+            self.pending_profiles = {}
+            self.ready = asyncio.ensure_future(self._login(self.bsky_client if self.client is None else None))
+        await self.ready
+
+    async def _request(self, method, **kwargs):
+        await self._ensure_client()
+        return await self.scheduler.acall(method, getattr(self.bsky_client, method), **kwargs)
+
+    async def _fetch_profiles_batch(self, dids):
+        try:
+            profiles = {p.did: p for p in (await self._request("get_profiles", actors=dids)).profiles}
+        except BadRequestError as e:
+            if len(dids) > 1:
+                half = len(dids) // 2
+                first, second = await asyncio.gather(self._fetch_profiles_batch(dids[:half]), self._fetch_profiles_batch(dids[half:]))
+                return {**first, **second}
+            logger.error(f"Error in getting profiles: code {e.response.status_code} - {e.response.content.message}")
+            profiles = {}
+        except Exception as e:
+            logger.error(f"Error in getting profiles: {e}")
+            return {}  # do not cache anything, it will be retried
+        return self._cache_profiles(dids, profiles)
+
+    async def _fetch_profiles(self, dids):
+        profiles = {}
+        for batch in await asyncio.gather(
+            *[self._fetch_profiles_batch(dids[i : i + PROFILES_BATCH_SIZE]) for i in range(0, len(dids), PROFILES_BATCH_SIZE)]
+        ):
+            profiles.update(batch)
+        return profiles
+
+    async def get_profiles(self, dids):
+        await self._ensure_client()
+        profiles = {}
+        to_fetch = []
+        to_wait = []
+        for did in dict.fromkeys(dids):
+            entry = self.profiles_cache.get_entry(did)
+            if entry is not None:
+                profiles[did] = entry[1]  # may be None if the profile could not be retrieved
+            elif did in self.pending_profiles:
+                to_wait.append(did)
+            else:
+                self.pending_profiles[did] = self.loop.create_future()
+                to_fetch.append(did)
+        try:
+            profiles.update(await self._fetch_profiles(to_fetch))
+        finally:
+            for did in to_fetch:
+                self.pending_profiles.pop(did).set_result(None)
+        await asyncio.gather(*[self.pending_profiles[did] for did in to_wait if did in self.pending_profiles])
+        # the profiles fetched by other coroutines may have been evicted from the cache meanwhile
+        to_refetch = []
+        for did in to_wait:
+            entry = self.profiles_cache.get_entry(did)
+            if entry is not None:
+                profiles[did] = entry[1]
+            else:
+                to_refetch.append(did)
+        profiles.update(await self._fetch_profiles(to_refetch))
+        return {did: profiles.get(did) for did in dict.fromkeys(dids)}
+
+    async def get_profile(self, did):
+        return (await self.get_profiles([did]))[did]
+
+    async def get_skeets(self, username):
+        skeets = self.skeets_cache.get(username)
+        if skeets is not None:
+            return skeets
+        user_skeets_raw = (await self._request("get_author_feed", actor=username, limit=self.config.max_skeets_per_user)).feed
+        skeets = self._feed_to_skeets(user_skeets_raw)
+        self.skeets_cache[username] = skeets
+
+        # update profile cache for the authors and mentioned users, in bulk
+        await self.get_profiles(self._profiles_to_resolve(skeets))
+        return skeets
+
+    async def get_skeets_or_none(self, username):
+        try:
+            return await self.get_skeets(username)
+        except BadRequestError as e:
+            logger.error(f"Error in getting user skeets: code {e.response.status_code} - {e.response.content.message}")
+        except Exception as e:
+            logger.error(f"Error in getting user skeets: {e}")
+        return None
+
+    async def get_user_skeets(self, username):
+        # Collect skeets from a username/did
+        try:
+            user_skeets = await self.get_skeets(username)
+            profiles = await self.get_profiles(self._profiles_to_resolve(user_skeets))
+            return user_skeets, self.skeets_metadata(user_skeets, profiles), profiles
+        except BadRequestError as e:
+            logger.error(f"Error in getting user skeets: code {e.response.status_code} - {e.response.content.message}")
+            return {}, {}, {}
+        except Exception as e:
+            logger.error(f"Error in getting user skeets: {e}")
+            return {}, {}, {}
+
+
+class AsyncBlueskyNetwork(BlueskyNetwork):
+    """Bluesky backend with a coroutine get_neighbors. The exploration drives it from an event loop,
+    so that all the nodes of a hop are fetched concurrently"""
+
+    def __init__(self, credentials, config, client=None):
+        self.skeets_getter = AsyncSkeetsGetter(credentials, config, client)
+        self.config = config
+
+    async def get_neighbors(self, user):
+        if not isinstance(user, str):
+            return self.BlueskyNodeInfo(), pd.DataFrame()
+        skeets_dic, skeets_meta, profiles = await self.skeets_getter.get_user_skeets(user)
+        return self.neighbors_from_skeets(user, skeets_dic, skeets_meta, profiles)
@@ -1,5 +1,9 @@
+import os
+import time
 import networkx as nx
+import numpy as np
 import pandas as pd
+from scipy import sparse
 from spikexplore.NodeInfo import NodeInfo
 from spikexplore.graph import add_node_attributes, add_edges_attributes
 
@@ -27,6 +31,8 @@ class SyntheticNetwork:
         # collect info on the node and its (out going) edges
         # return 2 dataframes, one with edges info and the other with the node info
         G = self.G
+        if self.config.delay:
+            time.sleep(self.config.delay)  # simulate a remote backend
         if node_id not in G:
             return self.SynthNodeInfo(pd.DataFrame()), pd.DataFrame()
         # node data
@@ -45,6 +51,21 @@ class SyntheticNetwork:
         edges_df["weight"] = 1.0
         return self.SynthNodeInfo(node_df), edges_df
 
+    def get_neighbors_batch(self, node_list, executor=None):
+        # same as get_neighbors for all the nodes of a hop, with a single node and edges table
+        if self.config.delay:
+            return None  # the latency is simulated per node, fetch them one by one
+        G = self.G
+        nodes = [node for node in node_list if node in G]
+        nodes_df = pd.DataFrame([{"source": node, **G.nodes[node]} for node in nodes])
+        edges = [(node, target, data) for node in nodes for target, data in G.adj[node].items()]  # out going edges if directed
+        edges_df = pd.DataFrame({"source": [e[0] for e in edges], "target": [e[1] for e in edges]})
+        attrs_df = pd.DataFrame([e[2] for e in edges])
+        if not attrs_df.empty:
+            edges_df = pd.concat([edges_df, attrs_df], axis=1)
+        edges_df["weight"] = 1.0
+        return self.SynthNodeInfo(nodes_df), edges_df
+
     def filter(self, node_info, edges_df):
         if len(edges_df) < self.config.min_degree:
             # discard the node
@@ -54,21 +75,31 @@ class SyntheticNetwork:
         edges_df = self.filter_edges(edges_df)
         return node_info, edges_df
 
+    def filter_batch(self, node_info, edges_df):
+        # discard the nodes with less than min_degree edges
+        nodes_df = node_info.get_nodes()
+        if nodes_df.empty:
+            return node_info, edges_df
+        degrees = edges_df["source"].value_counts()
+        kept = nodes_df["source"].map(degrees).fillna(0).to_numpy() >= self.config.min_degree
+        nodes_df = nodes_df[kept]
+        edges_df = edges_df[edges_df["source"].isin(nodes_df["source"])]
+        return self.SynthNodeInfo(nodes_df), self.filter_edges(edges_df)
+
     def filter_edges(self, edges_df):
         return edges_df
 
     def neighbors_list(self, edges_df):
         if edges_df.empty:
-            return edges_df
-        neighbors = edges_df["target"].unique().tolist()
-        return neighbors
+            return []
+        return edges_df["target"].unique().tolist()
 
     def neighbors_with_weights(self, edges_df):
-        node_list = self.neighbors_list(edges_df)
-        node_dic = {}
-        for node in node_list:
-            node_dic[node] = len(edges_df)  # degree of the node
-        return node_dic
+        # each neighbor gets the degree of the node it is linked from, summed over these nodes
+        if edges_df.empty:
+            return {}
+        source_degree = edges_df.groupby("source")["target"].transform("size")
+        return source_degree.groupby(edges_df["target"]).sum().to_dict()
 
     def reshape_node_data(self, nodes_df):
         nodes_df.set_index("source", inplace=True)
@@ -78,3 +109,74 @@ class SyntheticNetwork:
         g = add_edges_attributes(g, edges_df)
         g = add_node_attributes(g, self.reshape_node_data(nodes_df))
         return g
+
+    def graph_tables(self, nodes_df, edges_df, nodes_info):
+        # node and edge attribute tables of the graph (see SparseGraph)
+        return self.reshape_node_data(nodes_df), edges_df
+
+
+class CSRNetwork(SyntheticNetwork):
+    """In-memory backend serving the neighbors of a graph stored as a CSR adjacency matrix.
+    Nodes are the integers 0..n-1 and the edges of a node are the non-zero entries of its row, their values being the weights.
+    The neighbors of a whole hop are gathered with array slices by get_neighbors_batch, without any networkx graph
+    nor per-node DataFrame. config.delay is added once per request, a hop being a single request"""
+
+    def __init__(self, adjacency, config):
+        adjacency = sparse.csr_array(adjacency)
+        adjacency.sum_duplicates()
+        self.indptr = adjacency.indptr
+        self.indices = adjacency.indices
+        self.data = adjacency.data
+        self.nb_nodes = adjacency.shape[0]
+        self.config = config
+
+    @classmethod
+    def from_edges(cls, source, target, config, weight=None, nb_nodes=None, directed=True):
+        # undirected graphs get both edge directions
+        source, target = np.asarray(source), np.asarray(target)
+        weight = np.ones(len(source)) if weight is None else np.asarray(weight, dtype=float)
+        if nb_nodes is None:
+            nb_nodes = int(max(source.max(), target.max())) + 1 if len(source) else 0
+        if not directed:
+            mirrored = source != target
+            source, target = np.concatenate([source, target[mirrored]]), np.concatenate([target, source[mirrored]])
+            weight = np.concatenate([weight, weight[mirrored]])
+        return cls(sparse.csr_array((weight, (source, target)), shape=(nb_nodes, nb_nodes)), config)
+
+    @classmethod
+    def load(cls, path, config, mmap=True):
+        # load the arrays written by save, memory-mapped so that the graph does not have to fit in memory
+        network = cls.__new__(cls)
+        mmap_mode = "r" if mmap else None
+        network.indptr = np.load(os.path.join(path, "indptr.npy"), mmap_mode=mmap_mode)
+        network.indices = np.load(os.path.join(path, "indices.npy"), mmap_mode=mmap_mode)
+        network.data = np.load(os.path.join(path, "data.npy"), mmap_mode=mmap_mode)
+        network.nb_nodes = len(network.indptr) - 1
+        network.config = config
+        return network
+
+    def save(self, path):
+        os.makedirs(path, exist_ok=True)
+        for name in ["indptr", "indices", "data"]:
+            np.save(os.path.join(path, name + ".npy"), getattr(self, name))
+
+    def degree(self, nodes):
+        return self.indptr[nodes + 1] - self.indptr[nodes]
+
+    def get_neighbors_batch(self, node_list, executor=None):
+        # node info and edges of all the nodes at once
+        if self.config.delay:
+            time.sleep(self.config.delay)  # simulate a remote backend
+        nodes = np.array([n for n in node_list if isinstance(n, (int, np.integer)) and 0 <= n < self.nb_nodes], dtype=np.int64)
+        starts = self.indptr[nodes]
+        lengths = self.indptr[nodes + 1] - starts
+        # positions of the edges of all the nodes in the CSR arrays
+        offsets = np.repeat(starts - np.cumsum(lengths) + lengths, lengths)
+        positions = offsets + np.arange(len(offsets))
+        edges_df = pd.DataFrame(
+            {"source": np.repeat(nodes, lengths), "target": self.indices[positions].astype(np.int64), "weight": self.data[positions].astype(float)}
+        )
+        return self.SynthNodeInfo(pd.DataFrame({"source": nodes})), edges_df
+
+    def get_neighbors(self, node_id):
+        return self.get_neighbors_batch([node_id])
@@ -1,12 +1,42 @@
+import json
 import logging
+import urllib.error
+import urllib.parse
+import urllib.request
 import wikipediaapi
 import pandas as pd
 from spikexplore.NodeInfo import NodeInfo
 from spikexplore.graph import add_node_attributes, add_edges_attributes
+from spikexplore.scheduler import RequestScheduler
 
 
 logger = logging.getLogger(__name__)
 
+MAX_TITLES_PER_QUERY = 50  # MediaWiki limit for non-bot users
+
+
+def _status_code(error):
+    # http status of a failed urllib (API queries) or wikipediaapi (http client error with a response) call
+    if isinstance(error, urllib.error.HTTPError):
+        return error.code
+    return getattr(getattr(error, "response", None), "status_code", None)
+
+
+def is_retryable(error):
+    # rate limits, server errors and network failures are transient
+    status = _status_code(error)
+    if status is not None:
+        return status == 429 or status >= 500
+    return isinstance(error, (urllib.error.URLError, ConnectionError, TimeoutError))
+
+
+def retry_after(error):
+    headers = error.headers if isinstance(error, urllib.error.HTTPError) else getattr(getattr(error, "response", None), "headers", None)
+    try:
+        return max(float(headers["Retry-After"]), 0.0) if headers and "Retry-After" in headers else None
+    except ValueError:
+        return None
+
 
 class WikipediaNetwork:
     class WikipediaNodeInfo(NodeInfo):
@@ -24,24 +54,113 @@ class WikipediaNetwork:
     def __init__(self, config):
         self.api = wikipediaapi.Wikipedia(user_agent=config.user_agent, language=config.lang)
         self.config = config
+        self.api_url = config.api_url if config.api_url else "https://{}.wikipedia.org/w/api.php".format(config.lang)
+        self.prefetched_links = {}  # title -> (resolved title, list of (link title, namespace)), filled in batched mode
+        self.scheduler = RequestScheduler(
+            config.max_in_flight, config.rate_limits, config.max_retries, config.retry_backoff, is_retryable, retry_after
+        )
+
+    def __getstate__(self):
+        # the http session of the api cannot be copied to another process, a copy opens its own
+        state = self.__dict__.copy()
+        del state["api"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.api = wikipediaapi.Wikipedia(user_agent=self.config.user_agent, language=self.config.lang)
 
     def create_node_info(self):
         return self.WikipediaNodeInfo()
 
+    def request_stats(self):
+        return self.scheduler.stats()
+
+    def _get_json(self, url):
+        request = urllib.request.Request(url, headers={"User-Agent": self.config.user_agent})
+        with urllib.request.urlopen(request) as response:
+            return json.load(response)
+
+    def _query(self, params):
+        params = {"action": "query", "format": "json", "formatversion": 2, **params}
+        return self.scheduler.call("query", self._get_json, self.api_url + "?" + urllib.parse.urlencode(params))
+
+    def fetch_links(self, titles):
+        # Links of several pages with a single query, following the pagination. Returns a dict mapping each requested
+        # title to its title after normalization and redirection, as the per page api returns it, and a list of (link title, namespace)
+        params = {"prop": "links", "titles": "|".join(titles), "pllimit": "max", "redirects": 1}
+        links = {}
+        resolved = {title: title for title in titles}
+        cont = {}
+        while True:
+            data = self._query({**params, **cont})
+            query = data.get("query", {})
+            # requested titles may be normalized and/or redirected
+            for mapping in query.get("normalized", []) + query.get("redirects", []):
+                for title, target in resolved.items():
+                    if target == mapping["from"]:
+                        resolved[title] = mapping["to"]
+            for page in query.get("pages", []):
+                page_links = links.setdefault(page["title"], [])
+                page_links.extend((link["title"], link["ns"]) for link in page.get("links", []))
+            if "continue" not in data:
+                break
+            cont = data["continue"]
+        return {title: (target, links.get(target, [])) for title, target in resolved.items()}
+
+    def prefetch(self, pages):
+        batch_size = min(self.config.batch_size, MAX_TITLES_PER_QUERY)
+        if batch_size <= 0:
+            return
+        pages = [p for p in dict.fromkeys(pages) if isinstance(p, str) and p not in self.prefetched_links]
+        for i in range(0, len(pages), batch_size):
+            try:
+                self.prefetched_links.update(self.fetch_links(pages[i : i + batch_size]))
+            except Exception as e:
+                logger.error(f"Error in getting links: {e}")
+
+    def get_page_links(self, page):
+        if self.config.batch_size > 0:
+            if page not in self.prefetched_links:
+                self.prefetch([page])
+            return self.prefetched_links.pop(page, (page, []))
+        # a single call per page, wikipediaapi follows the pagination itself
+        return self.scheduler.call("page", self._page_links, page)
+
+    def _page_links(self, page):
+        p = self.api.page(page)
+        return p.title, [(k, v.namespace) for k, v in p.links.items()]
+
     def get_neighbors(self, page):
         if not isinstance(page, str):
             return self.WikipediaNodeInfo(), pd.DataFrame()
-        p = self.api.page(page)
-        links = list(p.links.keys())
-        ns = [v.namespace for k, v in p.links.items()]
-        edges_df = pd.DataFrame(links, columns=["target"])
-        edges_df["source"] = p.title
+        title, links = self.get_page_links(page)
+        edges_df = pd.DataFrame([link for link, _ in links], columns=["target"])
+        edges_df["source"] = title
         edges_df = edges_df.reindex(columns=["source", "target"])
 
         edges_df["weight"] = 1.0
-        edges_df["target_ns"] = ns
+        edges_df["target_ns"] = [ns for _, ns in links]
+
+        node_info = self.WikipediaNodeInfo({title: []}, pd.DataFrame([title], columns=["title"]))
+        return node_info, edges_df
 
-        node_info = self.WikipediaNodeInfo({p.title: []}, pd.DataFrame([p.title], columns=["title"]))
+    def get_neighbors_batch(self, pages, executor=None):
+        # links of all the pages of a hop with a few queries, in batched mode only
+        if self.config.batch_size <= 0:
+            return None
+        pages = [page for page in dict.fromkeys(pages) if isinstance(page, str)]
+        self.prefetch(pages)
+        titles, links = zip(*[self.prefetched_links.pop(page, (page, [])) for page in pages]) if pages else ((), ())
+        edges_df = pd.DataFrame(
+            {
+                "source": [title for title, page_links in zip(titles, links) for _ in page_links],
+                "target": [link for page_links in links for link, _ in page_links],
+                "weight": 1.0,
+                "target_ns": [ns for page_links in links for _, ns in page_links],
+            }
+        )
+        node_info = self.WikipediaNodeInfo({title: [] for title in titles}, pd.DataFrame(list(titles), columns=["title"]))
         return node_info, edges_df
 
     def neighbors_list(self, edges_df):
@@ -51,8 +170,10 @@ class WikipediaNetwork:
         return pages_connected
 
     def neighbors_with_weights(self, edges_df):
-        pages_list = self.neighbors_list(edges_df)
-        return dict.fromkeys(pages_list, 1)
+        # nb of pages linking to each page
+        if edges_df.empty:
+            return {}
+        return edges_df["target"].value_counts(sort=False).to_dict()
 
     def filter(self, node_info, edges_df):
         logger.debug("Filtering {} edges".format(len(edges_df)))
@@ -61,6 +182,9 @@ class WikipediaNetwork:
         logger.debug("{} edges remaining after filtering".format(len(edges_df_filt)))
         return node_info, edges_df_filt
 
+    def filter_batch(self, node_info, edges_df):
+        return self.filter(node_info, edges_df)  # the edges are filtered on their own properties only
+
     def reshape_node_data(self, nodes_df):
         nodes_df.set_index("title", inplace=True)
         return nodes_df
@@ -69,3 +193,7 @@ class WikipediaNetwork:
         g = add_edges_attributes(g, edges_df)
         g = add_node_attributes(g, self.reshape_node_data(nodes_df))
         return g
+
+    def graph_tables(self, nodes_df, edges_df, nodes_info):
+        # node and edge attribute tables of the graph (see SparseGraph)
+        return self.reshape_node_data(nodes_df), edges_df
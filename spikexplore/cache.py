@@ -0,0 +1,238 @@
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+class ResponseCache:  # abstract interface
+    """Key-value cache for backend responses, with hit/miss counters.
+    get() returns the default value on a miss or when the entry is older than the time to live"""
+
+    def __init__(self, ttl=None, clock=time.time):
+        self.ttl = ttl  # in seconds, entries never expire if None
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def _lookup(self, key):
+        # return (timestamp, value) or None
+        raise NotImplementedError
+
+    def _store(self, key, timestamp, value):
+        raise NotImplementedError
+
+    def _delete(self, key):
+        raise NotImplementedError
+
+    def _is_expired(self, timestamp):
+        return self.ttl is not None and self.clock() - timestamp > self.ttl
+
+    def _find(self, key):
+        # (timestamp, value) of an entry which has not expired, or None. Called with the lock held
+        entry = self._lookup(key)
+        if entry is not None and self._is_expired(entry[0]):
+            self._delete(key)
+            entry = None
+        return entry
+
+    def get_entry(self, key):
+        # return (timestamp, value), or None on a miss
+        with self.lock:
+            entry = self._find(key)
+            if entry is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return entry
+
+    def get(self, key, default=None):
+        entry = self.get_entry(key)
+        return default if entry is None else entry[1]
+
+    def set(self, key, value, timestamp=None):
+        with self.lock:
+            self._store(key, self.clock() if timestamp is None else timestamp, value)
+
+    def __contains__(self, key):
+        # not counted as a hit or a miss
+        with self.lock:
+            return self._find(key) is not None
+
+    def __getitem__(self, key):
+        missing = object()
+        value = self.get(key, missing)
+        if value is missing:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key, value):
+        self.set(key, value)
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses}
+
+
+class MemoryCache(ResponseCache):
+    """In-memory cache, least recently used entries are evicted beyond max_entries"""
+
+    def __init__(self, max_entries=None, ttl=None, clock=time.time):
+        super().__init__(ttl, clock)
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def _lookup(self, key):
+        entry = self.entries.get(key)
+        if entry is not None:
+            self.entries.move_to_end(key)
+        return entry
+
+    def _store(self, key, timestamp, value):
+        self.entries[key] = (timestamp, value)
+        self.entries.move_to_end(key)
+        if self.max_entries is not None:
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def _delete(self, key):
+        del self.entries[key]
+
+    def stats(self):
+        return {**super().stats(), "evictions": self.evictions, "size": len(self.entries)}
+
+
+class SQLiteCache(ResponseCache):
+    """Persistent cache stored in a SQLite database, values are pickled.
+    Several caches can share the same database file using different table names"""
+
+    def __init__(self, path, table="cache", ttl=None, clock=time.time):
+        super().__init__(ttl, clock)
+        self.table = table
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute("CREATE TABLE IF NOT EXISTS {} (key TEXT PRIMARY KEY, timestamp REAL, value BLOB)".format(table))
+        self.db.commit()
+
+    def __len__(self):
+        with self.lock:
+            return self.db.execute("SELECT COUNT(*) FROM {}".format(self.table)).fetchone()[0]
+
+    def _lookup(self, key):
+        row = self.db.execute("SELECT timestamp, value FROM {} WHERE key = ?".format(self.table), (key,)).fetchone()
+        if row is None:
+            return None
+        return row[0], pickle.loads(row[1])
+
+    def _store(self, key, timestamp, value):
+        self.db.execute(
+            "INSERT OR REPLACE INTO {} (key, timestamp, value) VALUES (?, ?, ?)".format(self.table), (key, timestamp, pickle.dumps(value))
+        )
+        self.db.commit()
+
+    def _delete(self, key):
+        self.db.execute("DELETE FROM {} WHERE key = ?".format(self.table), (key,))
+        self.db.commit()
+
+    def close(self):
+        self.db.close()
+
+
+class TieredCache(ResponseCache):
+    """Bounded in-memory cache in front of a persistent one. Persistent hits are promoted to memory"""
+
+    def __init__(self, memory, persistent):
+        super().__init__(memory.ttl, memory.clock)
+        self.memory = memory
+        self.persistent = persistent
+
+    def get_entry(self, key):
+        entry = self.memory.get_entry(key)
+        if entry is None:
+            entry = self.persistent.get_entry(key)
+            if entry is not None:
+                self.memory.set(key, entry[1], timestamp=entry[0])  # keep the original age
+        with self.lock:
+            if entry is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return entry
+
+    def __contains__(self, key):
+        return key in self.memory or key in self.persistent
+
+    def set(self, key, value, timestamp=None):
+        timestamp = self.clock() if timestamp is None else timestamp
+        self.memory.set(key, value, timestamp)
+        self.persistent.set(key, value, timestamp)
+
+    def stats(self):
+        return {**super().stats(), "memory": self.memory.stats(), "persistent": self.persistent.stats()}
+
+
+def make_cache(path=None, table="cache", max_entries=None, ttl=None):
+    # in-memory only if no path is given
+    memory = MemoryCache(max_entries, ttl)
+    if path is None:
+        return memory
+    return TieredCache(memory, SQLiteCache(path, table, ttl))
+
+
+class CachedBackend:
+    """Backend wrapper keeping the neighbors of the nodes (the results of get_neighbors) in a cache, so that several
+    explorations sharing it fetch each node once, even when they request it at the same time.
+    Nodes are fetched with the per-node protocol, the batch protocol of the backend being hidden since its results
+    cannot be split by node. The cached results are shared by the explorations and must not be modified"""
+
+    def __init__(self, backend, cache=None):
+        self.backend = backend
+        self.cache = cache if cache is not None else MemoryCache()
+        self.pending = {}  # node -> event set once the exploration fetching it is done
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.fetched = 0
+        self.waits = 0
+
+    def __getattr__(self, name):
+        # everything but the neighbors is served by the backend
+        if name in ("backend", "get_neighbors_batch", "filter_batch"):
+            raise AttributeError(name)
+        return getattr(self.backend, name)
+
+    def get_neighbors(self, node):
+        with self.lock:
+            self.requests += 1
+        while True:
+            with self.lock:
+                entry = self.cache.get_entry(node)
+                if entry is not None:
+                    return entry[1]
+                event = self.pending.get(node)
+                if event is None:
+                    self.pending[node] = threading.Event()
+                    break
+                self.waits += 1
+            event.wait()  # being fetched by another exploration, look it up again once done
+        try:
+            result = self.backend.get_neighbors(node)
+            self.cache[node] = result
+            with self.lock:
+                self.fetched += 1
+        finally:
+            with self.lock:
+                self.pending.pop(node).set()
+        return result
+
+    def neighbors_stats(self):
+        # nb of neighbors requests, of nodes actually fetched from the backend and of requests which waited for another one
+        with self.lock:
+            return {"requests": self.requests, "fetched": self.fetched, "waits": self.waits}
+
+    def cache_stats(self):
+        stats = self.backend.cache_stats() if hasattr(self.backend, "cache_stats") else {}
+        return {**stats, "neighbors": self.cache.stats()}
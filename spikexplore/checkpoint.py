@@ -0,0 +1,109 @@
+import os
+import pickle
+import shutil
+from dataclasses import dataclass
+import numpy as np
+import pandas as pd
+from spikexplore.NodeInfo import NodeInfo
+from spikexplore.edge_store import NodeIndex, EdgeStore
+
+ARRAYS_FILENAME = "spikyball_checkpoint.npz"  # edges and visited nodes
+STATE_FILENAME = "spikyball_checkpoint.pkl"  # everything else
+POINTER_FILENAME = "spikyball_checkpoint"  # name of the directory holding the last complete checkpoint
+DIR_PREFIX = "checkpoint-"
+
+
+@dataclass
+class SpikyBallState:
+    """State of a spiky ball exploration between two hops"""
+
+    depth: int  # next hop to process
+    node_index: NodeIndex
+    total_node_list: list
+    total_nodes_df: pd.DataFrame
+    total_edges: EdgeStore  # edges collected so far, not aggregated
+    new_node_list: list  # nodes of the next hop
+    new_edges: EdgeStore  # edges leading to the nodes of the next hop
+    node_acc: NodeInfo
+    rng_state: dict
+    hop_stats: list = None  # ExplorationStats.hops
+
+
+def _write_atomic(filename, write):
+    tmp_filename = filename + ".tmp"
+    with open(tmp_filename, "wb") as f:
+        write(f)
+    os.replace(tmp_filename, filename)
+
+
+def _current_dir(path):
+    try:
+        with open(os.path.join(path, POINTER_FILENAME)) as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        return None
+
+
+def save_checkpoint(path, state):
+    # The files of the checkpoint are written to a new directory, which the pointer file designates once they are complete,
+    # so that a crash at any point leaves the previous checkpoint consistent. The older directories are removed afterwards
+    os.makedirs(path, exist_ok=True)
+    current = _current_dir(path)
+    checkpoint_name = DIR_PREFIX + str(int(current[len(DIR_PREFIX) :]) + 1 if current else 0)
+    dirname = os.path.join(path, checkpoint_name)
+    shutil.rmtree(dirname, ignore_errors=True)  # left by an interrupted save
+    os.makedirs(dirname)
+    arrays = {"depth": np.array(state.depth), "visited": state.node_index.visited[: len(state.node_index)]}
+    for name in ["total_edges", "new_edges"]:
+        edges = getattr(state, name)
+        arrays.update({name + "_source": edges.source, name + "_target": edges.target, name + "_weight": edges.weight})
+    others = {
+        "depth": state.depth,
+        "ids": state.node_index.ids,
+        "total_node_list": state.total_node_list,
+        "total_nodes_df": state.total_nodes_df,
+        "new_node_list": state.new_node_list,
+        "node_acc": state.node_acc,
+        "rng_state": state.rng_state,
+        "hop_stats": state.hop_stats if state.hop_stats is not None else [],
+        "total_edges_attrs": (state.total_edges.attrs, state.total_edges.columns),
+        "new_edges_attrs": (state.new_edges.attrs, state.new_edges.columns),
+    }
+    with open(os.path.join(dirname, ARRAYS_FILENAME), "wb") as f:
+        np.savez(f, **arrays)
+    with open(os.path.join(dirname, STATE_FILENAME), "wb") as f:
+        pickle.dump(others, f, protocol=pickle.HIGHEST_PROTOCOL)
+    _write_atomic(os.path.join(path, POINTER_FILENAME), lambda f: f.write(checkpoint_name.encode()))
+    for entry in os.listdir(path):
+        if entry.startswith(DIR_PREFIX) and entry != checkpoint_name:
+            shutil.rmtree(os.path.join(path, entry), ignore_errors=True)
+
+
+def load_checkpoint(path):
+    current = _current_dir(path)
+    if current is None:
+        raise FileNotFoundError("No checkpoint found in {}.".format(path))
+    dirname = os.path.join(path, current)
+    with np.load(os.path.join(dirname, ARRAYS_FILENAME)) as data:
+        arrays = dict(data)
+    with open(os.path.join(dirname, STATE_FILENAME), "rb") as f:
+        others = pickle.load(f)
+    if int(arrays["depth"]) != others["depth"]:
+        raise ValueError("Inconsistent checkpoint files in {}.".format(path))
+
+    def edge_store(name):
+        attrs, columns = others[name + "_attrs"]
+        return EdgeStore(arrays[name + "_source"], arrays[name + "_target"], arrays[name + "_weight"], attrs, columns)
+
+    return SpikyBallState(
+        depth=others["depth"],
+        node_index=NodeIndex.from_ids(others["ids"], arrays["visited"]),
+        total_node_list=others["total_node_list"],
+        total_nodes_df=others["total_nodes_df"],
+        total_edges=edge_store("total_edges"),
+        new_node_list=others["new_node_list"],
+        new_edges=edge_store("new_edges"),
+        node_acc=others["node_acc"],
+        rng_state=others["rng_state"],
+        hop_stats=others.get("hop_stats", []),
+    )
@@ -1,39 +1,38 @@
 import pandas as pd
 import numpy as np
 import os
+import json
 import logging
 from spikexplore.NodeInfo import NodeInfo
-from spikexplore.graph import process_hop
+from spikexplore.graph import process_hop, json_encoder
+from spikexplore.executors import make_executor, is_async_backend
+from spikexplore.edge_store import NodeIndex, EdgeStore
+from spikexplore.checkpoint import SpikyBallState, save_checkpoint, load_checkpoint
+from spikexplore.stats import ExplorationStats
+from spikexplore.instrumentation import Instrumentation
 
 logger = logging.getLogger(__name__)
 
 
-def split_edges(edges_df, node_list):
+def split_edges(edges, node_index):
     # split edges between the ones connecting already collected nodes and the ones connecting new nodes
-    edges_df_in = edges_df[edges_df["target"].isin(node_list)]
-    edges_df_out = edges_df[~(edges_df["target"].isin(node_list))]
-    return edges_df_in, edges_df_out
+    visited = node_index.is_visited(edges.target)
+    return edges.take(visited), edges.take(~visited)
 
 
-def remove_edges_with_target_nodes(edges_df, node_list):
-    new_edges_df = edges_df[edges_df["target"].isin(node_list)]
-    return new_edges_df
+def remove_edges_with_target_nodes(edges, node_index, node_list):
+    return edges.take(np.isin(edges.target, node_index.encode(node_list)))
 
 
-def degree_weight(node_type, edges_df):
-    edges_df.reset_index(inplace=True)
-    degree_df = edges_df[[node_type, "weight"]].groupby([node_type]).sum()
-    degree_df.columns = ["degree_" + node_type]
-    # needs reset_index and set_index to keep the initial index.
-    edges_df = edges_df.merge(degree_df, on=node_type)
-    edges_df.set_index("index", inplace=True)
-    edges_df.sort_index(inplace=True)
-    # edges_df2['weight_over_degree'] = edges_df2['weight']/edges_df2['degree']
-    degree_vec = np.array(edges_df["degree_" + node_type].tolist())
-    return degree_vec, edges_df
+def degree_weight(nodes, weights):
+    # weighted degree of the node at one end of each edge, computed without merging tables. The weights are summed
+    # by the pandas groupby (with a compensated summation) so that float degrees are identical to a groupby sum
+    inverse, _ = pd.factorize(nodes)
+    degrees = pd.Series(weights).groupby(inverse).sum().to_numpy()
+    return degrees[inverse]
 
 
-def probability_function(edges_df, expansion_type, degree):
+def probability_function(source, target, weight, expansion_type, degree):
     # Taking the weights into account for the random selection
     if expansion_type == "spikyball":
         source_degree, edge_degree, target_degree = 0, 1, 0
@@ -48,27 +47,41 @@ def probability_function(edges_df, expansion_type, degree):
     else:
         raise ValueError("Unknown ball type.")
 
-    weight_vec = np.array(edges_df["weight"].tolist())
-    target_degree_vec, edges_df = degree_weight("target", edges_df)
-    source_degree_vec, edges_df = degree_weight("source", edges_df)
+    weight_vec = weight.astype(float)
+    target_degree_vec = degree_weight(target, weight_vec)
+    source_degree_vec = degree_weight(source, weight_vec)
 
-    source_func = source_degree_vec.astype(float) ** source_degree
-    weight_func = weight_vec.astype(float) ** edge_degree
-    target_func = target_degree_vec.astype(float) ** target_degree
+    source_func = source_degree_vec**source_degree
+    weight_func = weight_vec**edge_degree
+    target_func = target_degree_vec**target_degree
     proba_unormalized = source_func * weight_func * target_func
     proba_f = proba_unormalized / np.sum(proba_unormalized)  # Normalize weights
 
-    return edges_df.index.tolist(), proba_f, edges_df
+    return proba_f
 
 
-def random_subset(edges_df, balltype, mode, coeff, mode_value=None):
+def weighted_sample(proba_f, size, rng):
+    # Weighted sampling without replacement (Efraimidis-Spirakis): draw a key E/p per item with E ~ Exp(1)
+    # and keep the size smallest keys. Selected items are returned in increasing key order,
+    # which is the order in which sequential draws would have picked them.
+    nonzero = np.flatnonzero(proba_f)
+    size = min(size, len(nonzero))
+    keys = rng.exponential(size=len(nonzero)) / proba_f[nonzero]
+    selected = np.argpartition(keys, size)[:size] if size < len(nonzero) else np.arange(len(nonzero))
+    return nonzero[selected[np.argsort(keys[selected])]]
 
-    # TODO handle balltype
-    nb_edges = len(edges_df)
+
+def random_subset(edges, balltype, mode, coeff, mode_value=None, rng=None, instrumentation=None):
+    # edges is an EdgeStore, returns the codes of the nodes reached and the edges selected
+    if rng is None:
+        rng = np.random.default_rng()
+    if instrumentation is None:
+        instrumentation = Instrumentation()
+    nb_edges = len(edges)
     if nb_edges == 0:
-        return [], pd.DataFrame()
-    edges_df.reset_index(drop=True, inplace=True)  # needs unique index values for random choice
-    edges_indices, proba_f, edges_df = probability_function(edges_df, balltype, coeff)
+        return np.zeros(0, dtype=np.int32), edges
+    with instrumentation.timer("probability"):
+        proba_f = probability_function(edges.source, edges.target, edges.weight, balltype, coeff)
 
     if mode == "constant":
         random_subset_size = mode_value
@@ -89,15 +102,20 @@ def random_subset(edges_df, balltype, mode, coeff, mode_value=None):
             raise ValueError("the value must be between 0 and 100.")
     else:
         raise ValueError('Unknown mode. Choose "constant" or "percent".')
-    r_edges_idx = np.random.choice(edges_indices, random_subset_size, p=proba_f, replace=False)
-    r_edges_df = edges_df.loc[r_edges_idx, :]
-
-    nodes_list = r_edges_df["target"].unique().tolist()
-    return nodes_list, r_edges_df
+    with instrumentation.timer("sampling"):
+        r_edges_idx = weighted_sample(proba_f, random_subset_size, rng)
+        r_edges = edges.take(r_edges_idx)
+        nodes_codes = pd.unique(r_edges.target)
+    return nodes_codes, r_edges
 
 
-def spiky_ball(initial_node_list, graph_handle, cfg, node_acc=NodeInfo(), progress_callback=None):
-    """Sample the graph by exploring from an initial node list"""
+def spiky_ball(initial_node_list, graph_handle, cfg, node_acc=NodeInfo(), progress_callback=None, resume_from=None, stats=None, instrumentation=None):
+    """Sample the graph by exploring from an initial node list.
+    If cfg.checkpoint_path is set, the state of the exploration is saved there after each hop,
+    and the exploration can be continued from such a checkpoint by passing its path as resume_from.
+    The statistics of each hop are added to stats (an ExplorationStats) if given, and checked against
+    the early stopping rules of cfg. The timings and counters of each hop are recorded in instrumentation
+    (an Instrumentation) if given"""
 
     exploration_depth = cfg.exploration_depth
     random_subset_mode = cfg.random_subset_mode
@@ -110,72 +128,237 @@ def spiky_ball(initial_node_list, graph_handle, cfg, node_acc=NodeInfo(), progre
         raise ValueError("Exploration depth must be > 1.")
 
     # Initialization
+    rng = np.random.default_rng(cfg.seed)
+    node_index = NodeIndex()  # edges are stored with integer codes instead of node ids during the exploration
     new_node_list = initial_node_list.copy()
     total_node_list = []  # new_node_list
 
-    total_edges_df = pd.DataFrame()
-    total_nodes_df = pd.DataFrame()
-    new_edges = pd.DataFrame()
+    total_edges_list = []  # edges are aggregated once at the end of the exploration
+    total_nodes_list = []
+    new_edges = EdgeStore()
+    start_depth = 0
+    if stats is None:
+        stats = ExplorationStats()
+    if instrumentation is None:
+        instrumentation = Instrumentation()
+
+    if resume_from is not None:
+        state = load_checkpoint(resume_from)
+        logger.info("resuming exploration at hop {} from {}".format(state.depth, resume_from))
+        start_depth = state.depth
+        rng.bit_generator.state = state.rng_state
+        node_index = state.node_index
+        total_node_list = state.total_node_list
+        total_edges_list = [state.total_edges]
+        total_nodes_list = [state.total_nodes_df] if not state.total_nodes_df.empty else []
+        new_node_list = state.new_node_list
+        new_edges = state.new_edges
+        node_acc = state.node_acc
+        stats.hops.extend(state.hop_stats)
+        stats.nb_nodes = len(total_node_list)
+        stats.add_edges(state.total_edges)
+
+    def checkpoint(next_depth):
+        total_nodes_df = pd.concat(total_nodes_list) if total_nodes_list else pd.DataFrame()
+        total_edges = EdgeStore.concat(total_edges_list)
+        state = SpikyBallState(
+            next_depth,
+            node_index,
+            total_node_list,
+            total_nodes_df,
+            total_edges,
+            new_node_list,
+            new_edges,
+            node_acc,
+            rng.bit_generator.state,
+            stats.hops,
+        )
+        with instrumentation.timer("checkpoint"):
+            save_checkpoint(cfg.checkpoint_path, state)
+        # keep the concatenated frames, so that each checkpoint only concatenates the last hop
+        total_nodes_list[:] = [total_nodes_df] if total_nodes_list else []
+        total_edges_list[:] = [total_edges]
 
     # Loop over layers
-    for depth in range(exploration_depth):
-        logger.debug("")
-        logger.debug("******* Processing users at {}-hop distance *******".format(depth))
-
-        # Option to choose the number of nodes in the final graph
-        if number_of_nodes:
-            if len(total_node_list + new_node_list) > number_of_nodes:
-                # Truncate the list of new nodes
-                max_nodes = min(max_nodes_per_hop, number_of_nodes - len(total_node_list))
-                if max_nodes <= 0:
-                    break
-                logger.info("-- max nb of nodes reached in iteration {} --".format(depth))
-                new_node_list = new_node_list[:max_nodes]
-                new_edges = remove_edges_with_target_nodes(new_edges, new_node_list)
-
-        new_node_dic, edges_df, nodes_df, node_acc = process_hop(graph_handle, new_node_list, node_acc)
-        if edges_df.empty:
-            continue
-        nodes_df["spikyball_hop"] = depth  # Mark the depth of the spiky ball on the nodes
-
-        total_node_list = total_node_list + new_node_list
-        edges_df_in, edges_df_out = split_edges(edges_df, total_node_list)
-
-        # add edges linking to new nodes
-        total_edges_df = pd.concat([total_edges_df, edges_df_in])
-        if not new_edges.empty:
-            total_edges_df = pd.concat([total_edges_df, new_edges.drop(columns=["degree_source", "degree_target"])])
-        total_edges_df = total_edges_df.groupby(["source", "target"]).sum().reset_index()
-        total_nodes_df = pd.concat([total_nodes_df, nodes_df])
-
-        new_node_list, new_edges = random_subset(edges_df_out, expansion_type, mode=random_subset_mode, mode_value=random_subset_size, coeff=degree)
-        if progress_callback:
-            progress_callback(depth, exploration_depth)
-        logger.debug("new edges:{} subset:{} in_edges:{}".format(len(edges_df_out), len(new_edges), len(edges_df_in)))
+    concurrency = cfg.concurrency
+    if is_async_backend(graph_handle):
+        concurrency = "asyncio"  # coroutines can only be driven from an event loop
+    with make_executor(concurrency, cfg.max_in_flight) as executor:
+        depth = start_depth
+        for depth in range(start_depth, exploration_depth):
+            if cfg.checkpoint_path and depth > start_depth:
+                checkpoint(depth)  # the state after the previous hop
+            logger.debug("")
+            logger.debug("******* Processing users at {}-hop distance *******".format(depth))
+
+            # Option to choose the number of nodes in the final graph
+            if number_of_nodes:
+                if len(total_node_list) + len(new_node_list) > number_of_nodes:
+                    # Truncate the list of new nodes
+                    max_nodes = min(max_nodes_per_hop, number_of_nodes - len(total_node_list))
+                    if max_nodes <= 0:
+                        break
+                    logger.info("-- max nb of nodes reached in iteration {} --".format(depth))
+                    new_node_list = new_node_list[:max_nodes]
+                    new_edges = remove_edges_with_target_nodes(new_edges, node_index, new_node_list)
+
+            instrumentation.start_hop(depth, graph_handle)
+            new_node_dic, edges_df, nodes_df, node_acc = process_hop(graph_handle, new_node_list, node_acc, executor, instrumentation)
+            if edges_df.empty:
+                instrumentation.end_hop(graph_handle)
+                continue
+            nodes_df["spikyball_hop"] = depth  # Mark the depth of the spiky ball on the nodes
+
+            total_node_list.extend(new_node_list)
+            with instrumentation.timer("aggregate"):
+                node_index.mark_visited(node_index.encode(new_node_list))
+                edges_in, edges_out = split_edges(EdgeStore.from_frame(edges_df, node_index), node_index)
+
+            # add edges linking to new nodes
+            total_edges_list.append(edges_in)
+            total_edges_list.append(new_edges)
+            total_nodes_list.append(nodes_df)
+            with instrumentation.timer("stats"):
+                stats.add_edges(edges_in)
+                stats.add_edges(new_edges)
+
+            new_node_codes, new_edges = random_subset(
+                edges_out,
+                expansion_type,
+                mode=random_subset_mode,
+                mode_value=random_subset_size,
+                coeff=degree,
+                rng=rng,
+                instrumentation=instrumentation,
+            )
+            new_node_list = node_index.decode(new_node_codes).tolist()
+            nb_new = len(pd.unique(edges_out.target))
+            with instrumentation.timer("stats"):
+                hop = stats.add_hop(
+                    depth, len(total_node_list) - stats.nb_nodes, nb_new + len(pd.unique(edges_in.target)), nb_new, len(new_node_list)
+                )
+            instrumentation.count("edges_in", len(edges_in))
+            instrumentation.count("edges_out", len(edges_out))
+            instrumentation.count("edges_selected", len(new_edges))
+            instrumentation.end_hop(graph_handle)
+            if progress_callback:
+                progress_callback(depth, exploration_depth)
+            logger.debug("new edges:{} subset:{} in_edges:{}".format(len(edges_out), len(new_edges), len(edges_in)))
+            logger.info("hop {}: {}".format(depth, hop))
+            stop_reason = stats.stop_reason(cfg)
+            if stop_reason is not None:
+                logger.info("-- stopping the exploration after hop {}: {} --".format(depth, stop_reason))
+                if cfg.checkpoint_path:
+                    checkpoint(exploration_depth)
+                break
+        else:
+            if cfg.checkpoint_path:
+                checkpoint(exploration_depth)  # exploration complete, only the final aggregation is left
 
     logger.debug("Nb of layers reached: {}".format(depth))
-    if not total_edges_df.empty:
-        total_edges_df = total_edges_df.sort_values("weight", ascending=False)
+    with instrumentation.timer("aggregate"):
+        total_nodes_df = pd.concat(total_nodes_list) if total_nodes_list else pd.DataFrame()
+        total_edges_df = EdgeStore.concat(total_edges_list).aggregate().to_frame(node_index)
+        if not total_edges_df.empty:
+            total_edges_df = total_edges_df.sort_values("weight", ascending=False)
 
     return total_node_list, total_nodes_df, total_edges_df, node_acc
 
 
-def save_data(nodes_df, edges_df, data_path):
-    # Save to json file
-    edgefilename = os.path.join(data_path, "edges_data.json")
-    nodefilename = os.path.join(data_path, "nodes_data.json")
-    logger.debug("Writing", edgefilename)
-    edges_df.to_json(edgefilename)
-    logger.debug("Writing", nodefilename)
-    nodes_df.to_json(nodefilename)
+DATA_FORMATS = {"parquet": ".parquet", "feather": ".feather", "json": ".json"}  # in the order load_data looks for them
+
+
+def _data_filenames(data_path, data_format):
+    extension = DATA_FORMATS[data_format]
+    return os.path.join(data_path, "nodes_data" + extension), os.path.join(data_path, "edges_data" + extension)
+
+
+def _import_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.feather
+        import pyarrow.parquet
+    except ImportError as e:
+        raise ImportError("pyarrow is required for the parquet and feather formats, install it with pip install spikexplore[arrow]") from e
+    return pyarrow
+
+
+JSON_COLUMNS_KEY = b"spikexplore.json_columns"
+
+
+def _to_table(pa, df):
+    # The pandas metadata keeps the index and the dtypes. Object columns mixing types arrow cannot store together
+    # (e.g. reply_to, a handle or an empty list) are written as json, their names being kept in the schema metadata
+    try:
+        return pa.Table.from_pandas(df)
+    except (pa.ArrowTypeError, pa.ArrowInvalid):
+        pass
+    mixed = []
+    for col in df.columns[df.dtypes == object]:
+        try:
+            pa.array(df[col], from_pandas=True)
+        except (pa.ArrowTypeError, pa.ArrowInvalid):
+            mixed.append(col)
+    encoded = {col: pd.Series([None if v is None else json_encoder.encode(v) for v in df[col]], index=df.index, dtype=object) for col in mixed}
+    table = pa.Table.from_pandas(df.assign(**encoded))
+    return table.replace_schema_metadata({**table.schema.metadata, JSON_COLUMNS_KEY: json.dumps(mixed)})
+
+
+def _write_table(df, filename, data_format, compression):
+    pa = _import_pyarrow()
+    table = _to_table(pa, df)
+    if data_format == "parquet":
+        pa.parquet.write_table(table, filename, compression=compression if compression else "none")
+    else:
+        pa.feather.write_feather(table, filename, compression=compression if compression else "uncompressed")
+
+
+def _read_table(filename, data_format, memory_map):
+    pa = _import_pyarrow()
+    if data_format == "parquet":
+        table = pa.parquet.read_table(filename, memory_map=memory_map)
+    else:
+        table = pa.feather.read_table(filename, memory_map=memory_map)
+    df = table.to_pandas()
+    # arrow returns list columns as numpy arrays, restore the python lists
+    for field in table.schema:
+        if pa.types.is_list(field.type) or pa.types.is_large_list(field.type):
+            df[field.name] = table.column(field.name).to_pylist()
+    metadata = table.schema.metadata or {}
+    for col in json.loads(metadata.get(JSON_COLUMNS_KEY, b"[]")):
+        df[col] = pd.Series([None if v is None else json.loads(v) for v in table.column(col).to_pylist()], index=df.index, dtype=object)
+    return df
+
+
+def save_data(nodes_df, edges_df, data_path, data_format="json", compression=None):
+    # data_format is "json", "parquet" or "feather" (the last two require pyarrow).
+    # compression: codec for the binary formats, e.g. "snappy" or "zstd" (parquet), "lz4" or "zstd" (feather)
+    if data_format not in DATA_FORMATS:
+        raise ValueError('Unknown data format. Choose "json", "parquet" or "feather".')
+    nodefilename, edgefilename = _data_filenames(data_path, data_format)
+    for df, filename in [(edges_df, edgefilename), (nodes_df, nodefilename)]:
+        logger.debug("Writing {}".format(filename))
+        if data_format == "json":
+            df.to_json(filename)
+        else:
+            _write_table(df, filename, data_format, compression)
     return None
 
 
-def load_data(data_path):
-    nodesfilename = os.path.join(data_path, "nodes_data.json")
-    edgesfilename = os.path.join(data_path, "edges_data.json")
-    logger.debug("Loading", nodesfilename)
-    nodes_df = pd.read_json(nodesfilename)
-    logger.debug("Loading", edgesfilename)
-    edges_df = pd.read_json(edgesfilename)
+def load_data(data_path, memory_map=False):
+    # the format is detected from the files found in data_path
+    for data_format in DATA_FORMATS:
+        nodesfilename, edgesfilename = _data_filenames(data_path, data_format)
+        if os.path.exists(nodesfilename) and os.path.exists(edgesfilename):
+            break
+    else:
+        raise FileNotFoundError("No nodes and edges data found in {}.".format(data_path))
+    dfs = []
+    for filename in [nodesfilename, edgesfilename]:
+        logger.debug("Loading {}".format(filename))
+        if data_format == "json":
+            dfs.append(pd.read_json(filename))
+        else:
+            dfs.append(_read_table(filename, data_format, memory_map))
+    nodes_df, edges_df = dfs
     return nodes_df, edges_df
@@ -1,4 +1,6 @@
 from dataclasses import dataclass
+from typing import Callable, Optional
+from spikexplore.stats import ExplorationStats
 
 
 @dataclass
@@ -8,6 +10,8 @@ class GraphConfig:
     community_detection: bool = False
     min_community_size: int = 1
     as_undirected: bool = True
+    as_sparse: bool = False  # return a SparseGraph instead of a networkx graph
+    seed: int = None  # seed of the community detection
 
 
 @dataclass
@@ -19,6 +23,16 @@ class DataCollectionConfig:
     degree: int = 2
     max_nodes_per_hop: int = 1000
     number_of_nodes: int = None
+    concurrency: str = "sequential"  # "sequential", "thread" or "asyncio"
+    max_in_flight: int = 8  # max nb of nodes fetched concurrently
+    seed: int = None  # seed of the random subset selection, set it for reproducible explorations
+    checkpoint_path: str = None  # directory where the exploration state is saved after each hop
+    # early stopping, checked after each hop
+    min_new_node_yield: float = None  # stop when less than this percentage of the nodes reached by a hop are new
+    max_edges: int = None  # stop once this nb of edges has been collected
+    # function taking the ExplorationStats, returning True to stop. It must be picklable (a module level function,
+    # not a lambda) to save the config or to run the exploration in the worker processes of explore_many
+    stop_condition: Optional[Callable[[ExplorationStats], bool]] = None
 
 
 @dataclass
@@ -38,11 +52,20 @@ class BlueskyConfig:
     max_skeets_per_user: int = 100
     nb_popular_skeets: int = 10
     users_to_remove = []
+    cache_path: str = None  # SQLite file keeping the API responses across runs, in memory only if None
+    cache_max_entries: int = 10000  # max nb of responses kept in memory, per cache
+    cache_ttl: float = None  # in seconds, defaults to max_day_old days
+    max_in_flight: int = 8  # max nb of concurrent requests
+    max_retries: int = 5  # retries of rate limited or failed requests
+    retry_backoff: float = 1.0  # initial delay (in seconds) before retrying, doubled at each attempt
+    rate_limits: dict = None  # client method (e.g. "get_author_feed") -> max nb of requests per second
+    keep_raw_skeets: bool = False  # keep the atproto post models in the skeet records (post field), which takes much more memory
 
 
 @dataclass
 class SyntheticConfig:
     min_degree: int = 1
+    delay: float = 0.0  # artificial latency (in seconds) added to each neighbors request
 
 
 @dataclass
@@ -50,3 +73,9 @@ class WikipediaConfig:
     user_agent: str = ""
     lang: str = "en"
     pages_ignored = []
+    batch_size: int = 0  # nb of titles per MediaWiki links query, pages are fetched one by one if 0 (max 50)
+    api_url: str = None  # MediaWiki API endpoint, defaults to https://<lang>.wikipedia.org/w/api.php
+    max_in_flight: int = 8  # max nb of concurrent requests
+    max_retries: int = 5  # retries of rate limited or failed requests
+    retry_backoff: float = 1.0  # initial delay (in seconds) before retrying, doubled at each attempt
+    rate_limits: dict = None  # "query" (MediaWiki API queries) or "page" (per page requests) -> max nb of requests per second
@@ -0,0 +1,127 @@
+import numpy as np
+import pandas as pd
+
+
+class NodeIndex:
+    """Map arbitrary node ids to contiguous int32 codes, and keep track of the visited nodes"""
+
+    def __init__(self):
+        self.codes = {}  # node id -> code
+        self.ids = []  # code -> node id
+        self.visited = np.zeros(0, dtype=bool)
+        self._ids_index = None
+
+    def __len__(self):
+        return len(self.ids)
+
+    @classmethod
+    def from_ids(cls, ids, visited):
+        # rebuild an index from its list of ids (the code of an id is its position)
+        index = cls()
+        index.ids = list(ids)
+        index.codes = {node: code for code, node in enumerate(index.ids)}
+        index.visited = visited.copy()
+        return index
+
+    def _intern(self, node):
+        code = self.codes.get(node)
+        if code is None:
+            code = len(self.ids)
+            self.codes[node] = code
+            self.ids.append(node)
+        return code
+
+    def encode(self, values):
+        # unknown ids get a new code
+        if len(values) == 0:
+            return np.zeros(0, dtype=np.int32)
+        if not isinstance(values, (pd.Series, np.ndarray)):
+            values = pd.Series(values)
+        inverse, uniques = pd.factorize(values)  # only look up each distinct id once
+        unique_codes = np.fromiter((self._intern(x) for x in uniques), dtype=np.int32, count=len(uniques))
+        if len(self.visited) < len(self.ids):
+            visited = np.zeros(max(len(self.ids), 2 * len(self.visited)), dtype=bool)
+            visited[: len(self.visited)] = self.visited
+            self.visited = visited
+        return unique_codes[inverse]
+
+    def decode(self, codes):
+        if self._ids_index is None or len(self._ids_index) != len(self.ids):
+            self._ids_index = pd.Index(self.ids, tupleize_cols=False)
+        return self._ids_index.take(codes)
+
+    def mark_visited(self, codes):
+        self.visited[codes] = True
+
+    def is_visited(self, codes):
+        return self.visited[codes]
+
+
+class EdgeStore:
+    """Edges held as parallel arrays of node codes and weights. Edge properties other than the weight,
+    if any, are kept in a DataFrame aligned with the arrays"""
+
+    def __init__(self, source=None, target=None, weight=None, attrs=None, columns=None):
+        self.source = source if source is not None else np.zeros(0, dtype=np.int32)
+        self.target = target if target is not None else np.zeros(0, dtype=np.int32)
+        self.weight = weight if weight is not None else np.zeros(0)
+        self.attrs = attrs
+        self.columns = columns if columns else ["weight"]  # order of the columns besides source and target
+
+    def __len__(self):
+        return len(self.source)
+
+    @classmethod
+    def from_frame(cls, edges_df, node_index):
+        if edges_df.empty:
+            return cls()
+        columns = [c for c in edges_df.columns if c not in ["source", "target"]]
+        extra_columns = [c for c in columns if c != "weight"]
+        attrs = edges_df[extra_columns].reset_index(drop=True) if extra_columns else None
+        source = node_index.encode(edges_df["source"])
+        target = node_index.encode(edges_df["target"])
+        return cls(source, target, edges_df["weight"].to_numpy(), attrs, columns)
+
+    def to_frame(self, node_index):
+        if len(self) == 0:
+            return pd.DataFrame()
+        data = {"source": node_index.decode(self.source), "target": node_index.decode(self.target)}
+        for col in self.columns:
+            data[col] = self.weight if col == "weight" else self.attrs[col].array
+        return pd.DataFrame(data)
+
+    def take(self, selection):
+        # selection is either a boolean mask or an array of positions
+        attrs = self.attrs.iloc[selection].reset_index(drop=True) if self.attrs is not None else None
+        return EdgeStore(self.source[selection], self.target[selection], self.weight[selection], attrs, self.columns)
+
+    @classmethod
+    def concat(cls, stores):
+        stores = [s for s in stores if len(s) > 0]
+        if not stores:
+            return cls()
+        attrs = None
+        if stores[0].attrs is not None:
+            attrs = pd.concat([s.attrs for s in stores], ignore_index=True)
+        return cls(
+            np.concatenate([s.source for s in stores]),
+            np.concatenate([s.target for s in stores]),
+            np.concatenate([s.weight for s in stores]),
+            attrs,
+            stores[0].columns,
+        )
+
+    def aggregate(self):
+        # merge duplicated (source, target) pairs, summing their properties
+        if len(self) == 0:
+            return self
+        key = (self.source.astype(np.int64) << 32) | self.target.astype(np.int64)
+        unique_keys, inverse = np.unique(key, return_inverse=True)
+        source = (unique_keys >> 32).astype(np.int32)
+        target = (unique_keys & 0xFFFFFFFF).astype(np.int32)
+        if self.attrs is None:
+            weight = np.bincount(inverse, weights=self.weight, minlength=len(unique_keys)).astype(self.weight.dtype)
+            return EdgeStore(source, target, weight, None, self.columns)
+        values = self.attrs.assign(weight=self.weight).groupby(inverse).sum()
+        weight = values.pop("weight").to_numpy()
+        return EdgeStore(source, target, weight, values.reset_index(drop=True), self.columns)
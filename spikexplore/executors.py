@@ -0,0 +1,83 @@
+import asyncio
+import inspect
+from concurrent.futures import ThreadPoolExecutor
+
+
+class HopExecutor:  # abstract interface
+    def map(self, fn, items):
+        raise NotImplementedError
+
+    def close(self):
+        return
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class SequentialExecutor(HopExecutor):
+    """Run the per-node work one node after the other (default behaviour)"""
+
+    def map(self, fn, items):
+        return [fn(x) for x in items]
+
+
+class ThreadExecutor(HopExecutor):
+    """Fan out the per-node work over a thread pool, results are returned in input order"""
+
+    def __init__(self, max_in_flight):
+        self.pool = ThreadPoolExecutor(max_workers=max_in_flight)
+
+    def map(self, fn, items):
+        return list(self.pool.map(fn, items))
+
+    def close(self):
+        self.pool.shutdown()
+
+
+class AsyncioExecutor(HopExecutor):
+    """Fan out the per-node work on an event loop, with at most max_in_flight concurrent calls.
+    Coroutine functions are awaited, blocking ones are run in worker threads. Results are returned in input order"""
+
+    def __init__(self, max_in_flight):
+        self.max_in_flight = max_in_flight
+        # keep the same loop across hops so that backends can keep their sessions alive
+        self.loop = asyncio.new_event_loop()
+        self.loop.set_default_executor(ThreadPoolExecutor(max_workers=max_in_flight))
+
+    async def _gather(self, fn, items):
+        semaphore = asyncio.Semaphore(self.max_in_flight)
+
+        async def run(x):
+            async with semaphore:
+                if inspect.iscoroutinefunction(fn):
+                    return await fn(x)
+                return await asyncio.to_thread(fn, x)
+
+        return await asyncio.gather(*[run(x) for x in items])
+
+    def map(self, fn, items):
+        return self.loop.run_until_complete(self._gather(fn, items))
+
+    def close(self):
+        self.loop.run_until_complete(self.loop.shutdown_default_executor())
+        self.loop.close()
+
+
+def make_executor(mode, max_in_flight):
+    if mode == "sequential":
+        return SequentialExecutor()
+    if max_in_flight < 1:
+        raise ValueError("max_in_flight must be > 0.")
+    if mode == "thread":
+        return ThreadExecutor(max_in_flight)
+    if mode == "asyncio":
+        return AsyncioExecutor(max_in_flight)
+    raise ValueError('Unknown concurrency mode. Choose "sequential", "thread" or "asyncio".')
+
+
+def is_async_backend(graph_handle):
+    # async backends implement get_neighbors as a coroutine
+    return inspect.iscoroutinefunction(graph_handle.get_neighbors)
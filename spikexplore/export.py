@@ -0,0 +1,211 @@
+"""
+Streaming graph writers working on the node and edge tables of an exploration.
+The nodes table is indexed by node id, its columns being the node attributes, and the edges table
+has source, target and weight columns, the other columns being edge attributes.
+The output is written chunk by chunk, so that the memory used does not depend on the size of the graph.
+"""
+
+import json
+import logging
+import os
+from xml.sax.saxutils import quoteattr
+from datetime import date
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+GEXF_TYPES = {"i": "long", "u": "long", "f": "double", "b": "boolean"}
+GRAPHML_TYPES = {"i": "long", "u": "long", "f": "double", "b": "boolean"}
+
+
+def _attribute_type(series, types):
+    return types.get(series.dtype.kind, "string")
+
+
+def _to_text(series):
+    # string representation of the values of a column, None for missing values. Lists and dicts are json encoded
+    if series.dtype.kind == "b":
+        return [None if pd.isna(v) else str(bool(v)).lower() for v in series]
+    if series.dtype.kind in "iuf":
+        text = series.astype(str).to_numpy(dtype=object)
+        text[series.isna().to_numpy()] = None
+        return text
+    return [_encode(v) for v in series]
+
+
+def _encode(v):
+    if isinstance(v, np.ndarray):
+        v = v.tolist()
+    if isinstance(v, (list, dict)):
+        return json.dumps(v)
+    return None if pd.isna(v) else str(v)
+
+
+def _escape(text, quote=False):
+    # xml escaping of a whole column of strings, missing values are kept as None. The whitespace characters
+    # normalized by xml parsers (all of them in attributes, carriage returns in text) are written as character references
+    text = pd.Series(text, dtype="string")
+    text = text.str.replace("&", "&amp;", regex=False).str.replace("<", "&lt;", regex=False).str.replace(">", "&gt;", regex=False)
+    text = text.str.replace("\r", "&#13;", regex=False)
+    if quote:
+        text = text.str.replace('"', "&quot;", regex=False).str.replace("\n", "&#10;", regex=False).str.replace("\t", "&#09;", regex=False)
+        text = '"' + text + '"'
+    return text.astype(object).where(text.notna(), None).tolist()
+
+
+def _chunks(df, chunk_size):
+    for i in range(0, len(df), chunk_size):
+        yield df.iloc[i : i + chunk_size]
+
+
+def _prepare_tables(nodes_df, edges_df):
+    # add the nodes only found in the edges table, without attributes
+    if nodes_df is None:
+        nodes_df = pd.DataFrame()
+    if edges_df is None or edges_df.empty:
+        edges_df = pd.DataFrame(columns=["source", "target", "weight"])
+    endpoints = pd.Index(pd.unique(np.concatenate([edges_df["source"].to_numpy(), edges_df["target"].to_numpy()])))
+    missing = endpoints.difference(nodes_df.index, sort=False)
+    if len(missing) > 0:
+        nodes_df = pd.concat([nodes_df, pd.DataFrame(index=missing)]) if not nodes_df.empty else pd.DataFrame(index=missing)
+    if nodes_df.index.has_duplicates:
+        raise ValueError("Node ids must be unique.")
+    return nodes_df, edges_df
+
+
+def _edge_attributes(edges_df):
+    return [c for c in edges_df.columns if c not in ["source", "target", "weight"]]
+
+
+def write_gexf(nodes_df, edges_df, filename, directed=True, chunk_size=100000):
+    nodes_df, edges_df = _prepare_tables(nodes_df, edges_df)
+    edge_columns = _edge_attributes(edges_df)
+    with open(filename, "w", encoding="utf-8") as f:
+        f.write("<?xml version='1.0' encoding='utf-8'?>\n")
+        f.write('<gexf xmlns="http://www.gexf.net/1.2draft" version="1.2">\n')
+        f.write('  <meta lastmodifieddate="{}">\n    <creator>spikexplore</creator>\n  </meta>\n'.format(date.today().isoformat()))
+        f.write('  <graph defaultedgetype="{}" mode="static">\n'.format("directed" if directed else "undirected"))
+        for cls, df, columns in [("node", nodes_df, list(nodes_df.columns)), ("edge", edges_df, edge_columns)]:
+            if columns:
+                f.write('    <attributes class="{}" mode="static">\n'.format(cls))
+                for i, col in enumerate(columns):
+                    f.write('      <attribute id="{}" title={} type="{}" />\n'.format(i, quoteattr(str(col)), _attribute_type(df[col], GEXF_TYPES)))
+                f.write("    </attributes>\n")
+
+        def attvalues(values):
+            items = ['<attvalue for="{}" value={} />'.format(i, v) for i, v in enumerate(values) if v is not None]
+            return "<attvalues>{}</attvalues>".format("".join(items)) if items else ""
+
+        f.write("    <nodes>\n")
+        for chunk in _chunks(nodes_df, chunk_size):
+            ids = _escape(chunk.index.astype(str), quote=True)
+            values = zip(*[_escape(_to_text(chunk[c]), quote=True) for c in chunk.columns]) if len(chunk.columns) else [()] * len(chunk)
+            f.write("".join("      <node id={0} label={0}>{1}</node>\n".format(n, attvalues(v)) for n, v in zip(ids, values)))
+        f.write("    </nodes>\n    <edges>\n")
+        for start, chunk in zip(range(0, len(edges_df), chunk_size), _chunks(edges_df, chunk_size)):
+            sources = _escape(chunk["source"].astype(str), quote=True)
+            targets = _escape(chunk["target"].astype(str), quote=True)
+            weights = _to_text(chunk["weight"].astype(float)) if "weight" in chunk else [None] * len(chunk)
+            values = zip(*[_escape(_to_text(chunk[c]), quote=True) for c in edge_columns]) if edge_columns else [()] * len(chunk)
+            lines = []
+            for i, (s, t, w, v) in enumerate(zip(sources, targets, weights, values)):
+                weight = ' weight="{}"'.format(w) if w is not None else ""
+                lines.append('      <edge id="{}" source={} target={}{}>{}</edge>\n'.format(start + i, s, t, weight, attvalues(v)))
+            f.write("".join(lines))
+        f.write("    </edges>\n  </graph>\n</gexf>\n")
+    logger.debug("Graph saved to {}".format(filename))
+
+
+def write_graphml(nodes_df, edges_df, filename, directed=True, chunk_size=100000):
+    nodes_df, edges_df = _prepare_tables(nodes_df, edges_df)
+    edge_columns = [c for c in ["weight"] + _edge_attributes(edges_df) if c in edges_df.columns]
+    with open(filename, "w", encoding="utf-8") as f:
+        f.write("<?xml version='1.0' encoding='utf-8'?>\n")
+        f.write(
+            '<graphml xmlns="http://graphml.graphdrawing.org/xmlns" xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" '
+            'xsi:schemaLocation="http://graphml.graphdrawing.org/xmlns http://graphml.graphdrawing.org/xmlns/1.0/graphml.xsd">\n'
+        )
+        keys = {}
+        for cls, df, columns in [("node", nodes_df, list(nodes_df.columns)), ("edge", edges_df, edge_columns)]:
+            for col in columns:
+                keys[cls, col] = "d{}".format(len(keys))
+                attr_type = "double" if (cls, col) == ("edge", "weight") else _attribute_type(df[col], GRAPHML_TYPES)
+                f.write('  <key id="{}" for="{}" attr.name={} attr.type="{}" />\n'.format(keys[cls, col], cls, quoteattr(str(col)), attr_type))
+        f.write('  <graph edgedefault="{}">\n'.format("directed" if directed else "undirected"))
+
+        def data(cls, columns, values):
+            return "".join('<data key="{}">{}</data>'.format(keys[cls, c], v) for c, v in zip(columns, values) if v is not None)
+
+        node_columns = list(nodes_df.columns)
+        for chunk in _chunks(nodes_df, chunk_size):
+            ids = _escape(chunk.index.astype(str), quote=True)
+            values = zip(*[_escape(_to_text(chunk[c])) for c in node_columns]) if node_columns else [()] * len(chunk)
+            f.write("".join("    <node id={}>{}</node>\n".format(n, data("node", node_columns, v)) for n, v in zip(ids, values)))
+        for chunk in _chunks(edges_df, chunk_size):
+            sources = _escape(chunk["source"].astype(str), quote=True)
+            targets = _escape(chunk["target"].astype(str), quote=True)
+            texts = [_escape(_to_text(chunk[c].astype(float) if c == "weight" else chunk[c])) for c in edge_columns]
+            values = zip(*texts) if texts else [()] * len(chunk)
+            f.write(
+                "".join(
+                    "    <edge source={} target={}>{}</edge>\n".format(s, t, data("edge", edge_columns, v))
+                    for s, t, v in zip(sources, targets, values)
+                )
+            )
+        f.write("  </graph>\n</graphml>\n")
+    logger.debug("Graph saved to {}".format(filename))
+
+
+def write_edgelist(nodes_df, edges_df, data_path, chunk_size=100000):
+    # Compact format: nodes.csv holds the node ids and attributes, the node integer id being the row number,
+    # and edges.csv the edges between integer ids, with their attributes. Lists and dicts are json encoded
+    nodes_df, edges_df = _prepare_tables(nodes_df, edges_df)
+    os.makedirs(data_path, exist_ok=True)
+    node_ids = pd.Index(nodes_df.index)
+    for filename, df, to_frame in [
+        ("nodes.csv", nodes_df, lambda chunk: chunk.rename_axis("node").reset_index()),
+        (
+            "edges.csv",
+            edges_df,
+            lambda chunk: chunk.assign(source=node_ids.get_indexer(chunk["source"]), target=node_ids.get_indexer(chunk["target"])),
+        ),
+    ]:
+        filename = os.path.join(data_path, filename)
+        header = True
+        if df.empty:
+            to_frame(df).to_csv(filename, index=False)
+        for chunk in _chunks(df, chunk_size):
+            chunk = to_frame(chunk)
+            for col in chunk.columns:
+                if chunk[col].dtype == object:
+                    chunk[col] = [_encode(v) if isinstance(v, (list, dict, np.ndarray)) else v for v in chunk[col]]
+            chunk.to_csv(filename, index=False, header=header, mode="w" if header else "a")
+            header = False
+        logger.debug("Table saved to {}".format(filename))
+
+
+def _nullable_types(df, records):
+    # pandas reads an int or bool attribute missing on some items as float or object, it is kept with a nullable dtype
+    for col in df.columns:
+        if df[col].dtype.kind not in "fO" or not df[col].isna().any():
+            continue
+        values = [r[col] for r in records if r.get(col) is not None]
+        if not values:
+            continue
+        if all(isinstance(v, (bool, np.bool_)) for v in values):
+            df[col] = pd.array([r.get(col) for r in records], dtype="boolean")
+        elif all(isinstance(v, (int, np.integer)) and not isinstance(v, (bool, np.bool_)) for v in values):
+            df[col] = pd.array([r.get(col) for r in records], dtype="Int64")
+    return df
+
+
+def graph_to_tables(graph):
+    # node and edge tables of a networkx graph
+    nodes = [d for _, d in graph.nodes(data=True)]
+    nodes_df = _nullable_types(pd.DataFrame(nodes, index=pd.Index(list(graph.nodes()), tupleize_cols=False)), nodes)
+    edges = [{"source": s, "target": t, **d} for s, t, d in graph.edges(data=True)]
+    edges_df = _nullable_types(pd.DataFrame(edges), edges)
+    if not edges_df.empty and "weight" not in edges_df:
+        edges_df["weight"] = 1.0
+    return nodes_df, edges_df
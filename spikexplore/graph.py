@@ -3,13 +3,41 @@ import networkx as nx
 import numpy as np
 import json
 import logging
-from .helpers import combine_dicts
+from .helpers import accumulate_dict
+from .executors import SequentialExecutor, AsyncioExecutor, make_executor, is_async_backend
+from .config import DataCollectionConfig
+from .instrumentation import Instrumentation
+from .export import graph_to_tables, write_gexf, write_graphml
+from .louvain import louvain_communities
 from datetime import datetime, timedelta
-import community
 from tqdm import tqdm
 
 
 logger = logging.getLogger(__name__)
+json_encoder = json.JSONEncoder()
+
+
+def to_records(df):
+    # one dict per row, faster than to_dict("records") as values are read column-wise
+    columns = list(df.columns)
+    return [dict(zip(columns, row)) for row in zip(*[df[col].tolist() for col in columns])] if columns else [{}] * len(df)
+
+
+def json_encode_columns(df, types=(list, dict)):
+    """
+    Convert the values of the given types to json, column by column.
+        Only the columns of object dtype are scanned, the other ones cannot hold lists or dicts.
+    """
+    encoded = {}
+    for col in df.columns[df.dtypes == object]:
+        values = df[col].to_numpy()
+        mask = np.fromiter((isinstance(v, types) for v in values), dtype=bool, count=len(values))
+        if mask.any():
+            values = values.copy()
+            values[mask] = list(map(json_encoder.encode, values[mask]))
+            encoded[col] = pd.Series(values, index=df.index, dtype=object)
+            logger.debug('Field "{}" converted to json string'.format(col))
+    return df.assign(**encoded) if encoded else df
 
 
 def convert_to_json(edge_df):
@@ -17,13 +45,7 @@ def convert_to_json(edge_df):
     Check if column type is list or dict and convert it to json
         list or dict can not be saved using gexf or graphml format.
     """
-    edge_df_str = edge_df.copy()
-    for idx, col in enumerate(edge_df.columns):
-        first_row_element = edge_df.iloc[0, idx]
-        if isinstance(first_row_element, list) or isinstance(first_row_element, dict):
-            edge_df_str[col] = edge_df[col].apply(json.dumps)
-            logger.debug('Field "{}" of class {} converted to json string'.format(col, type(first_row_element)))
-    return edge_df_str
+    return json_encode_columns(edge_df.copy())
 
 
 def graph_from_edgeslist(edge_df, min_weight=0):
@@ -36,22 +58,12 @@ def graph_from_edgeslist(edge_df, min_weight=0):
     return G
 
 
-def attributes_tojson(data_dic):
-    for propname, propdic in data_dic.items():
-        for key, value in propdic.items():
-            if isinstance(value, list):
-                data_dic[propname][key] = json.dumps(value)
-            else:
-                data_dic[propname][key] = value
-    return data_dic
-
-
 def add_node_attributes(graph, node_df, attr_dic=None, attr_name=""):
-    node_dic = node_df.to_dict()
-
-    node_dic = attributes_tojson(node_dic)
-    for propname, propdic in node_dic.items():
-        nx.set_node_attributes(graph, propdic, name=propname)
+    node_df = json_encode_columns(node_df, types=list)
+    if node_df.index.has_duplicates:
+        node_df = node_df[~node_df.index.duplicated(keep="last")]
+    # one dict of attributes per node, nodes not in the graph are ignored
+    nx.set_node_attributes(graph, dict(zip(node_df.index, to_records(node_df))))
     if attr_dic:
         nx.set_node_attributes(graph, attr_dic, name=attr_name)
     return graph
@@ -60,15 +72,10 @@ def add_node_attributes(graph, node_df, attr_dic=None, attr_name=""):
 def add_edges_attributes(g, edges_df, drop_cols=None):
     if edges_df.empty:
         return g
-    if drop_cols:
-        edge_attr_df = edges_df.drop(columns=drop_cols)
-    else:
-        edge_attr_df = edges_df
-    edge_attr_df["ii"] = edge_attr_df[["source", "target"]].apply(tuple, axis=1)
-    edge_dic = edge_attr_df.set_index("ii").drop(columns=["source", "target"]).to_dict()
-
-    for propname, propdic in edge_dic.items():
-        nx.set_edge_attributes(g, propdic, name=propname)
+    edge_attr_df = edges_df.drop(columns=["source", "target"] + (drop_cols if drop_cols else []))
+    # one dict of attributes per edge, edges not in the graph are ignored
+    edge_dic = dict(zip(zip(edges_df["source"], edges_df["target"]), to_records(edge_attr_df)))
+    nx.set_edge_attributes(g, edge_dic)
     return g
 
 
@@ -83,61 +90,117 @@ def reduce_graph(g, degree_min):
     return g
 
 
-def detect_communities(G):
+def detect_communities(G, seed=None):
     # first compute the best partition
     if isinstance(G, nx.DiGraph):
         Gu = G.to_undirected()
     else:
         Gu = G
-    partition = community.best_partition(Gu, weight="weight")
-    if not partition.values():
+    nodes = list(Gu.nodes())
+    if not nodes:
         logger.warning("No communities found in graph")
         return G, {}
-    nx.set_node_attributes(G, partition, name="community")
+    labels = louvain_communities(nx.to_scipy_sparse_array(Gu, nodelist=nodes, weight="weight"), seed=seed)
+    nx.set_node_attributes(G, dict(zip(nodes, labels.tolist())), name="community")
     logger.debug("Communities saved on the graph as node attributes.")
-    nb_partitions = max(partition.values()) + 1
-    logger.info("Nb of partitions: {}".format(nb_partitions))
-    # Create a dictionary of subgraphs, one per community
-    community_dic = {}
-    for idx in range(nb_partitions):
-        subgraph = G.subgraph([key for (key, value) in partition.items() if value == idx])
-        community_dic[idx] = subgraph
-    # clusters_modularity = community.modularity(partition, Gu)
+    logger.info("Nb of partitions: {}".format(labels.max() + 1))
+    # Create a dictionary of subgraphs, one per community, grouping the nodes in one pass
+    members = {}
+    for node, label in zip(nodes, labels.tolist()):
+        members.setdefault(label, []).append(node)
+    community_dic = {idx: G.subgraph(community_nodes) for idx, community_nodes in members.items()}
     return G, community_dic
 
 
 def remove_small_communities(G, community_dic, min_size):
-    community_tmp = {k: v.copy() for k, v in community_dic.items()}
-    nb_removed = 0
-    for key in community_tmp:
-        graph = community_tmp[key]
-        if graph.number_of_nodes() <= min_size:
-            G.remove_nodes_from(graph.nodes())
-            nb_removed += 1
-    logger.info("removed {} community(ies) smaller than {} nodes.".format(nb_removed, min_size))
+    small_communities = [graph for graph in community_dic.values() if graph.number_of_nodes() <= min_size]
+    G.remove_nodes_from([node for graph in small_communities for node in list(graph.nodes())])
+    logger.info("removed {} community(ies) smaller than {} nodes.".format(len(small_communities), min_size))
     return G
 
 
-def process_hop(graph_handle, node_list, nodes_info_acc):
-    """collect the tweets and tweet info of the users in the list username_list"""
+def fetch_nodes(graph_handle, node_list, executor, instrumentation):
+    # get and filter the neighbors of each node, returns one (node_info, edges_df) per node, in the order of node_list
+    disable_tqdm = logging.root.level >= logging.INFO  # Display progress bar if needed
+    with instrumentation.timer("fetch_wall"), tqdm(total=len(node_list), disable=disable_tqdm) as pbar:
+
+        def fetch(node):
+            # Collect neighbors for the next hop
+            with instrumentation.timer("fetch"):
+                node_info, edges_df = graph_handle.get_neighbors(node)
+            with instrumentation.timer("filter"):
+                node_info, edges_df = graph_handle.filter(node_info, edges_df)
+            pbar.update(1)
+            return node_info, edges_df
+
+        async def fetch_async(node):
+            start = instrumentation.clock()
+            node_info, edges_df = await graph_handle.get_neighbors(node)
+            instrumentation.add_time("fetch", instrumentation.clock() - start)  # including the time waiting for other coroutines
+            with instrumentation.timer("filter"):
+                node_info, edges_df = graph_handle.filter(node_info, edges_df)
+            pbar.update(1)
+            return node_info, edges_df
+
+        if is_async_backend(graph_handle):
+            fetch = fetch_async
+
+        return executor.map(fetch, node_list)
+
+
+def fetch_batch(graph_handle, node_list, executor, instrumentation):
+    # get and filter the neighbors of the whole hop at once, returns None if the backend cannot serve this hop as a batch
+    with instrumentation.timer("fetch_wall"), instrumentation.timer("fetch"):
+        batch = graph_handle.get_neighbors_batch(node_list, executor)
+    if batch is None:
+        return None
+    with instrumentation.timer("filter"):
+        return [graph_handle.filter_batch(*batch)]
+
+
+def process_hop(graph_handle, node_list, nodes_info_acc, executor=None, instrumentation=None):
+    """collect the tweets and tweet info of the users in the list username_list
+    Backends implement the per-node protocol: get_neighbors(node) and filter(node_info, edges_df) returning the node info
+    and the edges of a node. They may also implement the batch protocol, preferred when available:
+    get_neighbors_batch(node_list, executor) returning a single node info and edges table for the whole hop (or None
+    to fall back to the per-node protocol), and filter_batch(node_info, edges_df) filtering them"""
+    if executor is None and is_async_backend(graph_handle):
+        # coroutines can only be driven from an event loop
+        with make_executor("asyncio", DataCollectionConfig.max_in_flight) as executor:
+            return process_hop(graph_handle, node_list, nodes_info_acc, executor, instrumentation)
+    if executor is None:
+        executor = SequentialExecutor()
+    if is_async_backend(graph_handle) and not isinstance(executor, AsyncioExecutor):
+        raise ValueError("Async backends can only be run with an AsyncioExecutor.")
     new_node_dic = {}
-    total_edges_df = pd.DataFrame()
-    total_nodes_df = pd.DataFrame()
+    nodes_df_list = []
+    edges_df_list = []
+    if instrumentation is None:
+        instrumentation = Instrumentation()
+    instrumentation.count("nodes_fetched", len(node_list))
 
-    # Display progress bar if needed
-    disable_tqdm = logging.root.level >= logging.INFO
     logger.info("processing next hop with {} nodes".format(len(node_list)))
-    for node in tqdm(node_list, disable=disable_tqdm):
-        # Collect neighbors for the next hop
-        node_info, edges_df = graph_handle.get_neighbors(node)
-        node_info, edges_df = graph_handle.filter(node_info, edges_df)
-
-        total_nodes_df = pd.concat([total_nodes_df, node_info.get_nodes()])
-        nodes_info_acc.update(node_info)  # add new info
-        if not edges_df.empty:
-            total_edges_df = pd.concat([total_edges_df, edges_df]).groupby(["source", "target"]).sum().reset_index()
-        neighbors_dic = graph_handle.neighbors_with_weights(edges_df)
-        new_node_dic = combine_dicts(new_node_dic, neighbors_dic)
+    results = None
+    if hasattr(graph_handle, "get_neighbors_batch"):
+        results = fetch_batch(graph_handle, node_list, executor, instrumentation)
+    if results is None:
+        results = fetch_nodes(graph_handle, node_list, executor, instrumentation)
+
+    with instrumentation.timer("aggregate"):
+        # merge in the order of node_list, whatever the order in which the nodes were fetched
+        for node_info, edges_df in results:
+            nodes_df_list.append(node_info.get_nodes())
+            nodes_info_acc.update(node_info)  # add new info
+            if not edges_df.empty:
+                edges_df_list.append(edges_df)
+            neighbors_dic = graph_handle.neighbors_with_weights(edges_df)
+            accumulate_dict(new_node_dic, neighbors_dic)
+
+        # concatenate and aggregate once for the whole hop
+        total_nodes_df = pd.concat(nodes_df_list) if nodes_df_list else pd.DataFrame()
+        total_edges_df = pd.DataFrame()
+        if edges_df_list:
+            total_edges_df = pd.concat(edges_df_list).groupby(["source", "target"]).sum().reset_index()
 
     return new_node_dic, total_edges_df, total_nodes_df, nodes_info_acc
 
@@ -157,6 +220,7 @@ def handle_spikyball_neighbors(graph, backend, remove=True, node_acc=None):
         # TODO this needs checking
         # Option 2: collect the missing node data
         logger.info("Collecting info for neighbors...")
+        node_acc = node_acc if node_acc is not None else backend.create_node_info()
         new_nodes_founds, edges_df, nodes_df, node_acc = process_hop(backend, sp_neighbors, node_acc)
         graph = add_node_attributes(graph, nodes_df)
         sp_nodes_dic = {node: -1 for node in sp_neighbors}
@@ -179,6 +243,11 @@ def compute_meantime(date_list):
     return datetime.fromtimestamp(meand), timedelta(seconds=stdd)
 
 
-def save_graph(graph, graphfilename):
-    nx.write_gexf(graph, graphfilename)
-    logger.debug("Graph saved to", graphfilename)
+def save_graph(graph, graphfilename, chunk_size=100000):
+    # GraphML if the file extension is .graphml, GEXF otherwise. To export large explorations without building
+    # the networkx graph, use the writers of spikexplore.export directly on the node and edge tables
+    nodes_df, edges_df = graph_to_tables(graph)
+    if graphfilename.endswith(".graphml"):
+        write_graphml(nodes_df, edges_df, graphfilename, directed=graph.is_directed(), chunk_size=chunk_size)
+    else:
+        write_gexf(nodes_df, edges_df, graphfilename, directed=graph.is_directed(), chunk_size=chunk_size)
@@ -1,39 +1,145 @@
 from spikexplore.graph import graph_from_edgeslist, reduce_graph, handle_spikyball_neighbors
 from spikexplore.graph import detect_communities, remove_small_communities
 from spikexplore.collect_edges import spiky_ball
+from spikexplore.sparse_graph import SparseGraph, detect_communities_sparse
+from spikexplore.instrumentation import Instrumentation
+from spikexplore.cache import CachedBackend, make_cache
+from spikexplore.executors import is_async_backend
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import multiprocessing
+import pickle
 import networkx as nx
 
 
-def create_graph(backend, nodes_df, edges_df, nodes_info, config):
+def create_graph(backend, nodes_df, edges_df, nodes_info, config, instrumentation=None):
+    if instrumentation is None:
+        instrumentation = Instrumentation()
     min_weight = config.min_weight
-    g = graph_from_edgeslist(edges_df, min_weight=min_weight)
+    with instrumentation.timer("graph_build"):
+        g = graph_from_edgeslist(edges_df, min_weight=min_weight)
     if nx.is_empty(g):
         return g
-    g = backend.add_graph_attributes(g, nodes_df, edges_df, nodes_info)
-    g = reduce_graph(g, config.min_degree)
-    g = handle_spikyball_neighbors(g, backend)
-    if config.as_undirected:
-        g = g.to_undirected()
-        c = nx.number_connected_components(g)
-        if c == 1:
-            return g
-        # take largest connected component
-        largest_cc = max(nx.connected_components(g), key=len)
-        return nx.subgraph(g, largest_cc)
+    with instrumentation.timer("attributes"):
+        g = backend.add_graph_attributes(g, nodes_df, edges_df, nodes_info)
+    with instrumentation.timer("graph_build"):
+        g = reduce_graph(g, config.min_degree)
+        g = handle_spikyball_neighbors(g, backend)
+        if config.as_undirected:
+            g = g.to_undirected()
+            c = nx.number_connected_components(g)
+            if c == 1:
+                return g
+            # take largest connected component
+            largest_cc = max(nx.connected_components(g), key=len)
+            return nx.subgraph(g, largest_cc)
     # cannot do the connected component on directed graphs
     return g
 
 
-def explore(backend, initial_nodes, config, progress_callback=None):
+def create_sparse_graph(backend, nodes_df, edges_df, nodes_info, config, instrumentation=None):
+    # same steps as create_graph, on a SparseGraph
+    if instrumentation is None:
+        instrumentation = Instrumentation()
+    with instrumentation.timer("attributes"):
+        nodes_table, edges_table = backend.graph_tables(nodes_df, edges_df, nodes_info)
+    with instrumentation.timer("graph_build"):
+        g = SparseGraph.from_tables(nodes_table, edges_table, min_weight=config.min_weight)
+        if g.number_of_nodes() == 0:
+            return g
+        g = g.reduce(config.min_degree)
+        g = g.remove_nodes_without("spikyball_hop")  # neighbors of the spiky ball, their info was not collected
+        if config.as_undirected:
+            g = g.to_undirected().largest_component()
+    return g
+
+
+def explore(backend, initial_nodes, config, progress_callback=None, resume_from=None, stats=None, instrumentation=None):
+    # resume_from: path of a checkpoint saved by a previous exploration (see DataCollectionConfig.checkpoint_path)
+    # stats: ExplorationStats filled with the statistics of each hop
+    # instrumentation: Instrumentation recording the timings and counters of the exploration, and emitting them as events
     if not initial_nodes:
         raise ValueError("Cannot start without initial nodes.")
+    if instrumentation is None:
+        instrumentation = Instrumentation()
     nodes_list, nodes_df, edges_df, nodes_info = spiky_ball(
-        initial_nodes, backend, config.data_collection, node_acc=backend.create_node_info(), progress_callback=progress_callback
+        initial_nodes,
+        backend,
+        config.data_collection,
+        node_acc=backend.create_node_info(),
+        progress_callback=progress_callback,
+        resume_from=resume_from,
+        stats=stats,
+        instrumentation=instrumentation,
     )
-    # create graph from edge list
-    g = create_graph(backend, nodes_df, edges_df, nodes_info, config.graph)
+    if config.graph.as_sparse:
+        g = create_sparse_graph(backend, nodes_df, edges_df, nodes_info, config.graph, instrumentation)
+        if config.graph.community_detection:
+            with instrumentation.timer("communities"):
+                g = detect_communities_sparse(g, config.graph.min_community_size, seed=config.graph.seed)
+    else:
+        # create graph from edge list
+        g = create_graph(backend, nodes_df, edges_df, nodes_info, config.graph, instrumentation)
 
-    if config.graph.community_detection:
-        _, community_dict = detect_communities(g)
-        g = remove_small_communities(g, community_dict, config.graph.min_community_size)
+        if config.graph.community_detection:
+            with instrumentation.timer("communities"):
+                _, community_dict = detect_communities(g, seed=config.graph.seed)
+                g = remove_small_communities(g, community_dict, config.graph.min_community_size)
+    instrumentation.emit("summary", **instrumentation.summary())
     return g, nodes_info
+
+
+_worker_backend = None  # CachedBackend of a worker process of explore_many
+
+
+def _init_worker(backend, cache_path, cache_max_entries):
+    global _worker_backend
+    _worker_backend = CachedBackend(backend, make_cache(cache_path, "neighbors", cache_max_entries))
+
+
+def _explore_in_worker(job):
+    # exploration in a worker process, with the neighbors cache statistics of this job only
+    before = _worker_backend.neighbors_stats()
+    g, nodes_info = explore(_worker_backend, *job)
+    return g, nodes_info, {k: v - before[k] for k, v in _worker_backend.neighbors_stats().items()}
+
+
+def explore_many(backend, jobs, max_workers=4, mode="thread", cache=None, cache_path=None, cache_max_entries=None):
+    """Run several explorations on the same backend concurrently, each job being a pair (initial_nodes, config),
+    e.g. for different seeds or parameter sweeps. The neighbors fetched by a job are cached and reused by the others.
+        mode "thread": the jobs run in a thread pool and share a single cache (a ResponseCache, in memory if None).
+            The backend counters recorded by the instrumentation of each job (requests, retries, cache hits...) are the
+            changes of the counters shared by all the jobs, so they include the requests of the jobs running meanwhile
+        mode "process": the jobs run in a process pool, the backend being copied to each worker. Unless the processes
+            are forked, the backend and the jobs (including their stop conditions) must be picklable, which the Bluesky
+            backends are not. The workers share the neighbors through the SQLite file cache_path, or each keeps its own in memory if None
+    Returns the (graph, nodes_info) of each job, in the order of the jobs, and the neighbors statistics of all the jobs:
+    nb of requests, of nodes fetched from the backend and of requests served by the cache"""
+    if is_async_backend(backend):
+        raise ValueError("Async backends are bound to a single event loop and cannot be shared by several explorations.")
+    if max_workers < 1:
+        raise ValueError("max_workers must be > 0.")
+    jobs = list(jobs)
+    if mode == "thread":
+        cached_backend = CachedBackend(backend, cache if cache is not None else make_cache(cache_path, "neighbors", cache_max_entries))
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            results = list(pool.map(lambda job: explore(cached_backend, *job), jobs))
+        stats = cached_backend.neighbors_stats()
+    elif mode == "process":
+        context = multiprocessing.get_context()
+        if context.get_start_method() != "fork":
+            try:
+                pickle.dumps(backend)
+            except Exception as e:
+                raise ValueError(
+                    'The backend cannot be copied to processes started with "{}" ({}), use mode="thread".'.format(context.get_start_method(), e)
+                ) from e
+        with ProcessPoolExecutor(
+            max_workers=max_workers, mp_context=context, initializer=_init_worker, initargs=(backend, cache_path, cache_max_entries)
+        ) as pool:
+            worker_results = list(pool.map(_explore_in_worker, jobs))
+        results = [(g, nodes_info) for g, nodes_info, _ in worker_results]
+        stats = {k: sum(job_stats[k] for _, _, job_stats in worker_results) for k in ["requests", "fetched", "waits"]}
+    else:
+        raise ValueError('Unknown mode. Choose "thread" or "process".')
+    stats = {"jobs": len(jobs), **stats, "hits": stats["requests"] - stats["fetched"]}
+    return results, stats
@@ -3,3 +3,10 @@ import operator
 
 def combine_dicts(a, b, op=operator.add):
     return {**a, **b, **{k: op(a[k], b[k]) for k in a.keys() & b.keys()}}
+
+
+def accumulate_dict(acc, b, op=operator.add):
+    # in-place version of combine_dicts, avoids copying the accumulator at each call
+    for k, v in b.items():
+        acc[k] = op(acc[k], v) if k in acc else v
+    return acc
@@ -0,0 +1,87 @@
+import json
+import threading
+import time
+from contextlib import contextmanager
+
+
+def backend_counters(graph_handle):
+    # request and cache counters exposed by the backend, if any
+    counters = {}
+    if hasattr(graph_handle, "request_stats"):
+        counters.update(graph_handle.request_stats())
+    if hasattr(graph_handle, "cache_stats"):
+        caches = graph_handle.cache_stats().values()
+        counters["cache_hits"] = sum(c["hits"] for c in caches)
+        counters["cache_misses"] = sum(c["misses"] for c in caches)
+    return counters
+
+
+class Instrumentation:
+    """Timers and counters of an exploration, reported per hop and in total.
+    Stage timings are summed, so the time spent in the per-node stages (fetch, filter) adds up the time of all the
+    workers and can exceed the wall time of the hop (fetch_wall) when nodes are fetched concurrently.
+    If given, callback receives structured events, as dicts with an "event" key:
+        hop: timings and counters of a hop, once it is merged
+        stage: timing of a stage run outside of the hops (final aggregation, graph build, attributes, communities)
+        summary: total timings and counters, at the end of explore()"""
+
+    def __init__(self, callback=None, clock=time.perf_counter):
+        self.callback = callback
+        self.clock = clock
+        self.timings = {}  # stage -> seconds
+        self.counters = {}
+        self.hops = []
+        self.lock = threading.Lock()
+        self._hop = None
+        self._backend_counters = {}
+
+    def emit(self, event, **fields):
+        if self.callback:
+            self.callback({"event": event, **fields})
+
+    @contextmanager
+    def timer(self, stage):
+        start = self.clock()
+        try:
+            yield
+        finally:
+            self.add_time(stage, self.clock() - start)
+
+    def add_time(self, stage, seconds):
+        with self.lock:
+            self.timings[stage] = self.timings.get(stage, 0.0) + seconds
+            hop = self._hop
+            if hop is not None:
+                hop["timings"][stage] = hop["timings"].get(stage, 0.0) + seconds
+        if hop is None:
+            self.emit("stage", stage=stage, seconds=seconds)
+
+    def count(self, name, n=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+            if self._hop is not None:
+                self._hop["counters"][name] = self._hop["counters"].get(name, 0) + n
+
+    def start_hop(self, depth, graph_handle=None):
+        self._hop = {"depth": depth, "timings": {}, "counters": {}}
+        self._backend_counters = backend_counters(graph_handle)
+
+    def end_hop(self, graph_handle=None):
+        for name, value in backend_counters(graph_handle).items():
+            self.count(name, value - self._backend_counters.get(name, 0))
+        hop, self._hop = self._hop, None
+        self.hops.append(hop)
+        self.emit("hop", **hop)
+        return hop
+
+    def summary(self):
+        return {"timings": dict(self.timings), "counters": dict(self.counters)}
+
+
+def jsonl_writer(f):
+    # callback writing the events to a text file, one json object per line
+    def write(event):
+        f.write(json.dumps(event) + "\n")
+        f.flush()
+
+    return write
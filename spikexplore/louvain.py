@@ -0,0 +1,97 @@
+from collections import deque
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+MIN_IMPROVEMENT = 1e-7  # stop when the modularity increases less than this
+
+
+def _node_weights(adjacency):
+    # adjacency with self loops counted twice, so that weighted degrees are the row sums
+    return adjacency + sparse.diags_array(adjacency.diagonal(), format="csr")
+
+
+def modularity(adjacency, labels, resolution=1.0):
+    # modularity of a partition of an undirected graph given by its symmetric adjacency matrix
+    adjacency = _node_weights(sparse.csr_array(adjacency, dtype=float))
+    return _modularity(adjacency, np.asarray(labels), resolution, adjacency.sum(axis=1))
+
+
+def _modularity(adjacency, labels, resolution, degrees):
+    total = degrees.sum()
+    if total == 0:
+        return 0.0
+    rows = np.repeat(np.arange(adjacency.shape[0]), np.diff(adjacency.indptr))
+    inside = labels[rows] == labels[adjacency.indices]
+    internal = adjacency.data[inside].sum()
+    community_degrees = np.bincount(labels, weights=degrees)
+    return internal / total - resolution * np.sum(community_degrees**2) / total**2
+
+
+def _one_level(adjacency, degrees, resolution, rng):
+    # Move nodes to the neighboring community with the largest modularity gain. Nodes are visited in random order,
+    # then only the neighbors of the nodes that moved are visited again, until no move is possible
+    n = adjacency.shape[0]
+    indptr = adjacency.indptr.tolist()
+    indices = adjacency.indices.tolist()
+    weights = adjacency.data.tolist()
+    node_degrees = degrees.tolist()
+    labels = list(range(n))
+    community_degrees = node_degrees.copy()
+    k = resolution / degrees.sum()
+    min_gain = MIN_IMPROVEMENT * degrees.sum() / 2  # gains are in weight units, a gain g increases the modularity by g / m
+    queue = deque(rng.permutation(n).tolist())
+    queued = [True] * n
+    while queue:
+        i = queue.popleft()
+        queued[i] = False
+        community = labels[i]
+        ki = node_degrees[i]
+        neighbors = indices[indptr[i] : indptr[i + 1]]
+        neighbor_weights = {}
+        for j, w in zip(neighbors, weights[indptr[i] : indptr[i + 1]]):
+            if j != i:
+                c = labels[j]
+                neighbor_weights[c] = neighbor_weights.get(c, 0.0) + w
+        community_degrees[community] -= ki
+        best = community
+        best_gain = neighbor_weights.get(community, 0.0) - community_degrees[community] * ki * k
+        for c, w in neighbor_weights.items():
+            gain = w - community_degrees[c] * ki * k
+            if gain > best_gain + min_gain:
+                best, best_gain = c, gain
+        community_degrees[best] += ki
+        if best != community:
+            labels[i] = best
+            for j in neighbors:
+                if not queued[j] and labels[j] != best:
+                    queued[j] = True
+                    queue.append(j)
+    return np.array(labels)
+
+
+def louvain_communities(adjacency, resolution=1.0, seed=None):
+    """Louvain community detection on a symmetric (weighted) sparse adjacency matrix.
+    Returns the community label of each node, labels being numbered in the order of the nodes"""
+    adjacency = _node_weights(sparse.csr_array(adjacency, dtype=float))
+    n = adjacency.shape[0]
+    labels = np.arange(n)
+    if adjacency.sum() == 0:
+        return labels  # no edges, each node is alone
+    rng = np.random.default_rng(seed)
+    current = None
+    while True:
+        degrees = adjacency.sum(axis=1)
+        level_labels = pd.factorize(_one_level(adjacency, degrees, resolution, rng))[0]
+        new = _modularity(adjacency, level_labels, resolution, degrees)
+        if current is not None and new - current < MIN_IMPROVEMENT:
+            break
+        labels = level_labels[labels]
+        current = new
+        nb_communities = level_labels.max() + 1
+        if nb_communities == adjacency.shape[0]:
+            break
+        # aggregate the communities into nodes for the next level
+        membership = sparse.csr_array((np.ones(len(level_labels)), (np.arange(len(level_labels)), level_labels)))
+        adjacency = (membership.T @ adjacency @ membership).tocsr()
+    return pd.factorize(labels)[0]
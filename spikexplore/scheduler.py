@@ -0,0 +1,182 @@
+import asyncio
+import logging
+import random
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+STATS = ["api_calls", "retries", "request_failures", "request_wait", "request_work"]
+
+
+class TokenBucket:
+    """Rate limiter allowing rate requests per second on average, with bursts of at most burst requests.
+    Tokens are reserved in advance, so that concurrent callers are spread in time rather than retrying"""
+
+    def __init__(self, rate, burst=None, clock=time.monotonic):
+        if rate <= 0:
+            raise ValueError("rate must be > 0.")
+        self.rate = rate
+        self.capacity = burst if burst is not None else max(rate, 1.0)
+        self.tokens = self.capacity
+        self.clock = clock
+        self.updated = clock()
+
+    def reserve(self):
+        # take a token, return the delay (in seconds) before it can be used
+        now = self.clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= 1
+        return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+
+def never_retry(error):
+    return False
+
+
+def no_retry_after(error):
+    return None
+
+
+class RequestScheduler:
+    """Runs the remote calls of a backend, from threads (call) or coroutines (acall):
+        - at most max_in_flight calls at the same time
+        - rate_limits: endpoint -> max nb of calls per second, endpoints without a limit are not throttled
+        - calls failing with an error for which is_retryable(error) is true are retried at most max_retries times,
+          after the delay given by retry_after(error) (e.g. a Retry-After header) if not None, or else after an
+          exponential backoff with jitter starting at retry_backoff seconds
+    The time spent waiting (rate limit, free slot, backoff) and working (the calls) is recorded per endpoint.
+    clock, sleep, async_sleep and rng can be replaced to test the scheduling without waiting"""
+
+    def __init__(
+        self,
+        max_in_flight=8,
+        rate_limits=None,
+        max_retries=5,
+        retry_backoff=1.0,
+        is_retryable=never_retry,
+        retry_after=no_retry_after,
+        clock=time.monotonic,
+        sleep=time.sleep,
+        async_sleep=asyncio.sleep,
+        rng=None,
+    ):
+        if max_in_flight < 1:
+            raise ValueError("max_in_flight must be > 0.")
+        self.max_in_flight = max_in_flight
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.is_retryable = is_retryable
+        self.retry_after = retry_after
+        self.clock = clock
+        self.sleep = sleep
+        self.async_sleep = async_sleep
+        self.rng = rng if rng is not None else random.Random()
+        self.buckets = {endpoint: TokenBucket(rate, clock=clock) for endpoint, rate in (rate_limits or {}).items()}
+        self.slots = threading.BoundedSemaphore(max_in_flight)
+        self.loop = None
+        self.async_slots = None
+        self.lock = threading.Lock()
+        self.endpoints = {}  # endpoint -> stats
+
+    def __getstate__(self):
+        # the locks and the slots cannot be copied to another process, a copy gets its own
+        state = self.__dict__.copy()
+        for name in ["slots", "loop", "async_slots", "lock"]:
+            del state[name]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.slots = threading.BoundedSemaphore(self.max_in_flight)
+        self.loop = None
+        self.async_slots = None
+        self.lock = threading.Lock()
+
+    def _reserve(self, endpoint):
+        bucket = self.buckets.get(endpoint)
+        if bucket is None:
+            return 0.0
+        with self.lock:
+            return bucket.reserve()
+
+    def _add(self, endpoint, **values):
+        with self.lock:
+            stats = self.endpoints.setdefault(endpoint, dict.fromkeys(STATS, 0))
+            for name, value in values.items():
+                stats[name] += value
+
+    def _retry_delay(self, endpoint, error, attempt):
+        # delay before retrying the failed call, the error is raised again if it cannot be retried
+        if attempt >= self.max_retries or not self.is_retryable(error):
+            self._add(endpoint, request_failures=1)
+            raise error
+        delay = self.retry_after(error)
+        if delay is None:
+            delay = self.retry_backoff * 2**attempt * self.rng.uniform(0.5, 1.0)
+        self._add(endpoint, retries=1)
+        logger.warning(f"Request {endpoint} failed ({error}), retrying in {delay:.1f}s")
+        return delay
+
+    def call(self, endpoint, fn, *args, **kwargs):
+        attempt = 0
+        while True:
+            start = self.clock()
+            delay = self._reserve(endpoint)
+            if delay > 0:
+                self.sleep(delay)
+            with self.slots:
+                started = self.clock()
+                error = None
+                try:
+                    return fn(*args, **kwargs)
+                except Exception as e:
+                    error = e
+                finally:
+                    self._add(endpoint, api_calls=1, request_wait=started - start, request_work=self.clock() - started)
+            delay = self._retry_delay(endpoint, error, attempt)
+            start = self.clock()
+            self.sleep(delay)
+            self._add(endpoint, request_wait=self.clock() - start)
+            attempt += 1
+
+    async def acall(self, endpoint, fn, *args, **kwargs):
+        # same as call for a coroutine function, run on the event loop. The slots are bound to the running loop
+        loop = asyncio.get_running_loop()
+        if self.loop is not loop:
+            self.loop = loop
+            self.async_slots = asyncio.Semaphore(self.max_in_flight)
+        attempt = 0
+        while True:
+            start = self.clock()
+            delay = self._reserve(endpoint)
+            if delay > 0:
+                await self.async_sleep(delay)
+            async with self.async_slots:
+                started = self.clock()
+                error = None
+                try:
+                    return await fn(*args, **kwargs)
+                except Exception as e:
+                    error = e
+                finally:
+                    self._add(endpoint, api_calls=1, request_wait=started - start, request_work=self.clock() - started)
+            delay = self._retry_delay(endpoint, error, attempt)
+            start = self.clock()
+            await self.async_sleep(delay)  # without holding a slot
+            self._add(endpoint, request_wait=self.clock() - start)
+            attempt += 1
+
+    def endpoint_stats(self):
+        with self.lock:
+            return {endpoint: dict(stats) for endpoint, stats in self.endpoints.items()}
+
+    def stats(self):
+        # totals over all the endpoints: nb of calls (including the retried ones), retries, calls that finally failed,
+        # time spent waiting and working (in seconds, summed over the concurrent calls)
+        totals = dict.fromkeys(STATS, 0)
+        for stats in self.endpoint_stats().values():
+            for name, value in stats.items():
+                totals[name] += value
+        return totals
@@ -0,0 +1,139 @@
+import logging
+import numpy as np
+import pandas as pd
+import networkx as nx
+from scipy import sparse
+from scipy.sparse import csgraph
+from .graph import json_encode_columns, to_records
+from .louvain import louvain_communities
+
+logger = logging.getLogger(__name__)
+
+
+class SparseGraph:
+    """Graph stored as a CSR adjacency matrix together with columnar attribute tables, a lighter alternative
+    to a networkx graph for large samples.
+    nodes: node ids, the position of a node in this index being its row/column in the adjacency matrix
+    edges_df: one row per edge, with the source and target node positions, the weight and the other edge attributes
+    nodes_df: node attributes indexed by node id, for the nodes having attributes (None values stand for missing attributes)"""
+
+    def __init__(self, nodes, edges_df, nodes_df=None, directed=True):
+        self.nodes = nodes
+        self.edges_df = edges_df.reset_index(drop=True)
+        self.nodes_df = nodes_df if nodes_df is not None else pd.DataFrame(index=nodes[:0])
+        self.directed = directed
+        self._adjacency = None
+
+    @classmethod
+    def from_tables(cls, nodes_df, edges_df, min_weight=0, directed=True):
+        # same nodes and edges as graph_from_edgeslist, with the attributes of the tables
+        if edges_df.empty:
+            return cls(pd.Index([]), pd.DataFrame(columns=["source", "target", "weight"]), None, directed)
+        edges_df = edges_df[edges_df["weight"] >= min_weight]
+        # interleave sources and targets to number the nodes in the order networkx would add them
+        codes, nodes = pd.factorize(np.column_stack([edges_df["source"].to_numpy(), edges_df["target"].to_numpy()]).ravel())
+        codes = codes.reshape(-1, 2)
+        nodes = pd.Index(nodes, tupleize_cols=False)
+        edges = edges_df.drop(columns=["source", "target"])
+        edges.insert(0, "source", codes[:, 0])
+        edges.insert(1, "target", codes[:, 1])
+        edges = edges.drop_duplicates(["source", "target"], keep="last")
+        g = cls(nodes, edges, nodes_df[nodes_df.index.isin(nodes)] if nodes_df is not None else None, True)
+        return g if directed else g.to_undirected()
+
+    def number_of_nodes(self):
+        return len(self.nodes)
+
+    def number_of_edges(self):
+        return len(self.edges_df)
+
+    @property
+    def adjacency(self):
+        # weighted adjacency matrix, symmetric for undirected graphs
+        if self._adjacency is None:
+            n = len(self.nodes)
+            source = self.edges_df["source"].to_numpy()
+            target = self.edges_df["target"].to_numpy()
+            weight = self.edges_df["weight"].to_numpy(dtype=float)
+            if not self.directed:
+                mirrored = source != target
+                source, target = np.concatenate([source, target[mirrored]]), np.concatenate([target, source[mirrored]])
+                weight = np.concatenate([weight, weight[mirrored]])
+            self._adjacency = sparse.csr_array((weight, (source, target)), shape=(n, n))
+        return self._adjacency
+
+    def degree(self):
+        # nb of edges at each node (in + out for directed graphs, self loops counted twice)
+        n = len(self.nodes)
+        return np.bincount(self.edges_df["source"], minlength=n) + np.bincount(self.edges_df["target"], minlength=n)
+
+    def subgraph(self, keep):
+        # keep is a boolean mask over the nodes
+        source = self.edges_df["source"].to_numpy()
+        target = self.edges_df["target"].to_numpy()
+        keep_edges = keep[source] & keep[target]
+        new_codes = np.cumsum(keep) - 1
+        edges = self.edges_df[keep_edges].assign(source=new_codes[source[keep_edges]], target=new_codes[target[keep_edges]])
+        nodes = self.nodes[keep]
+        return SparseGraph(nodes, edges, self.nodes_df[self.nodes_df.index.isin(nodes)], self.directed)
+
+    def remove_isolates(self):
+        isolated = self.degree() == 0
+        logger.info("removed {} isolated nodes.".format(np.count_nonzero(isolated)))
+        return self.subgraph(~isolated)
+
+    def reduce(self, degree_min):
+        # same as reduce_graph: drop the nodes with a small degree, then the isolated nodes
+        g = self.subgraph(self.degree() >= degree_min)
+        logger.info("Nb of nodes after removing nodes with degree strictly smaller than {}: {}".format(degree_min, g.number_of_nodes()))
+        return g.remove_isolates()
+
+    def remove_nodes_without(self, attribute):
+        # keep the nodes having a value for the attribute
+        if attribute not in self.nodes_df.columns:
+            return self.subgraph(np.zeros(len(self.nodes), dtype=bool))
+        return self.subgraph(self.nodes.isin(self.nodes_df.index))
+
+    def largest_component(self):
+        # largest (weakly) connected component
+        nb_components, labels = csgraph.connected_components(self.adjacency, directed=self.directed, connection="weak")
+        if nb_components <= 1:
+            return self
+        return self.subgraph(labels == np.argmax(np.bincount(labels)))
+
+    def to_undirected(self):
+        # when both (u, v) and (v, u) exist, the attributes of the edge starting from the last node are kept, as networkx does
+        if not self.directed:
+            return self
+        edges = self.edges_df.sort_values("source", kind="stable")
+        source = edges["source"].to_numpy()
+        target = edges["target"].to_numpy()
+        pairs = pd.DataFrame({"u": np.minimum(source, target), "v": np.maximum(source, target)})
+        edges = edges[~pairs.duplicated(keep="last").to_numpy()]
+        return SparseGraph(self.nodes, edges, self.nodes_df, directed=False)
+
+    def to_networkx(self):
+        g = nx.DiGraph() if self.directed else nx.Graph()
+        g.add_nodes_from(self.nodes)
+        source = self.nodes.take(self.edges_df["source"].to_numpy())
+        target = self.nodes.take(self.edges_df["target"].to_numpy())
+        attrs = to_records(self.edges_df.drop(columns=["source", "target"]))
+        g.add_edges_from(zip(source, target, attrs))
+        # lists are json encoded, as add_node_attributes does
+        nodes_df = json_encode_columns(self.nodes_df, types=list)
+        nx.set_node_attributes(g, {n: {k: v for k, v in d.items() if v is not None} for n, d in zip(nodes_df.index, to_records(nodes_df))})
+        return g
+
+
+def detect_communities_sparse(g, min_size, seed=None):
+    # label the nodes with their community ("community" node attribute) and remove the communities
+    # with at most min_size nodes, as detect_communities and remove_small_communities do
+    if g.number_of_nodes() == 0:
+        return g
+    labels = louvain_communities(g.to_undirected().adjacency, seed=seed)
+    logger.info("Nb of partitions: {}".format(labels.max() + 1))
+    nodes_df = g.nodes_df.assign(community=pd.Series(labels, index=g.nodes).reindex(g.nodes_df.index))
+    # drop the small communities from their label counts
+    sizes = np.bincount(labels)
+    logger.info("removed {} community(ies) smaller than {} nodes.".format(np.count_nonzero(sizes <= min_size), min_size))
+    return SparseGraph(g.nodes, g.edges_df, nodes_df, g.directed).subgraph(sizes[labels] > min_size)
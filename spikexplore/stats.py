@@ -0,0 +1,96 @@
+import numpy as np
+
+
+class ExplorationStats:
+    """Statistics of the graph being collected by the spiky ball, updated after each hop.
+    Nodes are identified by their codes in the exploration NodeIndex. The connected components of the collected
+    graph are tracked with a union-find, as an estimate of the largest component of the final graph"""
+
+    def __init__(self):
+        self.hops = []  # one dict of metrics per hop
+        self.parent = np.zeros(0, dtype=np.int64)  # union-find forest, a parent always has a smaller code than its child
+        self.touched = np.zeros(0, dtype=bool)  # nodes connected by the collected edges
+        self.weighted_degree = np.zeros(0)
+        self.nb_nodes = 0
+        self.nb_edges = 0
+
+    def _grow(self, size):
+        if size <= len(self.parent):
+            return
+        size = max(size, 2 * len(self.parent))
+        self.parent = np.concatenate([self.parent, np.arange(len(self.parent), size)])
+        self.touched = np.concatenate([self.touched, np.zeros(size - len(self.touched), dtype=bool)])
+        self.weighted_degree = np.concatenate([self.weighted_degree, np.zeros(size - len(self.weighted_degree))])
+
+    def _compress(self):
+        # point every node to its root
+        while True:
+            grand_parent = self.parent[self.parent]
+            if np.array_equal(grand_parent, self.parent):
+                return
+            self.parent = grand_parent
+
+    def add_edges(self, edges):
+        # edges is an EdgeStore
+        if len(edges) == 0:
+            return
+        source = edges.source.astype(np.int64)
+        target = edges.target.astype(np.int64)
+        self._grow(int(max(source.max(), target.max())) + 1)
+        self.nb_edges += len(edges)
+        self.touched[source] = True
+        self.touched[target] = True
+        size = len(self.weighted_degree)
+        self.weighted_degree += np.bincount(source, weights=edges.weight, minlength=size)
+        self.weighted_degree += np.bincount(target, weights=edges.weight, minlength=size)
+        # union of the components of the edge ends, all edges at once
+        while len(source) > 0:
+            self._compress()
+            source_root = self.parent[source]
+            target_root = self.parent[target]
+            split = source_root != target_root
+            source, target = source[split], target[split]
+            np.minimum.at(self.parent, np.maximum(source_root[split], target_root[split]), np.minimum(source_root[split], target_root[split]))
+
+    def largest_component(self):
+        if not self.touched.any():
+            return 0
+        self._compress()
+        return int(np.bincount(self.parent[self.touched]).max())
+
+    def weighted_degrees(self):
+        # weighted degree of the nodes of the collected graph
+        return self.weighted_degree[self.touched]
+
+    def weighted_degree_histogram(self, bins=10):
+        return np.histogram(self.weighted_degrees(), bins=bins)
+
+    def add_hop(self, depth, nb_fetched, nb_reached, nb_new, nb_next):
+        # nb_reached: nb of distinct nodes reached by the edges of the hop, among which nb_new had not been collected yet
+        self.nb_nodes += nb_fetched
+        degrees = self.weighted_degrees()
+        hop = {
+            "depth": depth,
+            "nodes_fetched": nb_fetched,
+            "nodes": self.nb_nodes,
+            "edges": self.nb_edges,
+            "new_nodes": nb_new,
+            "new_node_yield": 100.0 * nb_new / nb_reached if nb_reached else 0.0,
+            "next_hop_nodes": nb_next,
+            "largest_component": self.largest_component(),
+            "mean_weighted_degree": float(degrees.mean()) if len(degrees) else 0.0,
+            "max_weighted_degree": float(degrees.max()) if len(degrees) else 0.0,
+        }
+        self.hops.append(hop)
+        return hop
+
+    def stop_reason(self, cfg):
+        # early stopping rules of the DataCollectionConfig, None if the exploration should go on
+        hop = self.hops[-1]
+        if cfg.min_new_node_yield is not None and hop["new_node_yield"] < cfg.min_new_node_yield:
+            return "new node yield {:.1f}% below {}%".format(hop["new_node_yield"], cfg.min_new_node_yield)
+        if cfg.max_edges is not None and hop["edges"] >= cfg.max_edges:
+            return "{} edges collected".format(hop["edges"])
+        if cfg.stop_condition is not None and cfg.stop_condition(self):
+            return "stop condition"
+        return None
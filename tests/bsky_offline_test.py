@@ -0,0 +1,271 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+from concurrent.futures import ThreadPoolExecutor
+from spikexplore import graph_explore
+from spikexplore.backends.bluesky import BlueskyNetwork, BlueskyCredentials, SkeetsGetter, Skeet, Profile
+from spikexplore.backends.bluesky_async import AsyncBlueskyNetwork
+from spikexplore.config import SamplingConfig, GraphConfig, DataCollectionConfig, BlueskyConfig
+from spikexplore.executors import SequentialExecutor
+from spikexplore.graph import process_hop
+from fake_bsky_client import FakeBlueskyClient, FakeAsyncBlueskyClient
+
+
+class PerNodeBlueskyNetwork(BlueskyNetwork):
+    def get_neighbors_batch(self, users, executor):
+        return None  # always fall back to the per-node protocol
+
+
+class PerNodeAsyncBlueskyNetwork(AsyncBlueskyNetwork):
+    def get_neighbors_batch(self, users, executor):
+        return None
+
+
+class BlueskyOfflineTest(unittest.TestCase):
+    def setUp(self):
+        self.credentials = BlueskyCredentials("handle", "password")
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.bluesky_config = BlueskyConfig(cache_path=os.path.join(self.tmp_dir.name, "cache.sqlite"))
+        graph_config = GraphConfig(min_degree=1, min_weight=1, community_detection=False, as_undirected=False)
+        data_collection_config = DataCollectionConfig(
+            exploration_depth=3, random_subset_mode="percent", random_subset_size=50, expansion_type="coreball", degree=2, seed=0
+        )
+        self.sampling_config = SamplingConfig(graph_config, data_collection_config)
+        self.initial_nodes = [FakeBlueskyClient.handle(0), FakeBlueskyClient.handle(10)]
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_sampling(self):
+        backend = BlueskyNetwork(self.credentials, self.bluesky_config, client=FakeBlueskyClient())
+        g_sub, nodes_info = graph_explore.explore(backend, self.initial_nodes, self.sampling_config)
+        self.assertGreater(g_sub.number_of_nodes(), 2)
+        self.assertGreater(g_sub.number_of_edges(), 2)
+        self.assertFalse(nodes_info.skeets_meta.empty)
+
+    def test_batch_same_as_per_node(self):
+        backend = BlueskyNetwork(self.credentials, BlueskyConfig(), client=FakeBlueskyClient())
+        g_batch, info_batch = graph_explore.explore(backend, self.initial_nodes, self.sampling_config)
+        backend = PerNodeBlueskyNetwork(self.credentials, BlueskyConfig(), client=FakeBlueskyClient())
+        g_node, info_node = graph_explore.explore(backend, self.initial_nodes, self.sampling_config)
+        # the fake skeets are created at the time of the request
+        nodes_data = [[(n, {k: v for k, v in d.items() if k != "created_at"}) for n, d in g.nodes(data=True)] for g in [g_batch, g_node]]
+        self.assertEqual(nodes_data[0], nodes_data[1])
+        self.assertEqual(list(g_batch.edges(data=True)), list(g_node.edges(data=True)))
+        self.assertEqual(info_batch.user_hashtags, info_node.user_hashtags)
+
+    def test_persistent_cache(self):
+        first_client = FakeBlueskyClient()
+        backend = BlueskyNetwork(self.credentials, self.bluesky_config, client=first_client)
+        g_first, _ = graph_explore.explore(backend, self.initial_nodes, self.sampling_config)
+        self.assertGreater(first_client.calls["get_author_feed"], 0)
+        self.assertGreater(backend.cache_stats()["skeets"]["misses"], 0)
+        self.assertEqual(backend.request_stats()["api_calls"], first_client.calls["get_author_feed"] + first_client.calls["get_profiles"])
+
+        # a new backend sharing the cache file does not hit the API again
+        second_client = FakeBlueskyClient()
+        backend = BlueskyNetwork(self.credentials, self.bluesky_config, client=second_client)
+        g_second, _ = graph_explore.explore(backend, self.initial_nodes, self.sampling_config)
+        self.assertEqual(sum(second_client.calls.values()), 0)
+        self.assertEqual(backend.request_stats()["api_calls"], 0)
+        self.assertEqual(backend.cache_stats()["skeets"]["misses"], 0)
+        self.assertEqual(sorted(g_first.edges()), sorted(g_second.edges()))
+
+    def test_cache_expiry(self):
+        self.bluesky_config.cache_ttl = -1  # everything is already expired
+        backend = BlueskyNetwork(self.credentials, self.bluesky_config, client=FakeBlueskyClient())
+        graph_explore.explore(backend, self.initial_nodes, self.sampling_config)
+        client = FakeBlueskyClient()
+        backend = BlueskyNetwork(self.credentials, self.bluesky_config, client=client)
+        graph_explore.explore(backend, self.initial_nodes, self.sampling_config)
+        self.assertGreater(client.calls["get_author_feed"], 0)
+
+
+class BlueskyProfilesBatchTest(unittest.TestCase):
+    def setUp(self):
+        self.credentials = BlueskyCredentials("handle", "password")
+
+    def test_batched_profiles(self):
+        client = FakeBlueskyClient()
+        backend = BlueskyNetwork(self.credentials, BlueskyConfig(), client=client)
+        cfg = SamplingConfig(GraphConfig(), DataCollectionConfig(exploration_depth=3, random_subset_size=50, seed=0))
+        graph_explore.explore(backend, [FakeBlueskyClient.handle(0)], cfg)
+        # authors and mentions of a feed are resolved with a single request
+        self.assertEqual(client.calls["get_profile"], 0)
+        self.assertGreater(client.calls["get_profiles"], 0)
+        self.assertLessEqual(client.calls["get_profiles"], client.calls["get_author_feed"])
+
+    def test_rate_limit_retry(self):
+        client = FakeBlueskyClient(rate_limited=3)
+        backend = BlueskyNetwork(self.credentials, BlueskyConfig(retry_backoff=0.001), client=client)
+        g_sub, _ = graph_explore.explore(backend, [FakeBlueskyClient.handle(0)], SamplingConfig(GraphConfig(), DataCollectionConfig(seed=0)))
+        self.assertEqual(client.calls["rate_limited"], 3)
+        self.assertEqual(backend.request_stats()["retries"], 3)
+        self.assertEqual(backend.request_stats()["request_failures"], 0)
+        self.assertGreater(g_sub.number_of_edges(), 2)
+
+    def test_concurrent_deduplication(self):
+        client = FakeBlueskyClient(latency=0.05)
+        getter = SkeetsGetter(self.credentials, BlueskyConfig(), client=client)
+        dids = [FakeBlueskyClient.did(i) for i in range(30)]
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            results = list(pool.map(getter.get_profiles, [dids] * 8))
+        self.assertEqual(client.calls["get_profiles"], 2)  # 30 dids need 2 requests of at most 25 actors
+        for profiles in results:
+            self.assertEqual([p.handle for p in profiles.values()], [FakeBlueskyClient.handle(i) for i in range(30)])
+
+    def test_bad_request_split(self):
+        client = FakeBlueskyClient(invalid_users=[3])
+        getter = SkeetsGetter(self.credentials, BlueskyConfig(), client=client)
+        dids = [FakeBlueskyClient.did(i) for i in range(8)]
+        profiles = getter.get_profiles(dids)
+        # only the invalid did is missing, the batch being split in two until it fails alone
+        self.assertIsNone(profiles[FakeBlueskyClient.did(3)])
+        self.assertEqual(
+            [p.handle for did, p in profiles.items() if did != FakeBlueskyClient.did(3)], [FakeBlueskyClient.handle(i) for i in range(8) if i != 3]
+        )
+        self.assertEqual(client.calls["get_profiles"], 7)  # 8, 4, 2, 1 + 1 failing and 4, 2 succeeding
+        self.assertEqual(getter.get_profiles(dids), profiles)
+        self.assertEqual(client.calls["get_profiles"], 7)
+
+    def test_evicted_profiles(self):
+        # the fetched profiles are returned even if the cache cannot hold them
+        client = FakeBlueskyClient()
+        getter = SkeetsGetter(self.credentials, BlueskyConfig(cache_max_entries=2), client=client)
+        dids = [FakeBlueskyClient.did(i) for i in range(10)]
+        self.assertEqual([p.handle for p in getter.get_profiles(dids).values()], [FakeBlueskyClient.handle(i) for i in range(10)])
+
+
+class BlueskyExtractionTest(unittest.TestCase):
+    def setUp(self):
+        self.backend = BlueskyNetwork(BlueskyCredentials("handle", "password"), BlueskyConfig(nb_popular_skeets=1), client=FakeBlueskyClient())
+
+    @staticmethod
+    def skeet(user, mentions, hashtags, repost_count):
+        return {
+            "user_did": "did:" + user,
+            "user": user,
+            "mentions": mentions,
+            "reply_to": [],
+            "hashtags": hashtags,
+            "links": [],
+            "repost_count": repost_count,
+            "account_creation": None,
+        }
+
+    def test_hop_extraction(self):
+        feeds = [
+            (
+                "a",
+                {"c1": "s1", "c2": "s2", "c3": "s3"},
+                {"c1": self.skeet("a", ["b", "c"], ["x", "y"], 1), "c2": self.skeet("a", ["b"], ["x"], 5), "c3": self.skeet("c", ["d"], [], 0)},
+            ),
+            ("b", {"c4": "s4"}, {"c4": self.skeet("b", ["a"], [], 2)}),
+            ("e", {}, {}),
+        ]
+        profiles = {"did:" + u: Profile("did:" + u, u, 10, 1, 5, None if u == "a" else "bio") for u in "abc"}
+        node_info, edges_df = self.backend.neighbors_from_feeds(feeds, profiles)
+        # c is not a neighbor of a by mention since it posted in a's feed, but by repost
+        edges = {(s, t): (cid, w) for s, t, cid, w in edges_df[["source", "target", "cid", "weight"]].itertuples(index=False)}
+        self.assertEqual(edges, {("a", "b"): (["c1", "c2"], 2), ("c", "d"): (["c3"], 1), ("a", "c"): (["c3"], 1), ("b", "a"): (["c4"], 1)})
+        # same edges as user by user
+        for feed in feeds[:2]:
+            _, user_edges = self.backend.neighbors_from_feeds([feed], profiles)
+            self.assertEqual(len(edges_df[edges_df["cid"].apply(lambda c: c[0] in feed[1])]), len(user_edges))
+        self.assertEqual(node_info.user_hashtags, {"a": {"x": 2, "y": 1}, "b": {}})
+        self.assertEqual(sorted(node_info.user_skeets), ["c2", "c4"])
+        self.assertEqual(list(node_info.skeets_meta.index), ["c2", "c4"])
+        # profile fields are joined by did, after the account creation date
+        self.assertEqual(sorted(node_info.user_profiles), ["did:a", "did:b"])
+        columns = node_info.skeets_meta.columns.tolist()
+        self.assertEqual(
+            columns[columns.index("account_creation") + 1 :], ["account_followers", "account_following", "account_statuses", "account_description"]
+        )
+        self.assertEqual(node_info.skeets_meta["account_description"].isna().tolist(), [True, False])
+
+    def test_compact_records(self):
+        getter = SkeetsGetter(BlueskyCredentials("handle", "password"), BlueskyConfig(), client=FakeBlueskyClient())
+        skeets = getter.get_skeets(FakeBlueskyClient.handle(3))
+        skeet = skeets["cid-3-0"]
+        self.assertIsInstance(skeet, Skeet)
+        self.assertIsNone(skeet.post)
+        self.assertEqual(skeet.author_handle, FakeBlueskyClient.handle(3))
+        self.assertEqual(skeet.mentions, [FakeBlueskyClient.did(i) for i in [4, 5, 6]])
+        self.assertEqual(skeet.hashtags, ["tag0"])
+        self.assertIsInstance(getter.profiles_cache.get(FakeBlueskyClient.did(4)), Profile)
+        getter = SkeetsGetter(BlueskyCredentials("handle", "password"), BlueskyConfig(keep_raw_skeets=True), client=FakeBlueskyClient())
+        self.assertEqual(getter.get_skeets(FakeBlueskyClient.handle(3))["cid-3-0"].post.cid, "cid-3-0")
+
+
+class AsyncBlueskyTest(unittest.TestCase):
+    def setUp(self):
+        self.credentials = BlueskyCredentials("handle", "password")
+        self.config = BlueskyConfig(max_in_flight=4, retry_backoff=0.001)
+        self.sampling_config = SamplingConfig(
+            GraphConfig(as_undirected=False), DataCollectionConfig(exploration_depth=3, random_subset_size=50, seed=0, max_in_flight=16)
+        )
+        self.initial_nodes = [FakeBlueskyClient.handle(0), FakeBlueskyClient.handle(10)]
+
+    def test_same_sample_as_sync(self):
+        sync_backend = BlueskyNetwork(self.credentials, self.config, client=FakeBlueskyClient())
+        g_sync, info_sync = graph_explore.explore(sync_backend, self.initial_nodes, self.sampling_config)
+        client = FakeAsyncBlueskyClient(latency=0.01)
+        async_backend = AsyncBlueskyNetwork(self.credentials, self.config, client=client)
+        g_async, info_async = graph_explore.explore(async_backend, self.initial_nodes, self.sampling_config)
+        self.assertEqual(sorted(g_sync.edges()), sorted(g_async.edges()))
+        self.assertEqual(sorted(info_sync.skeets_meta.index), sorted(info_async.skeets_meta.index))
+        self.assertLessEqual(client.max_in_flight, self.config.max_in_flight)
+        self.assertGreater(client.max_in_flight, 1)
+
+    def test_bounded_cache(self):
+        # the profiles evicted from a small cache are still resolved, the sample is the same as with an unbounded cache
+        samples = []
+        for config, backend_class, client_class in [
+            (self.config, BlueskyNetwork, FakeBlueskyClient),
+            (BlueskyConfig(max_in_flight=4, cache_max_entries=5), BlueskyNetwork, FakeBlueskyClient),
+            (BlueskyConfig(max_in_flight=4, cache_max_entries=5), AsyncBlueskyNetwork, FakeAsyncBlueskyClient),
+        ]:
+            g_sub, _ = graph_explore.explore(backend_class(self.credentials, config, client=client_class()), self.initial_nodes, self.sampling_config)
+            samples.append((sorted(g_sub.nodes()), sorted(g_sub.edges())))
+        self.assertGreater(len(samples[0][1]), 2)
+        self.assertEqual(samples[1], samples[0])
+        self.assertEqual(samples[2], samples[0])
+
+    def test_rate_limit_retry(self):
+        client = FakeAsyncBlueskyClient(rate_limited=3)
+        backend = AsyncBlueskyNetwork(self.credentials, self.config, client=client)
+        g_sub, _ = graph_explore.explore(backend, self.initial_nodes, self.sampling_config)
+        self.assertEqual(client.calls["rate_limited"], 3)
+        self.assertGreater(g_sub.number_of_edges(), 2)
+        # a second exploration runs on a new event loop, the session is reused
+        graph_explore.explore(backend, [FakeBlueskyClient.handle(20)], self.sampling_config)
+        self.assertEqual(client.calls["login"], 2)
+        self.assertFalse(client.request.closed)  # the client given to the backend is not closed
+
+    def test_process_hop_without_executor(self):
+        # the hop is run on an event loop of its own
+        users = [FakeBlueskyClient.handle(0), FakeBlueskyClient.handle(10)]
+        sync_backend = BlueskyNetwork(self.credentials, self.config, client=FakeBlueskyClient())
+        expected = process_hop(sync_backend, users, sync_backend.create_node_info())
+        for backend_class in [AsyncBlueskyNetwork, PerNodeAsyncBlueskyNetwork]:
+            backend = backend_class(self.credentials, self.config, client=FakeAsyncBlueskyClient())
+            new_nodes, edges_df, nodes_df, _ = process_hop(backend, users, backend.create_node_info())
+            self.assertEqual(new_nodes, expected[0])
+            self.assertEqual(sorted(zip(edges_df["source"], edges_df["target"])), sorted(zip(expected[1]["source"], expected[1]["target"])))
+            self.assertEqual(sorted(nodes_df.index), sorted(expected[2].index))
+            self.assertRaises(ValueError, process_hop, backend, users, backend.create_node_info(), SequentialExecutor())
+
+    def test_client_closed_on_new_loop(self):
+        clients = []
+
+        def new_client():
+            clients.append(FakeAsyncBlueskyClient())
+            return clients[-1]
+
+        with mock.patch("spikexplore.backends.bluesky_async.AsyncClient", new_client):
+            backend = AsyncBlueskyNetwork(self.credentials, self.config)
+            graph_explore.explore(backend, self.initial_nodes, self.sampling_config)
+            graph_explore.explore(backend, self.initial_nodes, self.sampling_config)
+        self.assertEqual([c.request.closed for c in clients], [True, False])
+        self.assertEqual([c.calls["login"] for c in clients], [1, 1])
@@ -0,0 +1,71 @@
+import os
+import tempfile
+import unittest
+from spikexplore.cache import MemoryCache, SQLiteCache, TieredCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class CacheTest(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp_dir.name, "cache.sqlite")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_memory_lru(self):
+        cache = MemoryCache(max_entries=2, clock=self.clock)
+        cache["a"] = 1
+        cache["b"] = 2
+        self.assertEqual(cache.get("a"), 1)  # a is now the most recently used
+        cache["c"] = 3
+        self.assertNotIn("b", cache)
+        self.assertEqual(cache["a"], 1)
+        self.assertEqual(cache.stats()["evictions"], 1)
+        self.assertEqual(len(cache), 2)
+
+    def test_ttl(self):
+        cache = MemoryCache(ttl=10, clock=self.clock)
+        cache["a"] = None  # None values are valid entries
+        self.assertIn("a", cache)
+        self.assertIsNone(cache["a"])
+        self.clock.now = 11
+        self.assertNotIn("a", cache)
+        self.assertRaises(KeyError, cache.__getitem__, "a")
+        # membership checks are not counted
+        self.assertEqual(cache.stats()["hits"], 1)
+        self.assertEqual(cache.stats()["misses"], 1)
+
+    def test_persistent(self):
+        cache = SQLiteCache(self.path, table="profiles", ttl=10, clock=self.clock)
+        cache["a"] = {"x": [1, 2]}
+        cache.close()
+        cache = SQLiteCache(self.path, table="profiles", ttl=10, clock=self.clock)
+        self.assertEqual(cache["a"], {"x": [1, 2]})
+        self.assertNotIn("a", SQLiteCache(self.path, table="skeets", clock=self.clock))
+        self.clock.now = 11
+        self.assertNotIn("a", cache)
+        self.assertEqual(len(cache), 0)
+
+    def test_tiered(self):
+        persistent = SQLiteCache(self.path, ttl=10, clock=self.clock)
+        persistent.set("a", 1, timestamp=-5)
+        cache = TieredCache(MemoryCache(max_entries=1, ttl=10, clock=self.clock), persistent)
+        self.assertEqual(cache["a"], 1)
+        self.assertEqual(cache.memory.get_entry("a")[0], -5)  # promoted with its original age
+        cache["b"] = 2
+        self.assertNotIn("a", cache.memory)
+        self.assertEqual(cache["a"], 1)
+        self.clock.now = 6
+        self.assertNotIn("a", cache)
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual(cache.stats()["hits"], 2)
+        self.assertEqual(cache.stats()["misses"], 1)
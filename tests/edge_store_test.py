@@ -0,0 +1,46 @@
+import unittest
+import numpy as np
+import pandas as pd
+from spikexplore.edge_store import NodeIndex, EdgeStore
+
+
+class EdgeStoreTest(unittest.TestCase):
+    def setUp(self):
+        self.node_index = NodeIndex()
+        self.edges_df = pd.DataFrame(
+            {
+                "source": ["a", "a", "b", "a"],
+                "target": ["b", "c", "c", "b"],
+                "cid": [["1"], ["2"], ["3"], ["4"]],
+                "weight": [1, 2, 3, 4],
+            }
+        )
+
+    def test_node_index(self):
+        codes = self.node_index.encode(["x", "y", "x", 3])
+        self.assertEqual(codes.dtype, np.int32)
+        self.assertEqual(codes.tolist(), [0, 1, 0, 2])
+        self.assertEqual(self.node_index.decode(codes).tolist(), ["x", "y", "x", 3])
+        self.node_index.mark_visited(self.node_index.encode(["y"]))
+        self.assertEqual(self.node_index.is_visited(codes).tolist(), [False, True, False, False])
+
+    def test_roundtrip(self):
+        edges = EdgeStore.from_frame(self.edges_df, self.node_index)
+        self.assertEqual(len(edges), 4)
+        pd.testing.assert_frame_equal(edges.to_frame(self.node_index), self.edges_df)
+
+    def test_aggregate(self):
+        edges = EdgeStore.from_frame(self.edges_df, self.node_index)
+        expected = self.edges_df.groupby(["source", "target"]).sum().reset_index()
+        pd.testing.assert_frame_equal(edges.aggregate().to_frame(self.node_index), expected)
+        weights_only = EdgeStore.from_frame(self.edges_df.drop(columns=["cid"]), self.node_index)
+        pd.testing.assert_frame_equal(weights_only.aggregate().to_frame(self.node_index), expected.drop(columns=["cid"]))
+
+    def test_take_concat(self):
+        edges = EdgeStore.from_frame(self.edges_df, self.node_index)
+        mask = edges.target == self.node_index.encode(["b"])[0]
+        edges_b, edges_c = edges.take(mask), edges.take(~mask)
+        self.assertEqual(edges_b.weight.tolist(), [1, 4])
+        merged = EdgeStore.concat([edges_b, EdgeStore(), edges_c])
+        self.assertEqual(len(merged), 4)
+        self.assertEqual(merged.attrs["cid"].tolist(), [["1"], ["4"], ["2"], ["3"]])
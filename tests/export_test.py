@@ -0,0 +1,85 @@
+import os
+import tempfile
+import unittest
+import networkx as nx
+import pandas as pd
+from spikexplore.export import write_gexf, write_graphml, write_edgelist
+from spikexplore.graph import save_graph
+
+
+class ExportTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.nodes_df = pd.DataFrame(
+            {"name": ['A <&> "a"', "B", "C"], "followers": [10, 20, 30], "score": [0.5, None, 1.5], "verified": [True, False, True]},
+            index=pd.Index(["a", "b", "c"]),
+        )
+        self.edges_df = pd.DataFrame(
+            {"source": ["a", "b", "c", "a"], "target": ["b", "c", "a", "d"], "cid": [["x", "y"], ["z"], [], ["w"]], "weight": [2, 1, 1, 3]}
+        )
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def check_graph(self, g):
+        self.assertEqual(set(g.nodes()), {"a", "b", "c", "d"})
+        self.assertEqual(g.number_of_edges(), 4)
+        self.assertEqual(g.nodes["a"]["name"], 'A <&> "a"')
+        self.assertEqual(g.nodes["c"]["followers"], 30)
+        self.assertTrue(g.nodes["c"]["verified"])
+        self.assertNotIn("score", g.nodes["b"])
+        self.assertEqual(g.edges["a", "b"]["weight"], 2.0)
+        self.assertEqual(g.edges["a", "b"]["cid"], '["x", "y"]')
+
+    def test_gexf(self):
+        filename = os.path.join(self.tmp_dir.name, "graph.gexf")
+        write_gexf(self.nodes_df, self.edges_df, filename, chunk_size=2)
+        self.check_graph(nx.read_gexf(filename))
+
+    def test_graphml(self):
+        filename = os.path.join(self.tmp_dir.name, "graph.graphml")
+        write_graphml(self.nodes_df, self.edges_df, filename, chunk_size=2)
+        self.check_graph(nx.read_graphml(filename))
+
+    def test_edgelist(self):
+        write_edgelist(self.nodes_df, self.edges_df, self.tmp_dir.name, chunk_size=3)
+        nodes_df = pd.read_csv(os.path.join(self.tmp_dir.name, "nodes.csv"))
+        edges_df = pd.read_csv(os.path.join(self.tmp_dir.name, "edges.csv"))
+        self.assertEqual(nodes_df["node"].tolist(), ["a", "b", "c", "d"])
+        self.assertEqual(edges_df["source"].tolist(), [0, 1, 2, 0])
+        self.assertEqual(edges_df["target"].tolist(), [1, 2, 0, 3])
+        self.assertEqual(edges_df["cid"].tolist(), ['["x", "y"]', '["z"]', "[]", '["w"]'])
+
+    def test_save_graph(self):
+        g = nx.barabasi_albert_graph(200, 3, seed=0)
+        nx.set_node_attributes(g, {n: "node {}".format(n) for n in g}, name="name")
+        nx.set_edge_attributes(g, 1.0, name="weight")
+        for filename in ["graph.gexf", "graph.graphml"]:
+            filename = os.path.join(self.tmp_dir.name, filename)
+            save_graph(g, filename, chunk_size=64)
+            g_read = nx.relabel_nodes(nx.read_gexf(filename) if filename.endswith(".gexf") else nx.read_graphml(filename), int)
+            self.assertFalse(g_read.is_directed())
+            self.assertEqual(set(g_read.nodes()), set(g.nodes()))
+            self.assertEqual({frozenset(e) for e in g_read.edges()}, {frozenset(e) for e in g.edges()})
+            self.assertEqual(g_read.nodes[5]["name"], "node 5")
+
+    def test_same_as_networkx(self):
+        # attributes missing on some nodes or edges and whitespace in strings are read back as from the networkx writers
+        g = nx.DiGraph()
+        g.add_node("a", followers=3, verified=True, bio="line 1\r\nline\t2")
+        g.add_node("b", followers=2**60)
+        g.add_node("c", bio=" ")
+        g.add_edge("a", "b", weight=2.0, count=1)
+        g.add_edge("b", "c", weight=1.0)
+        for extension, read in [("gexf", nx.read_gexf), ("graphml", nx.read_graphml)]:
+            expected = os.path.join(self.tmp_dir.name, "nx." + extension)
+            filename = os.path.join(self.tmp_dir.name, "graph." + extension)
+            getattr(nx, "write_" + extension)(g, expected)
+            save_graph(g, filename)
+            g_expected, g_read = read(expected), read(filename)
+            self.assertEqual(g_read.nodes["a"]["bio"], "line 1\r\nline\t2")
+            if extension == "graphml":  # networkx does not escape the carriage returns in the graphml text
+                g_expected.nodes["a"]["bio"] = g_read.nodes["a"]["bio"]
+            self.assertEqual(dict(g_read.nodes(data=True)), dict(g_expected.nodes(data=True)))
+            self.assertEqual(g_read.nodes["b"]["followers"], 2**60)
+            self.assertEqual(sorted(g_read.edges(data="count")), sorted(g_expected.edges(data="count")))
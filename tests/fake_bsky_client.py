@@ -0,0 +1,162 @@
+import asyncio
+import time
+import threading
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from atproto import models
+from atproto_client.exceptions import BadRequestError, RequestException
+from atproto_client.models.common import XrpcError
+from atproto_client.request import Response
+
+
+class FakeBlueskyClient:
+    """Offline stand-in for atproto.Client serving a small deterministic network.
+    User i mentions users i+1..i+nb_mentions and reposts user i-1. Calls are counted per method,
+    the first rate_limited requests fail with a 429 error, profile requests including one of the invalid_users fail with a 400 error"""
+
+    def __init__(self, nb_users=50, nb_mentions=3, skeets_per_user=5, latency=0.0, rate_limited=0, invalid_users=()):
+        self.nb_users = nb_users
+        self.nb_mentions = nb_mentions
+        self.skeets_per_user = skeets_per_user
+        self.latency = latency
+        self.rate_limited = rate_limited
+        self.invalid_users = set(invalid_users)
+        self.calls = Counter()
+        self.lock = threading.Lock()
+        self.now = datetime.now(timezone.utc)
+
+    def _count(self, name):
+        # called with the lock held
+        self.calls[name] += 1
+        if self.rate_limited > 0:
+            self.rate_limited -= 1
+            self.calls["rate_limited"] += 1
+            raise RequestException(Response(success=False, status_code=429, content=None, headers={"retry-after": "0"}))
+
+    def _call(self, name):
+        with self.lock:
+            self._count(name)
+        if self.latency:
+            time.sleep(self.latency)
+
+    @staticmethod
+    def handle(i):
+        return "user{}.test".format(i)
+
+    @staticmethod
+    def did(i):
+        return "did:plc:user{}".format(i)
+
+    def _user_id(self, actor):
+        return int(actor.split("user")[1].split(".")[0])
+
+    def _author(self, i):
+        return models.AppBskyActorDefs.ProfileViewBasic(
+            did=self.did(i), handle=self.handle(i), display_name="User {}".format(i), created_at="2024-01-01T00:00:00Z"
+        )
+
+    def _post(self, i, k, mentions):
+        facets = [
+            models.AppBskyRichtextFacet.Main(
+                index=models.AppBskyRichtextFacet.ByteSlice(byte_start=0, byte_end=1), features=[models.AppBskyRichtextFacet.Mention(did=self.did(m))]
+            )
+            for m in mentions
+        ]
+        facets.append(
+            models.AppBskyRichtextFacet.Main(
+                index=models.AppBskyRichtextFacet.ByteSlice(byte_start=0, byte_end=1),
+                features=[models.AppBskyRichtextFacet.Tag(tag="tag{}".format(k))],
+            )
+        )
+        created_at = (self.now - timedelta(hours=k + 1)).isoformat().replace("+00:00", "Z")
+        record = models.AppBskyFeedPost.Record(created_at=created_at, text="post {} of user {}".format(k, i), facets=facets)
+        return models.AppBskyFeedDefs.PostView(
+            author=self._author(i),
+            cid="cid-{}-{}".format(i, k),
+            indexed_at=created_at,
+            record=record,
+            uri="at://{}/app.bsky.feed.post/{}".format(self.did(i), k),
+            like_count=k,
+            repost_count=k,
+        )
+
+    def login(self, handle, password):
+        return
+
+    def get_author_feed(self, actor, limit=None):
+        self._call("get_author_feed")
+        return self._feed(actor, limit)
+
+    def _feed(self, actor, limit):
+        i = self._user_id(actor)
+        mentions = [(i + j) % self.nb_users for j in range(1, self.nb_mentions + 1)]
+        posts = [self._post(i, k, mentions) for k in range(self.skeets_per_user)]
+        posts.append(self._post((i - 1) % self.nb_users, self.skeets_per_user, []))  # repost
+        feed = [models.AppBskyFeedDefs.FeedViewPost(post=p) for p in posts[:limit]]
+        return models.AppBskyFeedGetAuthorFeed.Response(feed=feed)
+
+    def _profile(self, i):
+        return models.AppBskyActorDefs.ProfileViewDetailed(
+            did=self.did(i), handle=self.handle(i), followers_count=10 * i, follows_count=i, posts_count=100, description="user {}".format(i)
+        )
+
+    def _profiles(self, actors):
+        ids = [self._user_id(a) for a in actors]
+        if self.invalid_users.intersection(ids):
+            raise BadRequestError(
+                Response(success=False, status_code=400, content=XrpcError(error="InvalidRequest", message="invalid actor"), headers={})
+            )
+        return models.AppBskyActorGetProfiles.Response(profiles=[self._profile(i) for i in ids])
+
+    def get_profile(self, actor):
+        self._call("get_profile")
+        return self._profile(self._user_id(actor))
+
+    def get_profiles(self, actors):
+        self._call("get_profiles")
+        return self._profiles(actors)
+
+
+class FakeAsyncRequest:
+    def __init__(self):
+        self.closed = False
+
+    async def close(self):
+        self.closed = True
+
+
+class FakeAsyncBlueskyClient(FakeBlueskyClient):
+    """Offline stand-in for atproto.AsyncClient"""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.request = FakeAsyncRequest()
+
+    async def _acall(self, name):
+        with self.lock:
+            self._count(name)
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(self.latency)
+        with self.lock:
+            self.in_flight -= 1
+
+    async def login(self, login=None, password=None, session_string=None):
+        self.calls["login"] += 1
+
+    def export_session_string(self):
+        return "session"
+
+    async def get_author_feed(self, actor, limit=None):
+        await self._acall("get_author_feed")
+        return self._feed(actor, limit)
+
+    async def get_profile(self, actor):
+        await self._acall("get_profile")
+        return self._profile(self._user_id(actor))
+
+    async def get_profiles(self, actors):
+        await self._acall("get_profiles")
+        return self._profiles(actors)
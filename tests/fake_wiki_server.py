@@ -0,0 +1,86 @@
+import json
+import random
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+
+class FakeWikiServer:
+    """Local MediaWiki API stub serving prop=links queries on a synthetic wiki.
+    Page i links to nb_links random pages (seeded by i) and to a help page, "Redirect i" redirects to page i
+    and at most links_per_response links are returned per response, the rest being paginated with plcontinue.
+    The first requests fail with the http status codes given in errors"""
+
+    def __init__(self, nb_pages=200, nb_links=5, links_per_response=100, errors=None):
+        self.nb_pages = nb_pages
+        self.nb_links = nb_links
+        self.links_per_response = links_per_response
+        self.requests = []  # titles of each query
+        self.errors = list(errors) if errors else []
+        self.lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                with server.lock:
+                    error = server.errors.pop(0) if server.errors else None
+                if error is not None:
+                    self.send_response(error)
+                    self.send_header("Retry-After", "0")
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                params = {k: v[0] for k, v in parse_qs(urlparse(self.path).query).items()}
+                body = json.dumps(server.query(params)).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                return
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = "http://127.0.0.1:{}/w/api.php".format(self.httpd.server_address[1])
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    @staticmethod
+    def title(i):
+        return "Page {}".format(i)
+
+    def links(self, title):
+        if not title.startswith("Page "):
+            return None
+        i = int(title.split(" ")[1])
+        if i >= self.nb_pages:
+            return None
+        targets = random.Random(i).sample([j for j in range(self.nb_pages) if j != i], self.nb_links)
+        return [{"ns": 0, "title": self.title(j)} for j in targets] + [{"ns": 12, "title": "Help:Contents"}]
+
+    def query(self, params):
+        titles = params["titles"].split("|")
+        self.requests.append(titles)
+        normalized = [{"from": t, "to": t[0].upper() + t[1:]} for t in titles if t[0].islower()]
+        titles = [t[0].upper() + t[1:] for t in titles]
+        redirects = [{"from": t, "to": "Page " + t.split(" ")[1]} for t in titles if t.startswith("Redirect ")]
+        titles = [("Page " + t.split(" ")[1]) if t.startswith("Redirect ") else t for t in titles]
+
+        all_links = [(t, link) for t in titles for link in (self.links(t) or [])]
+        offset = int(params.get("plcontinue", 0))
+        end = offset + self.links_per_response
+        pages = {t: {"ns": 0, "title": t} if self.links(t) is not None else {"ns": 0, "title": t, "missing": True} for t in titles}
+        for t, link in all_links[offset:end]:
+            pages[t].setdefault("links", []).append(link)
+        data = {"batchcomplete": end >= len(all_links), "query": {"normalized": normalized, "redirects": redirects, "pages": list(pages.values())}}
+        if end < len(all_links):
+            data["continue"] = {"plcontinue": str(end), "continue": "||"}
+        return data
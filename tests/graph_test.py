@@ -0,0 +1,33 @@
+import unittest
+import networkx as nx
+import pandas as pd
+from spikexplore.graph import add_edges_attributes, add_node_attributes, convert_to_json
+
+
+class GraphAttributesTest(unittest.TestCase):
+    def setUp(self):
+        self.edges_df = pd.DataFrame({"source": ["a", "b", "c"], "target": ["b", "c", "a"], "weight": [1.0, 2.0, 3.0], "cid": [["x"], ["y"], ["z"]]})
+        self.nodes_df = pd.DataFrame({"tags": [["t1"], [], None], "hop": [0, 1, 1]}, index=["a", "b", "d"])
+
+    def test_add_edges_attributes(self):
+        g = nx.DiGraph([("a", "b"), ("b", "c")])
+        columns = list(self.edges_df.columns)
+        g = add_edges_attributes(g, self.edges_df, drop_cols=["cid"])
+        self.assertEqual(list(self.edges_df.columns), columns)
+        self.assertEqual(g.edges["b", "c"], {"weight": 2.0})
+        self.assertFalse(g.has_edge("c", "a"))
+
+    def test_add_node_attributes(self):
+        g = nx.DiGraph([("a", "b"), ("b", "c")])
+        g = add_node_attributes(g, self.nodes_df, attr_dic={"c": 5}, attr_name="extra")
+        self.assertEqual(g.nodes["a"], {"tags": '["t1"]', "hop": 0})
+        self.assertEqual(g.nodes["b"], {"tags": "[]", "hop": 1})
+        self.assertEqual(g.nodes["c"], {"extra": 5})
+        self.assertNotIn("d", g)
+
+    def test_convert_to_json(self):
+        df = pd.DataFrame({"mixed": [None, ["a"], {"k": 1}], "name": ["x", "y", "z"]})
+        converted = convert_to_json(df)
+        self.assertEqual(converted["mixed"].tolist(), [None, '["a"]', '{"k": 1}'])
+        self.assertEqual(converted["name"].tolist(), ["x", "y", "z"])
+        self.assertIsInstance(df["mixed"].iloc[1], list)
@@ -0,0 +1,65 @@
+import unittest
+import io
+import json
+import networkx as nx
+from spikexplore import graph_explore
+from spikexplore.instrumentation import Instrumentation, jsonl_writer
+from spikexplore.backends.synthetic import SyntheticNetwork
+from spikexplore.config import SamplingConfig, GraphConfig, DataCollectionConfig, SyntheticConfig
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        self.now += 1.0  # each reading takes one second
+        return self.now
+
+
+class InstrumentationTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.G = nx.barabasi_albert_graph(2000, 3, seed=42)
+        cls.sampling_backend = SyntheticNetwork(cls.G, SyntheticConfig())
+        graph_config = GraphConfig(min_degree=1, min_weight=1, community_detection=True)
+        data_collection_config = DataCollectionConfig(
+            exploration_depth=3, random_subset_mode="percent", random_subset_size=20, expansion_type="coreball", degree=2, seed=0
+        )
+        cls.sampling_config = SamplingConfig(graph_config, data_collection_config)
+
+    def test_events(self):
+        events = []
+        instrumentation = Instrumentation(callback=events.append)
+        graph_explore.explore(self.sampling_backend, [1, 2], self.sampling_config, instrumentation=instrumentation)
+        hops = [e for e in events if e["event"] == "hop"]
+        self.assertEqual([e["depth"] for e in hops], [0, 1, 2])
+        for stage in ["fetch", "filter", "fetch_wall", "aggregate", "probability", "sampling"]:
+            self.assertIn(stage, hops[-1]["timings"])
+        self.assertEqual(hops[0]["counters"]["nodes_fetched"], 2)
+        stages = [e["stage"] for e in events if e["event"] == "stage"]
+        self.assertEqual(stages, ["aggregate", "graph_build", "attributes", "graph_build", "communities"])
+        self.assertEqual(events[-1]["event"], "summary")
+        self.assertEqual(events[-1]["counters"]["edges_in"], sum(e["counters"]["edges_in"] for e in hops))
+        self.assertEqual(events[-1]["counters"]["nodes_fetched"], sum(e["counters"]["nodes_fetched"] for e in hops))
+
+    def test_timers(self):
+        instrumentation = Instrumentation(clock=FakeClock())
+        instrumentation.start_hop(0)
+        with instrumentation.timer("fetch"):
+            pass
+        with instrumentation.timer("fetch"):
+            pass
+        instrumentation.count("api_calls", 3)
+        hop = instrumentation.end_hop()
+        self.assertEqual(hop, {"depth": 0, "timings": {"fetch": 2.0}, "counters": {"api_calls": 3}})
+        with instrumentation.timer("communities"):
+            pass
+        self.assertEqual(instrumentation.summary(), {"timings": {"fetch": 2.0, "communities": 1.0}, "counters": {"api_calls": 3}})
+
+    def test_jsonl_writer(self):
+        f = io.StringIO()
+        instrumentation = Instrumentation(callback=jsonl_writer(f), clock=FakeClock())
+        with instrumentation.timer("graph_build"):
+            pass
+        self.assertEqual(json.loads(f.getvalue()), {"event": "stage", "stage": "graph_build", "seconds": 1.0})
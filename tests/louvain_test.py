@@ -0,0 +1,47 @@
+import unittest
+import networkx as nx
+import numpy as np
+from spikexplore.graph import detect_communities, remove_small_communities
+from spikexplore.louvain import louvain_communities, modularity
+
+
+def nx_modularity(G, labels):
+    nodes = np.array(list(G.nodes()))
+    return nx.community.modularity(G, [set(nodes[labels == c]) for c in range(labels.max() + 1)])
+
+
+class LouvainTest(unittest.TestCase):
+    def test_planted_partition(self):
+        G = nx.planted_partition_graph(10, 50, 0.3, 0.005, seed=0)
+        labels = louvain_communities(nx.to_scipy_sparse_array(G), seed=0)
+        self.assertEqual(labels.max() + 1, 10)
+        for block in range(10):
+            self.assertEqual(len(set(labels[block * 50 : (block + 1) * 50])), 1)
+
+    def test_modularity(self):
+        for G in [nx.karate_club_graph(), nx.les_miserables_graph(), nx.barabasi_albert_graph(2000, 3, seed=0)]:
+            A = nx.to_scipy_sparse_array(G, weight="weight")
+            labels = louvain_communities(A, seed=0)
+            q = nx_modularity(G, labels)
+            self.assertAlmostEqual(modularity(A, labels), q)
+            q_ref = nx.community.modularity(G, nx.community.louvain_communities(G, weight="weight", seed=0))
+            self.assertGreater(q, q_ref - 0.02)
+
+    def test_seed(self):
+        A = nx.to_scipy_sparse_array(nx.barabasi_albert_graph(2000, 3, seed=0))
+        np.testing.assert_array_equal(louvain_communities(A, seed=1), louvain_communities(A, seed=1))
+        labels = louvain_communities(A, seed=2)
+        self.assertEqual(labels[0], 0)  # labels are numbered in the order of the nodes
+        self.assertTrue(np.all(np.diff(np.maximum.accumulate(labels)) <= 1))
+
+    def test_no_edges(self):
+        G = nx.empty_graph(5)
+        np.testing.assert_array_equal(louvain_communities(nx.to_scipy_sparse_array(G)), np.arange(5))
+
+    def test_remove_small_communities(self):
+        G = nx.disjoint_union(nx.complete_graph(10), nx.complete_graph(3)).to_directed()
+        G, community_dic = detect_communities(G, seed=0)
+        self.assertEqual(len(community_dic), 2)
+        self.assertEqual(G.nodes[12]["community"], 1)
+        G = remove_small_communities(G, community_dic, 3)
+        self.assertEqual(sorted(G.nodes()), list(range(10)))
@@ -0,0 +1,42 @@
+import unittest
+import pandas as pd
+from spikexplore.NodeInfo import FrameAccumulator
+from spikexplore.backends.bluesky import BlueskyNetwork
+
+
+def meta(cids, user):
+    return pd.DataFrame({"user": user, "repost_count": range(len(cids))}, index=cids)
+
+
+class FrameAccumulatorTest(unittest.TestCase):
+    def test_same_as_concat(self):
+        chunks = [meta(["a", "b"], "u1"), pd.DataFrame(), meta(["c", "a", "d", "c"], "u2"), meta(["e", "b"], "u3")]
+        acc = FrameAccumulator()
+        expected = pd.DataFrame()
+        for chunk in chunks:
+            acc.append(chunk)
+            expected = pd.concat([expected, chunk]) if not expected.empty else chunk
+            expected = expected[~expected.index.duplicated(keep="first")]
+            pd.testing.assert_frame_equal(acc.frame(), expected)
+        self.assertEqual(len(acc.chunks), 1)  # consolidated when read
+
+    def test_empty(self):
+        self.assertTrue(FrameAccumulator().frame().empty)
+        self.assertTrue(FrameAccumulator(pd.DataFrame()).frame().empty)
+
+
+class BlueskyNodeInfoTest(unittest.TestCase):
+    def test_update(self):
+        node_info = BlueskyNetwork.BlueskyNodeInfo()
+        for user, cids in [("u1", ["a", "b"]), ("u2", ["b", "c"])]:
+            new_info = BlueskyNetwork.BlueskyNodeInfo(
+                user_hashtags={user: {"tag": 1}},
+                user_skeets={cid: None for cid in cids},
+                user_links={user: {"link": 2}},
+                skeets_meta=meta(cids, user),
+            )
+            node_info.update(new_info)
+        self.assertEqual(node_info.get_nodes().index.tolist(), ["a", "b", "c"])
+        self.assertEqual(node_info.get_nodes()["user"].tolist(), ["u1", "u1", "u2"])
+        self.assertEqual(node_info.user_links, {"u1": {"link": 2}, "u2": {"link": 2}})
+        self.assertEqual(sorted(node_info.user_skeets), ["a", "b", "c"])
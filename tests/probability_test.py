@@ -0,0 +1,114 @@
+import unittest
+import numpy as np
+import pandas as pd
+from spikexplore.collect_edges import probability_function, weighted_sample
+
+
+def reference_degree_weight(node_type, edges_df):
+    # previous merge-based implementation, kept as a reference
+    edges_df.reset_index(inplace=True)
+    degree_df = edges_df[[node_type, "weight"]].groupby([node_type]).sum()
+    degree_df.columns = ["degree_" + node_type]
+    edges_df = edges_df.merge(degree_df, on=node_type)
+    edges_df.set_index("index", inplace=True)
+    edges_df.sort_index(inplace=True)
+    degree_vec = np.array(edges_df["degree_" + node_type].tolist())
+    return degree_vec, edges_df
+
+
+def reference_probability_function(edges_df, exponents):
+    source_degree, edge_degree, target_degree = exponents
+    weight_vec = np.array(edges_df["weight"].tolist())
+    target_degree_vec, edges_df = reference_degree_weight("target", edges_df)
+    source_degree_vec, edges_df = reference_degree_weight("source", edges_df)
+
+    source_func = source_degree_vec.astype(float) ** source_degree
+    weight_func = weight_vec.astype(float) ** edge_degree
+    target_func = target_degree_vec.astype(float) ** target_degree
+    proba_unormalized = source_func * weight_func * target_func
+    return proba_unormalized / np.sum(proba_unormalized)
+
+
+class ProbabilityFunctionTest(unittest.TestCase):
+    ball_exponents = {
+        "spikyball": (0, 1, 0),
+        "hubball": (2, 1, 0),
+        "coreball": (0, 1, 2),
+        "fireball": (-1, 1, 0),
+        "firecoreball": (-1, 1, 2),
+    }
+
+    def check_identical(self, edges_df):
+        for balltype, exponents in self.ball_exponents.items():
+            expected = reference_probability_function(edges_df.copy(), exponents)
+            proba = probability_function(edges_df["source"].to_numpy(), edges_df["target"].to_numpy(), edges_df["weight"].to_numpy(), balltype, 2)
+            self.assertTrue(np.array_equal(proba, expected), balltype)
+
+    def test_integer_nodes(self):
+        rng = np.random.default_rng(0)
+        nb_edges = 20000
+        edges_df = pd.DataFrame(
+            {"source": rng.integers(0, 500, nb_edges), "target": rng.integers(0, 5000, nb_edges), "weight": rng.integers(1, 10, nb_edges)}
+        )
+        self.check_identical(edges_df)
+
+    def test_string_nodes(self):
+        rng = np.random.default_rng(1)
+        nb_edges = 5000
+        edges_df = pd.DataFrame(
+            {
+                "source": ["user{}".format(x) for x in rng.integers(0, 100, nb_edges)],
+                "target": ["user{}".format(x) for x in rng.integers(0, 2000, nb_edges)],
+                "weight": rng.integers(1, 5, nb_edges).astype(float),
+            }
+        )
+        self.check_identical(edges_df)
+
+    def test_float_weights(self):
+        # weights aggregated by the backends, over repeated (source, target) pairs: the order of summation matters
+        rng = np.random.default_rng(2)
+        nb_edges = 20000
+        edges_df = pd.DataFrame(
+            {
+                "source": rng.integers(0, 50, nb_edges),
+                "target": rng.integers(0, 300, nb_edges),
+                "weight": rng.random(nb_edges) * 10 ** rng.uniform(-3, 3, nb_edges),
+            }
+        )
+        self.assertTrue(edges_df.duplicated(["source", "target"]).any())
+        self.check_identical(edges_df)
+
+    def test_unknown_balltype(self):
+        nodes = np.arange(3)
+        self.assertRaises(ValueError, probability_function, nodes, nodes, np.ones(3), "unknown", 2)
+
+
+class WeightedSampleTest(unittest.TestCase):
+    def test_without_replacement(self):
+        rng = np.random.default_rng(0)
+        proba = rng.random(1000)
+        proba /= proba.sum()
+        sample = weighted_sample(proba, 200, rng)
+        self.assertEqual(len(sample), 200)
+        self.assertEqual(len(np.unique(sample)), 200)
+        self.assertEqual(weighted_sample(proba, 0, rng).tolist(), [])
+        self.assertEqual(sorted(weighted_sample(proba, 1000, rng)), list(range(1000)))
+
+    def test_zero_probabilities(self):
+        proba = np.array([0.0, 0.5, 0.0, 0.5])
+        sample = weighted_sample(proba, 3, np.random.default_rng(0))
+        self.assertEqual(sorted(sample), [1, 3])
+
+    def test_reproducible(self):
+        proba = np.full(100, 0.01)
+        first = weighted_sample(proba, 10, np.random.default_rng(42))
+        second = weighted_sample(proba, 10, np.random.default_rng(42))
+        self.assertTrue(np.array_equal(first, second))
+
+    def test_first_draw_distribution(self):
+        # the first item returned follows the sampling probabilities
+        rng = np.random.default_rng(0)
+        proba = np.array([0.1, 0.2, 0.3, 0.4])
+        first = [weighted_sample(proba, 2, rng)[0] for _ in range(20000)]
+        frequencies = np.bincount(first, minlength=4) / len(first)
+        self.assertTrue(np.allclose(frequencies, proba, atol=0.02))
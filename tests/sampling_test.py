@@ -1,9 +1,38 @@
 import unittest
 import copy
+import dataclasses
+import multiprocessing
+import os
+import tempfile
+import threading
+from collections import Counter
+from unittest import mock
+import numpy as np
+import pandas as pd
 import networkx as nx
 from spikexplore import graph_explore
-from spikexplore.backends.synthetic import SyntheticNetwork
+from spikexplore.collect_edges import spiky_ball
+from spikexplore.checkpoint import load_checkpoint, save_checkpoint
+from spikexplore.backends.synthetic import SyntheticNetwork, CSRNetwork
 from spikexplore.config import SamplingConfig, GraphConfig, DataCollectionConfig, SyntheticConfig
+from spikexplore.cache import CachedBackend
+
+
+class PerNodeSyntheticNetwork(SyntheticNetwork):
+    def get_neighbors_batch(self, node_list, executor=None):
+        return None  # always fall back to the per-node protocol
+
+
+class CountingSyntheticNetwork(SyntheticNetwork):
+    def __init__(self, g, config):
+        super().__init__(g, config)
+        self.calls = Counter()
+        self.lock = threading.Lock()
+
+    def get_neighbors(self, node_id):
+        with self.lock:
+            self.calls[node_id] += 1
+        return super().get_neighbors(node_id)
 
 
 class SyntheticGraphSamplingTest(unittest.TestCase):
@@ -51,3 +80,220 @@ class SyntheticGraphSamplingTest(unittest.TestCase):
         bad_cfg.data_collection.random_subset_mode = "percent"
         bad_cfg.data_collection.random_subset_size = 102
         self.assertRaises(ValueError, graph_explore.explore, self.sampling_backend, [1, 2, 3], bad_cfg)
+
+
+class ConcurrentHopTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.G = nx.barabasi_albert_graph(2000, 3, seed=42)
+        cls.sampling_backend = SyntheticNetwork(cls.G, SyntheticConfig(delay=0.001))
+        cls.data_collection_config = DataCollectionConfig(
+            exploration_depth=3, random_subset_mode="percent", random_subset_size=20, expansion_type="coreball", degree=2, max_nodes_per_hop=1000
+        )
+
+    def run_spiky_ball(self, concurrency):
+        cfg = copy.deepcopy(self.data_collection_config)
+        cfg.concurrency = concurrency
+        cfg.seed = 0
+        return spiky_ball([1, 2], self.sampling_backend, cfg, node_acc=self.sampling_backend.create_node_info())
+
+    def test_concurrent_hop_deterministic(self):
+        nodes_ref, nodes_df_ref, edges_df_ref, _ = self.run_spiky_ball("sequential")
+        for concurrency in ["thread", "asyncio"]:
+            nodes, nodes_df, edges_df, _ = self.run_spiky_ball(concurrency)
+            self.assertEqual(nodes, nodes_ref)
+            pd.testing.assert_frame_equal(nodes_df, nodes_df_ref)
+            pd.testing.assert_frame_equal(edges_df, edges_df_ref)
+
+    def test_concurrency_validation(self):
+        cfg = copy.deepcopy(self.data_collection_config)
+        cfg.concurrency = "invalid"
+        self.assertRaises(ValueError, spiky_ball, [1, 2], self.sampling_backend, cfg)
+        cfg.concurrency = "thread"
+        cfg.max_in_flight = 0
+        self.assertRaises(ValueError, spiky_ball, [1, 2], self.sampling_backend, cfg)
+
+    def test_seed_reproducible(self):
+        first = self.run_spiky_ball("sequential")
+        second = self.run_spiky_ball("sequential")
+        self.assertEqual(first[0], second[0])
+        pd.testing.assert_frame_equal(first[2], second[2])
+
+
+class CheckpointTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.G = nx.barabasi_albert_graph(2000, 3, seed=42)
+        cls.sampling_backend = SyntheticNetwork(cls.G, SyntheticConfig())
+        graph_config = GraphConfig(min_degree=1, min_weight=1, community_detection=False)
+        data_collection_config = DataCollectionConfig(
+            exploration_depth=4, random_subset_mode="percent", random_subset_size=20, expansion_type="coreball", degree=2, seed=0
+        )
+        cls.sampling_config = SamplingConfig(graph_config, data_collection_config)
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_resume(self):
+        cfg = copy.deepcopy(self.sampling_config)
+        cfg.data_collection.checkpoint_path = self.tmp_dir.name
+        g_ref, _ = graph_explore.explore(self.sampling_backend, [1, 2], self.sampling_config)
+
+        def crash(depth, _):
+            if depth == 1:
+                raise RuntimeError("crash after hop 1")
+
+        self.assertRaises(RuntimeError, graph_explore.explore, self.sampling_backend, [1, 2], cfg, progress_callback=crash)
+        self.assertEqual(load_checkpoint(self.tmp_dir.name).depth, 1)
+        g_sub, _ = graph_explore.explore(self.sampling_backend, [1, 2], cfg, resume_from=self.tmp_dir.name)
+        self.assertEqual(list(g_sub.nodes(data=True)), list(g_ref.nodes(data=True)))
+        self.assertEqual(list(g_sub.edges(data=True)), list(g_ref.edges(data=True)))
+        # the last checkpoint holds the complete exploration
+        self.assertEqual(load_checkpoint(self.tmp_dir.name).depth, 4)
+
+    def test_interrupted_save(self):
+        cfg = copy.deepcopy(self.sampling_config.data_collection)
+        cfg.checkpoint_path = self.tmp_dir.name
+        cfg.exploration_depth = 2
+        spiky_ball([1, 2], self.sampling_backend, cfg, node_acc=self.sampling_backend.create_node_info())
+        state = load_checkpoint(self.tmp_dir.name)
+        # a crash between the two files keeps the previous checkpoint
+        with mock.patch("spikexplore.checkpoint.pickle.dump", side_effect=RuntimeError("crash")):
+            self.assertRaises(RuntimeError, save_checkpoint, self.tmp_dir.name, dataclasses.replace(state, depth=state.depth + 1))
+        self.assertEqual(load_checkpoint(self.tmp_dir.name).depth, state.depth)
+        save_checkpoint(self.tmp_dir.name, dataclasses.replace(state, depth=state.depth + 1))
+        self.assertEqual(load_checkpoint(self.tmp_dir.name).depth, state.depth + 1)
+        self.assertEqual(len(os.listdir(self.tmp_dir.name)), 2)  # the pointer and the last checkpoint
+
+    def test_resume_spiky_ball(self):
+        cfg = copy.deepcopy(self.sampling_config.data_collection)
+        cfg.checkpoint_path = self.tmp_dir.name
+        nodes_ref, nodes_df_ref, edges_df_ref, _ = spiky_ball([1, 2], self.sampling_backend, cfg, node_acc=self.sampling_backend.create_node_info())
+        for depth in range(2, 5):
+            cfg.exploration_depth = depth  # stop early, then resume with the full depth
+            spiky_ball([1, 2], self.sampling_backend, cfg, node_acc=self.sampling_backend.create_node_info())
+            cfg.exploration_depth = 4
+            nodes, nodes_df, edges_df, _ = spiky_ball(
+                [1, 2], self.sampling_backend, cfg, node_acc=self.sampling_backend.create_node_info(), resume_from=self.tmp_dir.name
+            )
+            self.assertEqual(nodes, nodes_ref)
+            pd.testing.assert_frame_equal(nodes_df, nodes_df_ref)
+            pd.testing.assert_frame_equal(edges_df, edges_df_ref)
+
+
+class CSRNetworkTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.G = nx.barabasi_albert_graph(2000, 3, seed=42)
+        cls.config = SyntheticConfig()
+        cls.adjacency = nx.to_scipy_sparse_array(cls.G, nodelist=range(cls.G.number_of_nodes()))
+        cls.data_collection_config = DataCollectionConfig(
+            exploration_depth=4, random_subset_mode="percent", random_subset_size=20, expansion_type="coreball", degree=2, seed=0
+        )
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def run_spiky_ball(self, backend):
+        nodes, nodes_df, edges_df, _ = spiky_ball([1, 2], backend, self.data_collection_config, node_acc=backend.create_node_info())
+        return nodes, nodes_df.reset_index(drop=True), edges_df.reset_index(drop=True)
+
+    def test_neighbors_batch(self):
+        backend = CSRNetwork(self.adjacency, self.config)
+        node_info, edges_df = backend.get_neighbors_batch([5, 7, "not a node", 100000])
+        self.assertEqual(node_info.get_nodes()["source"].tolist(), [5, 7])
+        self.assertEqual(list(zip(edges_df["source"], edges_df["target"])), [(n, t) for n in [5, 7] for t in sorted(self.G.neighbors(n))])
+        node_info, edges_df = backend.get_neighbors(3)
+        self.assertEqual(sorted(edges_df["target"]), sorted(self.G.neighbors(3)))
+
+    def test_batch_same_as_per_node(self):
+        nodes_ref, nodes_df_ref, edges_df_ref = self.run_spiky_ball(PerNodeSyntheticNetwork(self.G, self.config))
+        for backend in [SyntheticNetwork(self.G, self.config), CSRNetwork(self.adjacency, self.config)]:
+            nodes, nodes_df, edges_df = self.run_spiky_ball(backend)
+            self.assertEqual(nodes, nodes_ref)
+            pd.testing.assert_frame_equal(nodes_df, nodes_df_ref)
+            pd.testing.assert_frame_equal(edges_df, edges_df_ref)
+
+    def test_min_degree(self):
+        config = SyntheticConfig(min_degree=10)
+        nodes_ref, nodes_df_ref, edges_df_ref = self.run_spiky_ball(PerNodeSyntheticNetwork(self.G, config))
+        for backend in [SyntheticNetwork(self.G, config), CSRNetwork(self.adjacency, config)]:
+            nodes, nodes_df, edges_df = self.run_spiky_ball(backend)
+            self.assertEqual(nodes, nodes_ref)
+            pd.testing.assert_frame_equal(nodes_df, nodes_df_ref)
+            pd.testing.assert_frame_equal(edges_df, edges_df_ref)
+
+    def test_from_edges_and_load(self):
+        source, target = zip(*self.G.edges())
+        backend = CSRNetwork.from_edges(source, target, self.config, nb_nodes=self.G.number_of_nodes(), directed=False)
+        backend.save(self.tmp_dir.name)
+        loaded = CSRNetwork.load(self.tmp_dir.name, self.config)
+        self.assertIsInstance(loaded.indices, np.memmap)
+        nodes_ref, nodes_df_ref, edges_df_ref = self.run_spiky_ball(CSRNetwork(self.adjacency, self.config))
+        for b in [backend, loaded]:
+            nodes, nodes_df, edges_df = self.run_spiky_ball(b)
+            self.assertEqual(nodes, nodes_ref)
+            pd.testing.assert_frame_equal(edges_df, edges_df_ref)
+
+
+class ExploreManyTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.G = nx.barabasi_albert_graph(2000, 3, seed=42)
+        graph_config = GraphConfig(min_degree=1, min_weight=1, community_detection=False)
+        cls.jobs = [
+            (
+                seeds,
+                SamplingConfig(graph_config, DataCollectionConfig(exploration_depth=3, random_subset_size=20, expansion_type=expansion_type, seed=0)),
+            )
+            for seeds in [[1, 2], [3, 4]]
+            for expansion_type in ["coreball", "spikyball"]
+        ]
+        cls.expected = [graph_explore.explore(SyntheticNetwork(cls.G, SyntheticConfig()), *job)[0] for job in cls.jobs]
+
+    def assert_same_graphs(self, results):
+        self.assertEqual(len(results), len(self.jobs))
+        for (g, _), expected in zip(results, self.expected):
+            self.assertEqual(list(g.nodes(data=True)), list(expected.nodes(data=True)))
+            self.assertEqual(list(g.edges(data=True)), list(expected.edges(data=True)))
+
+    def test_threads(self):
+        backend = CountingSyntheticNetwork(self.G, SyntheticConfig(delay=0.0005))
+        results, stats = graph_explore.explore_many(backend, self.jobs, max_workers=4)
+        self.assert_same_graphs(results)
+        # overlapping neighborhoods are fetched once
+        self.assertEqual(max(backend.calls.values()), 1)
+        self.assertEqual(stats["fetched"], len(backend.calls))
+        self.assertEqual(stats["jobs"], 4)
+        self.assertEqual(stats["hits"], stats["requests"] - stats["fetched"])
+        self.assertGreater(stats["hits"], 0)
+
+    def test_processes(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            cache_path = os.path.join(tmp_dir, "neighbors.sqlite")
+            backend = SyntheticNetwork(self.G, SyntheticConfig())
+            results, stats = graph_explore.explore_many(backend, self.jobs, max_workers=2, mode="process", cache_path=cache_path)
+            self.assert_same_graphs(results)
+            self.assertGreater(stats["hits"], 0)
+            # a second batch is served by the cache file
+            _, stats = graph_explore.explore_many(backend, self.jobs, max_workers=2, mode="process", cache_path=cache_path)
+            self.assertEqual(stats["fetched"], 0)
+
+    def test_unpicklable_backend(self):
+        backend = CountingSyntheticNetwork(self.G, SyntheticConfig())  # holds a lock
+        with mock.patch("multiprocessing.get_context", return_value=multiprocessing.get_context("spawn")):
+            self.assertRaises(ValueError, graph_explore.explore_many, backend, self.jobs, mode="process")
+
+    def test_cached_backend(self):
+        backend = CachedBackend(SyntheticNetwork(self.G, SyntheticConfig()))
+        self.assertFalse(hasattr(backend, "get_neighbors_batch"))  # nodes are cached one by one
+        self.assertIs(backend.get_neighbors(1), backend.get_neighbors(1))
+        self.assertEqual(backend.neighbors_stats(), {"requests": 2, "fetched": 1, "waits": 0})
+        self.assertEqual(backend.cache_stats()["neighbors"]["hits"], 1)
+        self.assertRaises(ValueError, graph_explore.explore_many, backend, self.jobs, mode="invalid")
@@ -0,0 +1,168 @@
+import asyncio
+import pickle
+import random
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from spikexplore.scheduler import RequestScheduler, TokenBucket
+
+
+class FakeClock:
+    # sleeping only moves the time forward
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+    async def async_sleep(self, seconds):
+        self.sleep(seconds)
+
+
+class TransientError(Exception):
+    def __init__(self, retry_after=None):
+        super().__init__("transient")
+        self.retry_after = retry_after
+
+
+class Flaky:
+    # fails with the given errors, then returns the nb of calls
+    def __init__(self, errors, clock=None, duration=0.0):
+        self.errors = list(errors)
+        self.clock = clock
+        self.duration = duration
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        if self.clock is not None:
+            self.clock.now += self.duration
+        if self.errors:
+            raise self.errors.pop(0)
+        return self.calls
+
+
+class SchedulerTest(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+
+    def scheduler(self, **kwargs):
+        return RequestScheduler(
+            is_retryable=lambda e: isinstance(e, TransientError),
+            retry_after=lambda e: e.retry_after,
+            clock=self.clock,
+            sleep=self.clock.sleep,
+            async_sleep=self.clock.async_sleep,
+            rng=random.Random(0),
+            **kwargs,
+        )
+
+    def test_token_bucket(self):
+        bucket = TokenBucket(2, clock=self.clock)
+        self.assertEqual([bucket.reserve() for _ in range(4)], [0.0, 0.0, 0.5, 1.0])
+        self.clock.now = 10.0  # the bucket is full again, but not more
+        self.assertEqual([bucket.reserve() for _ in range(3)], [0.0, 0.0, 0.5])
+
+    def test_rate_limit(self):
+        scheduler = self.scheduler(rate_limits={"feed": 4})
+        times = [scheduler.call("feed", self.clock) for _ in range(12)]
+        self.assertEqual(times, [0.0] * 4 + [0.25 * i for i in range(1, 9)])
+        # other endpoints are not throttled
+        self.assertEqual([scheduler.call("profiles", self.clock) for _ in range(5)], [2.0] * 5)
+        self.assertAlmostEqual(scheduler.endpoint_stats()["feed"]["request_wait"], 2.0)
+        self.assertEqual(scheduler.endpoint_stats()["profiles"]["request_wait"], 0.0)
+
+    def test_backoff(self):
+        scheduler = self.scheduler(retry_backoff=1.0)
+        fn = Flaky([TransientError(), TransientError(), TransientError()], self.clock, duration=0.1)
+        self.assertEqual(scheduler.call("feed", fn), 4)
+        # exponential backoff with jitter
+        for attempt, delay in enumerate(self.clock.sleeps):
+            self.assertGreaterEqual(delay, 0.5 * 2**attempt)
+            self.assertLessEqual(delay, 2**attempt)
+        stats = scheduler.stats()
+        self.assertEqual(stats["api_calls"], 4)
+        self.assertEqual(stats["retries"], 3)
+        self.assertEqual(stats["request_failures"], 0)
+        self.assertAlmostEqual(stats["request_wait"], sum(self.clock.sleeps))
+        self.assertAlmostEqual(stats["request_work"], 0.4)
+
+    def test_retry_after(self):
+        scheduler = self.scheduler()
+        self.assertEqual(scheduler.call("feed", Flaky([TransientError(retry_after=7.0)])), 2)
+        self.assertEqual(self.clock.sleeps, [7.0])
+
+    def test_failures(self):
+        scheduler = self.scheduler(max_retries=2, retry_backoff=0.0)
+        fn = Flaky([ValueError("bad request")])
+        with self.assertRaises(ValueError):
+            scheduler.call("feed", fn)
+        self.assertEqual(fn.calls, 1)  # not retried
+        fn = Flaky([TransientError()] * 3)
+        with self.assertRaises(TransientError):
+            scheduler.call("feed", fn)
+        self.assertEqual(fn.calls, 3)
+        self.assertEqual(scheduler.stats()["request_failures"], 2)
+        self.assertEqual(scheduler.stats()["retries"], 2)
+
+    def test_bounded_concurrency(self):
+        scheduler = RequestScheduler(max_in_flight=3)
+        lock = threading.Lock()
+        in_flight = [0, 0]  # current, max
+
+        def work():
+            with lock:
+                in_flight[0] += 1
+                in_flight[1] = max(in_flight)
+            time.sleep(0.01)
+            with lock:
+                in_flight[0] -= 1
+
+        with ThreadPoolExecutor(max_workers=10) as pool:
+            list(pool.map(lambda _: scheduler.call("feed", work), range(30)))
+        self.assertEqual(in_flight[1], 3)
+        self.assertEqual(scheduler.stats()["api_calls"], 30)
+        self.assertGreater(scheduler.stats()["request_wait"], 0.0)
+
+    def test_async(self):
+        scheduler = self.scheduler(max_in_flight=2, rate_limits={"feed": 10})
+        in_flight = [0, 0]
+
+        async def work(i, fail):
+            in_flight[0] += 1
+            in_flight[1] = max(in_flight)
+            await asyncio.sleep(0.001)
+            in_flight[0] -= 1
+            if i in fail:  # the first call of even items fails
+                fail.remove(i)
+                raise TransientError(retry_after=0.0)
+            return i
+
+        async def run():
+            fail = list(range(0, 10, 2))
+            return await asyncio.gather(*[scheduler.acall("feed", work, i, fail) for i in range(10)])
+
+        self.assertEqual(asyncio.run(run()), list(range(10)))
+        self.assertEqual(in_flight[1], 2)
+        self.assertEqual(scheduler.stats()["retries"], 5)
+        self.assertEqual(scheduler.stats()["api_calls"], 15)
+        # a new event loop gets its own slots
+        self.assertEqual(asyncio.run(run()), list(range(10)))
+
+    def test_pickle(self):
+        scheduler = RequestScheduler(max_in_flight=2, rate_limits={"feed": 1000})
+        scheduler.call("feed", lambda: None)
+        # a copy, e.g. in a worker process, has its own slots and keeps the limits and the stats
+        copy = pickle.loads(pickle.dumps(scheduler))
+        self.assertEqual(copy.stats()["api_calls"], 1)
+        self.assertEqual(list(copy.buckets), ["feed"])
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            list(pool.map(lambda _: copy.call("feed", lambda: None), range(8)))
+        self.assertEqual(copy.stats()["api_calls"], 9)
+        self.assertEqual(asyncio.run(copy.acall("feed", asyncio.sleep, 0, result=1)), 1)
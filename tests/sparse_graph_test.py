@@ -0,0 +1,96 @@
+import copy
+import unittest
+import networkx as nx
+import numpy as np
+import pandas as pd
+from spikexplore import graph_explore
+from spikexplore.collect_edges import spiky_ball
+from spikexplore.sparse_graph import SparseGraph
+from spikexplore.backends.synthetic import SyntheticNetwork
+from spikexplore.backends.bluesky import BlueskyNetwork, BlueskyCredentials
+from spikexplore.config import SamplingConfig, GraphConfig, DataCollectionConfig, SyntheticConfig, BlueskyConfig
+from fake_bsky_client import FakeBlueskyClient
+
+
+class SparseGraphTest(unittest.TestCase):
+    def setUp(self):
+        self.edges_df = pd.DataFrame(
+            {"source": ["a", "b", "c", "b", "e", "f"], "target": ["b", "a", "a", "c", "f", "e"], "weight": [1, 3, 1, 2, 1, 5], "kind": list("uvwxyz")}
+        )
+        self.nodes_df = pd.DataFrame({"spikyball_hop": [0, 1, 1, 2]}, index=["a", "b", "c", "e"])
+
+    def test_from_tables(self):
+        g = SparseGraph.from_tables(self.nodes_df, self.edges_df, min_weight=2)
+        self.assertEqual(list(g.nodes), ["b", "a", "c", "f", "e"])
+        self.assertEqual(g.number_of_edges(), 3)
+        self.assertEqual(g.adjacency[0, 1], 3.0)
+        self.assertEqual(list(g.degree()), [2, 1, 1, 1, 1])
+        self.assertEqual(list(g.nodes_df.index), ["a", "b", "c", "e"])
+
+    def test_reduce(self):
+        g = SparseGraph.from_tables(self.nodes_df, self.edges_df)
+        g_reduced = g.reduce(3)
+        self.assertEqual(list(g_reduced.nodes), ["a", "b"])
+        self.assertEqual(g_reduced.number_of_edges(), 2)
+        self.assertEqual(list(g.remove_nodes_without("spikyball_hop").nodes), ["a", "b", "c", "e"])
+        self.assertEqual(g.remove_nodes_without("unknown").number_of_nodes(), 0)
+
+    def test_undirected(self):
+        g = SparseGraph.from_tables(self.nodes_df, self.edges_df, directed=False)
+        self.assertEqual(g.number_of_edges(), 4)
+        g_nx = g.to_networkx()
+        self.assertEqual(g_nx.edges["a", "b"]["kind"], "v")  # (b, a) comes after (a, b), as in networkx
+        self.assertEqual(list(g.largest_component().nodes), ["a", "b", "c"])
+        self.assertTrue((g.adjacency != g.adjacency.T).nnz == 0)
+
+
+class SparseExploreTest(unittest.TestCase):
+    @staticmethod
+    def graphs(backend, nodes_df, edges_df, nodes_info, config):
+        g_ref = graph_explore.create_graph(backend, nodes_df.copy(), edges_df.copy(), nodes_info, config)
+        g = graph_explore.create_sparse_graph(backend, nodes_df.copy(), edges_df.copy(), nodes_info, config)
+        return g_ref, g
+
+    def assert_same_graph(self, g_nx, g_ref):
+        self.assertEqual(g_nx.is_directed(), g_ref.is_directed())
+        self.assertEqual(set(g_nx.nodes()), set(g_ref.nodes()))
+        self.assertEqual(set(g_nx.edges()), set(g_ref.edges()))
+        for n, data in g_ref.nodes(data=True):
+            self.assertEqual(g_nx.nodes[n], data)
+        for u, v, data in g_ref.edges(data=True):
+            self.assertEqual(g_nx.edges[u, v], data)
+
+    def test_synthetic(self):
+        G = nx.barabasi_albert_graph(3000, 3, seed=0)
+        nx.set_node_attributes(G, {n: "node {}".format(n) for n in G}, name="name")
+        backend = SyntheticNetwork(G, SyntheticConfig())
+        cfg = DataCollectionConfig(exploration_depth=3, random_subset_mode="percent", random_subset_size=20, seed=0)
+        _, nodes_df, edges_df, nodes_info = spiky_ball([1, 2], backend, cfg, node_acc=backend.create_node_info())
+        for as_undirected in [True, False]:
+            for min_degree in [1, 2]:
+                config = GraphConfig(min_degree=min_degree, as_undirected=as_undirected)
+                g_ref, g = self.graphs(backend, nodes_df, edges_df, nodes_info, config)
+                self.assertIsInstance(g, SparseGraph)
+                self.assertGreater(g.number_of_nodes(), 50)
+                self.assert_same_graph(g.to_networkx(), g_ref)
+
+    def test_bluesky(self):
+        backend = BlueskyNetwork(BlueskyCredentials("handle", "password"), BlueskyConfig(), client=FakeBlueskyClient())
+        cfg = DataCollectionConfig(exploration_depth=3, random_subset_size=50, seed=0)
+        _, nodes_df, edges_df, nodes_info = spiky_ball([FakeBlueskyClient.handle(0)], backend, cfg, node_acc=backend.create_node_info())
+        config = GraphConfig(as_undirected=False)
+        g_ref, g = self.graphs(backend, nodes_df, edges_df, nodes_info, config)
+        self.assertGreater(g.number_of_edges(), 2)
+        self.assert_same_graph(g.to_networkx(), g_ref)
+
+    def test_explore(self):
+        G = nx.barabasi_albert_graph(2000, 3, seed=0)
+        backend = SyntheticNetwork(G, SyntheticConfig())
+        data_collection_config = DataCollectionConfig(exploration_depth=3, random_subset_size=20, seed=0)
+        config = SamplingConfig(GraphConfig(as_sparse=True, community_detection=True, min_community_size=5), data_collection_config)
+        g, _ = graph_explore.explore(backend, [1, 2], config)
+        self.assertIsInstance(g, SparseGraph)
+        self.assertIn("community", g.nodes_df.columns)
+        sizes = g.nodes_df["community"].value_counts()
+        self.assertTrue((sizes > 5).all())
+        self.assertTrue(np.isin(g.nodes, g.nodes_df.index).all())
@@ -0,0 +1,69 @@
+import unittest
+import copy
+import numpy as np
+import networkx as nx
+from spikexplore import graph_explore
+from spikexplore.collect_edges import spiky_ball
+from spikexplore.edge_store import EdgeStore
+from spikexplore.stats import ExplorationStats
+from spikexplore.backends.synthetic import SyntheticNetwork
+from spikexplore.config import SamplingConfig, GraphConfig, DataCollectionConfig, SyntheticConfig
+
+
+class ExplorationStatsTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.G = nx.barabasi_albert_graph(2000, 3, seed=42)
+        cls.sampling_backend = SyntheticNetwork(cls.G, SyntheticConfig())
+        graph_config = GraphConfig(min_degree=1, min_weight=1, community_detection=False)
+        data_collection_config = DataCollectionConfig(
+            exploration_depth=4, random_subset_mode="percent", random_subset_size=20, expansion_type="coreball", degree=2, seed=0
+        )
+        cls.sampling_config = SamplingConfig(graph_config, data_collection_config)
+
+    def test_union_find(self):
+        rng = np.random.default_rng(0)
+        source = rng.integers(0, 500, 400)
+        target = rng.integers(0, 500, 400)
+        stats = ExplorationStats()
+        for i in range(0, 400, 100):  # edges added in several steps
+            stats.add_edges(EdgeStore(source[i : i + 100], target[i : i + 100], np.ones(100)))
+        g = nx.Graph()
+        g.add_edges_from(zip(source, target))
+        self.assertEqual(stats.largest_component(), max(len(c) for c in nx.connected_components(g)))
+        self.assertEqual(stats.nb_edges, 400)
+        # multigraph degrees, self loops counted twice
+        self.assertEqual(sorted(stats.weighted_degrees()), sorted(d for _, d in nx.MultiGraph(list(zip(source, target))).degree()))
+
+    def test_hop_stats(self):
+        stats = ExplorationStats()
+        cfg = self.sampling_config.data_collection
+        nodes, _, edges_df, _ = spiky_ball([1, 2], self.sampling_backend, cfg, node_acc=self.sampling_backend.create_node_info(), stats=stats)
+        self.assertEqual(len(stats.hops), cfg.exploration_depth)
+        self.assertEqual(stats.hops[-1]["nodes"], len(nodes))
+        self.assertEqual(stats.hops[-1]["edges"], len(edges_df))
+        g = nx.from_pandas_edgelist(edges_df)
+        self.assertEqual(stats.hops[-1]["largest_component"], max(len(c) for c in nx.connected_components(g)))
+        for hop in stats.hops:
+            self.assertTrue(0 <= hop["new_node_yield"] <= 100)
+
+    def test_early_stopping(self):
+        cfg = copy.deepcopy(self.sampling_config)
+        cfg.data_collection.min_new_node_yield = 101  # stops after the first hop
+        stats = ExplorationStats()
+        graph_explore.explore(self.sampling_backend, [1, 2], cfg, stats=stats)
+        self.assertEqual(len(stats.hops), 1)
+
+        cfg = copy.deepcopy(self.sampling_config)
+        cfg.data_collection.stop_condition = lambda s: len(s.hops) == 2
+        stats = ExplorationStats()
+        graph_explore.explore(self.sampling_backend, [1, 2], cfg, stats=stats)
+        self.assertEqual(len(stats.hops), 2)
+
+        cfg = copy.deepcopy(self.sampling_config)
+        cfg.data_collection.max_edges = 1
+        stats = ExplorationStats()
+        g_sub, _ = graph_explore.explore(self.sampling_backend, [1, 2], cfg, stats=stats)
+        self.assertTrue(len(stats.hops) < cfg.data_collection.exploration_depth)
+        self.assertTrue(stats.hops[-1]["edges"] >= 1)
+        self.assertTrue(g_sub.number_of_nodes() > 0)
@@ -0,0 +1,51 @@
+import importlib.util
+import os
+import tempfile
+import unittest
+import pandas as pd
+from spikexplore.collect_edges import save_data, load_data
+
+has_pyarrow = importlib.util.find_spec("pyarrow") is not None
+
+
+class StorageTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.nodes_df = pd.DataFrame(
+            {
+                "user": ["a", "b", "a"],
+                "mentions": [["b", "c"], [], ["c"]],
+                "reply_to": ["b", [], []],  # the handle of the replied user, or an empty list
+                "created_at": pd.to_datetime(["2024-01-01 10:00", "2024-01-02 11:00", "2024-01-03 12:00"], utc=True),
+                "spikyball_hop": [0, 0, 1],
+            },
+            index=pd.Index(["cid-0", "cid-1", "cid-2"]),
+        )
+        self.edges_df = pd.DataFrame({"source": ["a", "b"], "target": ["b", "c"], "cid": [["cid-0"], ["cid-1", "cid-2"]], "weight": [1, 2]})
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    @unittest.skipUnless(has_pyarrow, "pyarrow is not installed")
+    def test_roundtrip(self):
+        for data_format, compression in [("parquet", None), ("parquet", "zstd"), ("feather", None), ("feather", "lz4")]:
+            with tempfile.TemporaryDirectory() as data_path:
+                save_data(self.nodes_df, self.edges_df, data_path, data_format=data_format, compression=compression)
+                self.assertTrue(os.path.exists(os.path.join(data_path, "edges_data." + data_format)))
+                for memory_map in [False, True]:
+                    nodes_df, edges_df = load_data(data_path, memory_map=memory_map)
+                    pd.testing.assert_frame_equal(nodes_df, self.nodes_df)
+                    pd.testing.assert_frame_equal(edges_df, self.edges_df)
+                    self.assertIsInstance(edges_df["cid"].iloc[0], list)
+
+    def test_json(self):
+        # dumps written by older versions are still loaded
+        edges_df = self.edges_df.drop(columns="cid")
+        save_data(self.nodes_df[["user", "spikyball_hop"]], edges_df, self.tmp_dir.name)
+        nodes_df, loaded_edges_df = load_data(self.tmp_dir.name)
+        self.assertEqual(nodes_df["user"].tolist(), ["a", "b", "a"])
+        pd.testing.assert_frame_equal(loaded_edges_df, edges_df)
+
+    def test_errors(self):
+        self.assertRaises(ValueError, save_data, self.nodes_df, self.edges_df, self.tmp_dir.name, data_format="csv")
+        self.assertRaises(FileNotFoundError, load_data, self.tmp_dir.name)
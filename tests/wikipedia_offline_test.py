@@ -0,0 +1,115 @@
+import pickle
+import unittest
+import networkx as nx
+from spikexplore import graph_explore
+from spikexplore.backends.wikipedia import WikipediaNetwork
+from spikexplore.config import SamplingConfig, GraphConfig, DataCollectionConfig, WikipediaConfig
+from fake_wiki_server import FakeWikiServer
+
+
+class PerNodeWikipediaNetwork(WikipediaNetwork):
+    def get_neighbors_batch(self, pages, executor=None):
+        return None  # always fall back to the per-node protocol
+
+
+class WikipediaBatchTest(unittest.TestCase):
+    def setUp(self):
+        self.server = FakeWikiServer(nb_pages=1000, nb_links=8, links_per_response=100).__enter__()
+        self.wiki_config = WikipediaConfig(user_agent="SpikexploreTest/1.0", batch_size=50, api_url=self.server.url)
+        graph_config = GraphConfig(min_degree=1, min_weight=1, community_detection=False)
+        data_collection_config = DataCollectionConfig(
+            exploration_depth=3, random_subset_mode="percent", random_subset_size=100, expansion_type="coreball", degree=2, seed=0
+        )
+        self.sampling_config = SamplingConfig(graph_config, data_collection_config)
+
+    def tearDown(self):
+        self.server.__exit__()
+
+    def test_fetch_links(self):
+        backend = WikipediaNetwork(self.wiki_config)
+        titles = [FakeWikiServer.title(i) for i in range(50)] + ["page 60", "Redirect 70", "Missing page"]
+        links = backend.fetch_links(titles)
+        # 53 pages with 9 links each, 100 links per response
+        self.assertEqual(len(self.server.requests), 5)
+        self.assertEqual(backend.request_stats()["api_calls"], 5)
+        self.assertEqual(backend.request_stats()["retries"], 0)
+        self.assertEqual(list(links.keys()), titles)
+        expected = {t: [(link["title"], link["ns"]) for link in self.server.links(t)] for t in map(FakeWikiServer.title, [*range(50), 60, 70])}
+        for i in range(50):
+            self.assertEqual(links[FakeWikiServer.title(i)], (FakeWikiServer.title(i), expected[FakeWikiServer.title(i)]))
+        # normalized and redirected titles are resolved
+        self.assertEqual(links["page 60"], (FakeWikiServer.title(60), expected[FakeWikiServer.title(60)]))
+        self.assertEqual(links["Redirect 70"], (FakeWikiServer.title(70), expected[FakeWikiServer.title(70)]))
+        self.assertEqual(links["Missing page"], ("Missing page", []))
+
+    def test_sampling(self):
+        backend = WikipediaNetwork(self.wiki_config)
+        initial_nodes = [FakeWikiServer.title(0), FakeWikiServer.title(100)]
+        g_sub, _ = graph_explore.explore(backend, initial_nodes, self.sampling_config)
+        self.assertGreater(g_sub.number_of_nodes(), 20)
+        self.assertTrue("Help:Contents" not in g_sub)
+        for u, v in g_sub.edges():
+            self.assertTrue({"ns": 0, "title": v} in self.server.links(u) or {"ns": 0, "title": u} in self.server.links(v))
+        # each hop is fetched with a few queries rather than one per page
+        nb_fetched = sum(len(titles) for titles in self.server.requests)
+        self.assertLess(len(self.server.requests), nb_fetched / 10)
+        self.assertEqual(backend.prefetched_links, {})
+
+    def test_batch_same_as_per_node(self):
+        initial_nodes = [FakeWikiServer.title(0), FakeWikiServer.title(100)]
+        g_batch, _ = graph_explore.explore(WikipediaNetwork(self.wiki_config), initial_nodes, self.sampling_config)
+        g_node, _ = graph_explore.explore(PerNodeWikipediaNetwork(self.wiki_config), initial_nodes, self.sampling_config)
+        self.assertEqual(list(g_batch.nodes(data=True)), list(g_node.nodes(data=True)))
+        self.assertEqual(list(g_batch.edges(data=True)), list(g_node.edges(data=True)))
+
+    def test_pickle(self):
+        # a copy, e.g. in a worker process of explore_many, opens its own http session
+        initial_nodes = [FakeWikiServer.title(0), FakeWikiServer.title(100)]
+        g_ref, _ = graph_explore.explore(WikipediaNetwork(self.wiki_config), initial_nodes, self.sampling_config)
+        backend = pickle.loads(pickle.dumps(WikipediaNetwork(self.wiki_config)))
+        g_sub, _ = graph_explore.explore(backend, initial_nodes, self.sampling_config)
+        self.assertEqual(list(g_sub.edges(data=True)), list(g_ref.edges(data=True)))
+
+    def test_redirected_seeds(self):
+        # the nodes are the resolved titles, whether the hops are fetched in batch or page by page
+        initial_nodes = ["Redirect 0", "page 100"]
+        g_batch, _ = graph_explore.explore(WikipediaNetwork(self.wiki_config), initial_nodes, self.sampling_config)
+        g_node, _ = graph_explore.explore(PerNodeWikipediaNetwork(self.wiki_config), initial_nodes, self.sampling_config)
+        self.assertEqual(list(g_batch.nodes(data=True)), list(g_node.nodes(data=True)))
+        self.assertEqual(list(g_batch.edges(data=True)), list(g_node.edges(data=True)))
+        self.assertIn(FakeWikiServer.title(0), g_batch)
+        self.assertIn(FakeWikiServer.title(100), g_batch)
+        self.assertNotIn("Redirect 0", g_batch)
+        self.assertNotIn("page 100", g_batch)
+
+    def test_empty_graph(self):
+        backend = WikipediaNetwork(self.wiki_config)
+        g_sub, _ = graph_explore.explore(backend, ["Non existent page of wikipedia forever"], self.sampling_config)
+        self.assertEqual(g_sub.number_of_nodes(), 0)
+
+
+class WikipediaRetryTest(unittest.TestCase):
+    def wiki_config(self, server):
+        return WikipediaConfig(user_agent="SpikexploreTest/1.0", batch_size=50, api_url=server.url, retry_backoff=0.001)
+
+    def test_transient_errors(self):
+        with FakeWikiServer(errors=[429, 503]) as server:
+            backend = WikipediaNetwork(self.wiki_config(server))
+            links = backend.fetch_links([FakeWikiServer.title(1)])
+        self.assertEqual(links[FakeWikiServer.title(1)][1], [(link["title"], link["ns"]) for link in server.links(FakeWikiServer.title(1))])
+        stats = backend.request_stats()
+        self.assertEqual(stats["api_calls"], 3)
+        self.assertEqual(stats["retries"], 2)
+        self.assertEqual(stats["request_failures"], 0)
+
+    def test_failures_are_counted(self):
+        with FakeWikiServer(errors=[400, 503, 503]) as server:
+            config = self.wiki_config(server)
+            config.max_retries = 1
+            backend = WikipediaNetwork(config)
+            backend.prefetch([FakeWikiServer.title(1)])  # bad request, not retried
+            backend.prefetch([FakeWikiServer.title(2)])  # server errors, retried once
+        self.assertEqual(backend.prefetched_links, {})
+        self.assertEqual(backend.request_stats()["api_calls"], 3)
+        self.assertEqual(backend.request_stats()["retries"], 1)
+        self.assertEqual(backend.request_stats()["request_failures"], 2)